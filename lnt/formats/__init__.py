@@ -26,6 +26,35 @@ def get_format(name):
     return formats_by_name.get(name)
 
 
+# Number of bytes inspected by sniff_format().
+_SNIFF_SIZE = 64
+
+
+def sniff_format(path_or_file):
+    """sniff_format(path_or_file) -> [format]
+
+    Guess the format from the first bytes of the input, without parsing it.
+    Returns None if the input does not look like any known format.
+    """
+    if isinstance(path_or_file, str):
+        with open(path_or_file, 'rb') as f:
+            head = f.read(_SNIFF_SIZE)
+    else:
+        path_or_file.seek(0)
+        head = path_or_file.read(_SNIFF_SIZE)
+        path_or_file.seek(0)
+    if not isinstance(head, bytes):
+        head = head.encode('utf-8')
+
+    head = head.lstrip(b'\xef\xbb\xbf').lstrip()
+    if head.startswith(b'{'):
+        return json
+    if head.startswith(b'bplist') or head.startswith(b'<?xml') or \
+            head.startswith(b'<!DOCTYPE plist') or head.startswith(b'<plist'):
+        return plist
+    return None
+
+
 def guess_format(path_or_file):
     """guess_format(path_or_file) -> [format]
 
@@ -33,13 +62,18 @@ def guess_format(path_or_file):
     found.
     """
 
+    # Looking at the first bytes is usually enough, and avoids parsing the
+    # whole input once per format.
+    matches = sniff_format(path_or_file)
+    if matches is not None:
+        return matches
+
     # Check that files are seekable.
     is_file = False
     if not isinstance(path_or_file, str):
         is_file = True
         path_or_file.seek(0)
 
-    matches = None
     for f in formats:
         # Check if the path matches this format, ignoring exceptions.
         try:
@@ -85,4 +119,4 @@ def read_any(path_or_file, format_name):
     return f['read'](path_or_file)
 
 
-__all__ = ['get_format', 'guess_format', 'read_any'] + format_names
+__all__ = ['get_format', 'guess_format', 'read_any', 'sniff_format'] + format_names
@@ -0,0 +1,49 @@
+from __future__ import print_function
+import click
+
+
+@click.command("apply-retention")
+@click.argument("instance_path", type=click.UNPROCESSED)
+@click.option("--database", default="default", show_default=True,
+              help="database to modify")
+@click.option("--testsuite", "testsuites", multiple=True,
+              help="testsuite to process (default: all with a policy)")
+@click.option("--batch-size", default=None, type=click.IntRange(min=1),
+              help="number of runs to process per transaction")
+@click.option("--show-sql", is_flag=True,
+              help="show SQL statements")
+def action_apply_retention(instance_path, database, testsuites, batch_size,
+                           show_sql):
+    """apply the data retention policies
+
+\b
+Aggregate old samples, thin out old runs and archive old profiles as
+configured by the 'retention' settings of the test suite schemas or lnt.cfg.
+    """
+    from .common import init_logger
+
+    import contextlib
+    import lnt.server.instance
+    import logging
+    from lnt.server.db import retention
+
+    init_logger(logging.INFO, show_sql=show_sql)
+    if batch_size is None:
+        batch_size = retention.DEFAULT_BATCH_SIZE
+
+    instance = lnt.server.instance.Instance.frompath(instance_path)
+    with contextlib.closing(instance.get_database(database)) as db:
+        if not testsuites:
+            testsuites = sorted(name for name, ts in db.testsuite.items()
+                                if not ts.retention_policy.is_empty)
+        for name in testsuites:
+            ts = db.testsuite.get(name)
+            if ts is None:
+                raise click.BadParameter("Unknown testsuite '%s'" % name,
+                                         param_hint="--testsuite")
+            session = db.make_session()
+            result = retention.apply_policy(session, ts, ts.retention_policy,
+                                            batch_size=batch_size)
+            session.close()
+            for key, value in sorted(result.items()):
+                print("%s: %s %d" % (name, key.replace('_', ' '), value))
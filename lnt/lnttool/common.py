@@ -28,3 +28,20 @@ def init_logger(loglevel, show_sql=False, stream=None):
         sa_logger = logging.getLogger("sqlalchemy")
         sa_logger.setLevel(loglevel)
         sa_logger.addHandler(handler)
+
+
+def sampling_options(func):
+    func = click.option("--adaptive-sampling", "adaptive_sampling",
+                        type=float, default=None, metavar="TARGET",
+                        help="Keep sampling until the width of the "
+                        "confidence interval relative to the median drops "
+                        "below TARGET (e.g. 0.01), the configured number of "
+                        "samples is then the minimum")(func)
+    func = click.option("--max-multisample", "max_multisample", type=int,
+                        default=20, show_default=True, metavar="N",
+                        help="Maximal number of samples with "
+                        "--adaptive-sampling")(func)
+    func = click.option("--sampling-time-budget", "sampling_time_budget",
+                        type=float, default=None, metavar="SECONDS",
+                        help="Stop adaptive sampling after SECONDS")(func)
+    return func
@@ -37,6 +37,35 @@ secret_key = %(secret_key)r
 # REST API authentication
 # api_auth_token = 'secret'
 
+# Data retention settings per test suite, applied by 'lnt apply-retention'.
+# These override the 'retention' section of the test suite schema. Ages are
+# given in days.
+# retention = {
+#     'nts' : { 'aggregate_samples_after' : 90,
+#               'thin_runs_after' : 365,
+#               'archive_profiles_after' : 30 },
+#     }
+
+# Test suites searched for change-points after every submission, see
+# 'lnt detect-changes'. 'window' is the number of recent orders of the machine
+# searched, 'penalty' and 'min_segment_size' tune the detection.
+# changepoint_detection = {
+#     'nts' : { 'window' : 100 },
+#     }
+
+# Keep the rendered pages and API responses in a directory shared by all
+# server processes, until the test suite changes. The least recently used
+# responses are removed once they take more than 'max_size_mb'.
+# response_cache = { 'dir' : 'data/response_cache', 'max_size_mb' : 256 }
+
+# The memory in MB each server process uses to keep recently viewed profiles
+# decoded.
+# profile_cache_size_mb = 256
+
+# The largest request body in MB the server accepts, e.g. a submission or a
+# profile upload, after decompressing it.
+# max_request_size_mb = 256
+
 # The list of available databases, and their properties. At a minimum, there
 # should be a 'default' entry for the default database.
 databases = {
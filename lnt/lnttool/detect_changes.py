@@ -0,0 +1,63 @@
+from __future__ import print_function
+import click
+
+
+@click.command("detect-changes")
+@click.argument("instance_path", type=click.UNPROCESSED)
+@click.option("--database", default="default", show_default=True,
+              help="database to modify")
+@click.option("--testsuite", "testsuites", multiple=True,
+              help="testsuite to process (default: all)")
+@click.option("--machine", "machines", multiple=True,
+              help="name of the machine to process (default: all)")
+@click.option("--window", default=None, type=int,
+              help="only search the last N orders of every machine")
+@click.option("--penalty", default=None, type=float,
+              help="penalty per change-point, larger values find fewer "
+              "changes")
+@click.option("--min-segment-size", default=None, type=int,
+              help="minimum number of orders between change-points")
+@click.option("--jobs", "-j", default=1, show_default=True, type=int,
+              help="number of processes searching for change-points")
+@click.option("--show-sql", is_flag=True,
+              help="show SQL statements")
+def action_detect_changes(instance_path, database, testsuites, machines,
+                          window, penalty, min_segment_size, jobs, show_sql):
+    """detect regressions in the whole history
+
+\b
+Search the history of every machine, test and metric for change-points and
+record them as field changes, attached to new or existing regressions.
+    """
+    from .common import init_logger
+
+    import contextlib
+    import lnt.server.instance
+    import logging
+    from lnt.server.db import changepoints
+
+    init_logger(logging.INFO, show_sql=show_sql)
+    if penalty is None:
+        penalty = changepoints.DEFAULT_PENALTY
+    if min_segment_size is None:
+        min_segment_size = changepoints.DEFAULT_MIN_SEGMENT_SIZE
+
+    instance = lnt.server.instance.Instance.frompath(instance_path)
+    with contextlib.closing(instance.get_database(database)) as db:
+        if not testsuites:
+            testsuites = sorted(db.testsuite.keys())
+        for name in testsuites:
+            ts = db.testsuite.get(name)
+            if ts is None:
+                raise click.BadParameter("Unknown testsuite '%s'" % name,
+                                         param_hint="--testsuite")
+            session = db.make_session()
+            machine_ids = None
+            if machines:
+                machine_ids = [m.id for m in session.query(ts.Machine)
+                               .filter(ts.Machine.name.in_(machines))]
+            created = changepoints.detect_changes(
+                session, ts, machine_ids=machine_ids, window=window,
+                penalty=penalty, min_size=min_segment_size, jobs=jobs)
+            session.close()
+            print("%s: new field changes %d" % (name, created))
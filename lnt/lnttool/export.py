@@ -0,0 +1,82 @@
+from __future__ import print_function
+import click
+
+
+@click.command("export")
+@click.argument("instance_path", type=click.UNPROCESSED)
+@click.argument("output", type=click.Path())
+@click.option("--database", default="default", show_default=True,
+              help="database to export from")
+@click.option("--testsuite", default="nts", show_default=True,
+              help="testsuite to export")
+@click.option("--format", "output_format", default="parquet",
+              show_default=True, type=click.Choice(["parquet", "arrow"]),
+              help="output file format")
+@click.option("--machine", "machines", multiple=True,
+              help="only export samples of this machine")
+@click.option("--start-date", help="only export runs started on or after "
+              "this date (YYYY-MM-DD)")
+@click.option("--end-date", help="only export runs started before this date "
+              "(YYYY-MM-DD)")
+@click.option("--min-order", help="only export orders starting at this one")
+@click.option("--max-order", help="only export orders up to this one")
+@click.option("--after-sample-id", type=int,
+              help="only export samples with a larger id")
+@click.option("--watermark-file", type=click.Path(),
+              help="read the sample id to start after from this file and "
+              "update it after the export")
+@click.option("--batch-size", default=None, type=int,
+              help="number of samples per record batch")
+def action_export(instance_path, output, database, testsuite, output_format,
+                  machines, start_date, end_date, min_order, max_order,
+                  after_sample_id, watermark_file, batch_size):
+    """export samples to a parquet or arrow file
+
+\b
+Writes one row per sample, including the machine, order, run and test the
+sample belongs to. Use --watermark-file to export incrementally: only
+samples submitted since the previous export are written.
+    """
+    import contextlib
+    import os
+    import lnt.server.instance
+    from lnt.server.db import export
+
+    if export.pyarrow is None:
+        raise click.UsageError("'lnt export' requires the 'pyarrow' package")
+    if batch_size is None:
+        batch_size = export.DEFAULT_BATCH_SIZE
+
+    if watermark_file is not None and after_sample_id is None and \
+            os.path.exists(watermark_file):
+        with open(watermark_file) as f:
+            after_sample_id = int(f.read().strip() or 0)
+
+    try:
+        export_filter = export.ExportFilter(
+            machines=list(machines), start_date=export.parse_date(start_date),
+            end_date=export.parse_date(end_date), min_order=min_order,
+            max_order=max_order, after_sample_id=after_sample_id)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    instance = lnt.server.instance.Instance.frompath(instance_path)
+    with contextlib.closing(instance.get_database(database)) as db:
+        ts = db.testsuite.get(testsuite)
+        if ts is None:
+            raise click.BadParameter("Unknown testsuite '%s'" % testsuite,
+                                     param_hint="--testsuite")
+        session = db.make_session()
+        if output_format == "parquet":
+            count, watermark = export.write_parquet(
+                session, ts, output, export_filter, batch_size)
+        else:
+            with open(output, "wb") as sink:
+                count, watermark = export.write_arrow_stream(
+                    session, ts, sink, export_filter, batch_size)
+        session.close()
+
+    if watermark_file is not None:
+        with open(watermark_file, "w") as f:
+            f.write("%d\n" % watermark)
+    print("Exported %d samples, watermark %d" % (count, watermark))
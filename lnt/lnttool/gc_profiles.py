@@ -0,0 +1,50 @@
+from __future__ import print_function
+import click
+
+
+@click.command("gc-profiles")
+@click.argument("instance_path", type=click.UNPROCESSED)
+@click.option("--database", default="default", show_default=True,
+              help="database to modify")
+@click.option("--max-size-mb", type=int, required=True,
+              help="space the profiles of the database may take")
+@click.option("--blob-min-age", default=24, show_default=True, type=int,
+              help="hours after which unused uploaded profiles are removed")
+@click.option("--dry-run", is_flag=True,
+              help="only report what would be removed")
+@click.option("--show-sql", is_flag=True,
+              help="show SQL statements")
+def action_gc_profiles(instance_path, database, max_size_mb, blob_min_age,
+                       dry_run, show_sql):
+    """remove the least recently viewed profiles
+
+\b
+Remove the profiles viewed least recently until the profiles of the database
+take no more than --max-size-mb, and the uploaded profiles no longer used by
+any run.
+    """
+    from .common import init_logger
+
+    import contextlib
+    import lnt.server.instance
+    import logging
+    from lnt.server.db import profilecatalog, profilestore
+
+    init_logger(logging.INFO, show_sql=show_sql)
+
+    instance = lnt.server.instance.Instance.frompath(instance_path)
+    with contextlib.closing(instance.get_database(database)) as db:
+        if db is None:
+            raise click.BadParameter("Unknown database '%s'" % database,
+                                     param_hint="--database")
+        session = db.make_session()
+        removed, freed = profilecatalog.collect_garbage(
+            session, db, max_size_mb * 1024 * 1024, dry_run=dry_run)
+        session.close()
+        print("profiles: removed %d (%d kB)" % (removed, freed / 1024))
+
+        if not dry_run:
+            removed, freed = profilestore.remove_unused_blobs(
+                db.config.profileDir, blob_min_age * 3600)
+            print("uploaded profiles: removed %d (%d kB)" %
+                  (removed, freed / 1024))
@@ -2,8 +2,12 @@
 from __future__ import print_function
 from .common import init_logger
 from .common import submit_options
+from .apply_retention import action_apply_retention
 from .convert import action_convert
 from .create import action_create
+from .detect_changes import action_detect_changes
+from .export import action_export
+from .gc_profiles import action_gc_profiles
 from .import_data import action_import
 from .import_report import action_importreport
 from .updatedb import action_updatedb
@@ -183,14 +187,16 @@ def action_showtests():
 @submit_options
 @click.option("--verbose", "-v", is_flag=True,
               help="show verbose test results")
-def action_submit(url, files, select_machine, merge, verbose):
+@click.option("--jobs", "-j", default=1, show_default=True, type=int,
+              help="number of files to submit to a server concurrently")
+def action_submit(url, files, select_machine, merge, verbose, jobs):
     """submit a test report to the server"""
     from lnt.util import ServerUtil
     import lnt.util.ImportData
 
     results = ServerUtil.submitFiles(url, files, verbose,
                                      select_machine=select_machine,
-                                     merge_run=merge)
+                                     merge_run=merge, jobs=jobs)
     for submitted_file in results:
         if verbose:
             lnt.util.ImportData.print_report_result(
@@ -444,6 +450,29 @@ def command_code_for_function(input, fn):
         list(profile.Profile.fromFile(input).getCodeForFunction(fn))))
 
 
+@action_profile.command("diff")
+@click.argument("input1", type=click.Path(exists=True))
+@click.argument("input2", type=click.Path(exists=True))
+@click.option("--counter", help="counter to rank the functions by "
+              "(default: their largest change)")
+@click.option("--top", default=50, show_default=True, type=int,
+              help="number of functions to report")
+@click.option("--function", "fn", help="also print the aligned code of "
+              "this function")
+@click.option("--sortkeys", is_flag=True)
+def command_diff(input1, input2, counter, top, fn, sortkeys):
+    """print the functions which changed most between two profiles"""
+    import json
+    import lnt.testing.profile.diff as diff
+    import lnt.testing.profile.profile as profile
+    p1 = profile.Profile.fromFile(input1)
+    p2 = profile.Profile.fromFile(input2)
+    result = diff.diff_profiles(p1, p2, counter=counter, top=top)
+    if fn is not None:
+        result['code'] = diff.diff_function(p1, p2, fn)
+    print(json.dumps(result, sort_keys=sortkeys))
+
+
 def _version_check():
     """
     Check that the installed version of the LNT is up-to-date with the running
@@ -491,10 +520,14 @@ Use ``lnt <command> --help`` for more information on a specific command.
     _version_check()
 
 
+main.add_command(action_apply_retention)
 main.add_command(action_check_no_errors)
 main.add_command(action_checkformat)
 main.add_command(action_convert)
 main.add_command(action_create)
+main.add_command(action_detect_changes)
+main.add_command(action_export)
+main.add_command(action_gc_profiles)
 main.add_command(action_import)
 main.add_command(action_importreport)
 main.add_command(action_profile)
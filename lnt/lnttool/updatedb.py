@@ -17,17 +17,22 @@ import click
               multiple=True, help="run ids to delete", type=int)
 @click.option("--delete-order", default=[], show_default=True,
               help="run ids to delete")
+@click.option("--batch-size", default=None, type=click.IntRange(min=1),
+              help="number of runs to delete per transaction")
 def action_updatedb(instance_path, database, testsuite, tmp_dir, show_sql,
-                    delete_machines, delete_runs, delete_order):
+                    delete_machines, delete_runs, delete_order, batch_size):
     """modify a database"""
     from .common import init_logger
 
     import contextlib
     import lnt.server.instance
     import logging
+    from lnt.server.db import deletion
 
     init_logger(logging.INFO if show_sql else logging.WARNING,
                 show_sql=show_sql)
+    if batch_size is None:
+        batch_size = deletion.DEFAULT_BATCH_SIZE
 
     # Load the instance.
     instance = lnt.server.instance.Instance.frompath(instance_path)
@@ -38,18 +43,23 @@ def action_updatedb(instance_path, database, testsuite, tmp_dir, show_sql,
         ts = db.testsuite[testsuite]
         # Compute a list of all the runs to delete.
         if delete_order:
-            runs = session.query(ts.Run).join(ts.Order) \
-                .filter(ts.Order.id == delete_order).all()
-        else:
-            runs = session.query(ts.Run) \
+            run_ids = session.query(ts.Run.id) \
+                .filter(ts.Run.order_id == delete_order).all()
+        elif delete_runs:
+            run_ids = session.query(ts.Run.id) \
                 .filter(ts.Run.id.in_(delete_runs)).all()
-        for run in runs:
-            session.delete(run)
+        else:
+            run_ids = []
+        run_ids = [run_id for run_id, in run_ids]
+        for _ in deletion.delete_runs(session, ts, run_ids, batch_size):
+            pass
 
         if delete_machines:
             machines = session.query(ts.Machine) \
                 .filter(ts.Machine.name.in_(delete_machines)).all()
             for machine in machines:
-                session.delete(machine)
+                for _ in deletion.delete_machine(session, ts, machine,
+                                                 batch_size):
+                    pass
 
         session.commit()
@@ -8,6 +8,10 @@ import tempfile
 
 import lnt.server.db.v4db
 
+# The default limit of the size of request bodies, see
+# Config.max_request_size_mb.
+DEFAULT_MAX_REQUEST_SIZE_MB = 256
+
 
 class EmailConfig:
     @staticmethod
@@ -117,6 +121,15 @@ class Config:
         else:
             blacklist = None
         secretKey = data.get('secret_key', None)
+        retention = data.get('retention', {})
+        changepoint_detection = data.get('changepoint_detection', {})
+        response_cache = data.get('response_cache')
+        if response_cache:
+            response_cache = dict(response_cache)
+            response_cache['dir'] = os.path.join(
+                baseDir, response_cache.get('dir', 'data/response_cache'))
+        profile_cache_size_mb = data.get('profile_cache_size_mb')
+        max_request_size_mb = data.get('max_request_size_mb')
 
         return Config(data.get('name', 'LNT'), data['zorgURL'],
                       dbDir, os.path.join(baseDir, tempDir),
@@ -125,7 +138,9 @@ class Config:
                                                  default_email_config,
                                                  0))
                            for k, v in data['databases'].items()]),
-                      blacklist, schemasDir, api_auth_token)
+                      blacklist, schemasDir, api_auth_token, retention,
+                      changepoint_detection, response_cache,
+                      profile_cache_size_mb, max_request_size_mb)
 
     @staticmethod
     def dummy_instance():
@@ -159,7 +174,12 @@ class Config:
                  databases,
                  blacklist,
                  schemasDir,
-                 api_auth_token=None):
+                 api_auth_token=None,
+                 retention=None,
+                 changepoint_detection=None,
+                 response_cache=None,
+                 profile_cache_size_mb=None,
+                 max_request_size_mb=None):
         self.name = name
         self.zorgURL = zorgURL
         self.dbDir = dbDir
@@ -174,6 +194,19 @@ class Config:
         for db in self.databases.values():
             db.config = self
         self.api_auth_token = api_auth_token
+        # Per test suite retention settings, see lnt.server.db.retention.
+        self.retention = retention or {}
+        # Per test suite change-point detection settings, see
+        # lnt.server.db.changepoints.
+        self.changepoint_detection = changepoint_detection or {}
+        # Settings of the shared response cache, see lnt.server.ui.caching.
+        self.response_cache = response_cache
+        # Memory used by the decoded profiles of each server process, see
+        # lnt.server.ui.profile_service.
+        self.profile_cache_size_mb = profile_cache_size_mb
+        # The largest request body the server accepts, after decompression.
+        self.max_request_size_mb = max_request_size_mb or \
+            DEFAULT_MAX_REQUEST_SIZE_MB
 
     def get_database(self, name):
         """
@@ -0,0 +1,350 @@
+"""
+Change-point detection over the whole history of a test.
+
+The field changes created on submission compare a run against the previous
+``FIELD_CHANGE_LOOKBACK`` runs only, so slow drifts and steps hidden by a few
+noisy runs are missed. This module segments the complete series of every
+(machine, test, metric) instead:
+
+* The samples of a series are aggregated per order (minimum, or maximum if
+  bigger is better) and sorted by order.
+* The series is segmented with PELT (pruned exact linear time, Killick et al.
+  2012) using a squared error cost normalized by a robust estimate of the
+  noise, estimated from the median absolute deviation of consecutive values,
+  and a penalty of ``penalty * log(n)`` per change-point.
+* Every change-point is confirmed by a Mann-Whitney U test between the
+  adjacent segments and has to change the segment median by at least
+  ``MIN_PERCENTAGE_CHANGE``. Rejected change-points merge their segments.
+
+Each confirmed change-point becomes a FieldChange from the last order before
+the change to the first order after it, attached to a regression like the
+field changes created on submission. Field changes already covering the change
+are left alone, so detection can be repeated as history grows.
+
+Detection is run with ``lnt detect-changes`` over a whole database, or
+incrementally after every submission by the ``detect_changepoints`` rule for
+the test suites configured in the ``changepoint_detection`` dictionary of
+``lnt.cfg``.
+"""
+import collections
+import math
+import multiprocessing
+
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+
+from lnt.server.db.fieldchange import identify_related_changes
+from lnt.server.db.regression import RegressionState
+from lnt.server.reporting.analysis import MIN_PERCENTAGE_CHANGE
+from lnt.testing import PASS
+from lnt.util import logger
+from lnt.util import stats
+
+# Penalty per change-point, in units of log(number of orders).
+DEFAULT_PENALTY = 3.0
+
+# Minimum number of orders in a segment.
+DEFAULT_MIN_SEGMENT_SIZE = 3
+
+# Significance level of the test confirming a change-point.
+DEFAULT_CONFIDENCE = 0.05
+
+# Number of series detected per task sent to a worker process.
+_CHUNK_SIZE = 64
+
+# Maximum number of values in the IN clauses of the sample query, sqlite limits
+# the number of parameters of a statement.
+_MAX_IN_VALUES = 500
+
+# Lower bound of the noise estimate, relative to the median of the series.
+# Series without noise would otherwise turn every change into an infinite
+# cost reduction.
+_MIN_RELATIVE_NOISE = 1e-3
+
+Series = collections.namedtuple('Series', ['machine_id', 'test_id',
+                                           'field_id', 'order_ids', 'values'])
+
+ChangePoint = collections.namedtuple('ChangePoint', ['index', 'old_value',
+                                                     'new_value'])
+
+
+def _noise_variance(values):
+    """Robust estimate of the variance of the noise of values.
+
+    Differences of consecutive values cancel out the steps of the series
+    except at the change-points, so their median absolute deviation is not
+    affected by them."""
+    diffs = [b - a for a, b in zip(values, values[1:])]
+    # 1.4826 scales the MAD to a standard deviation for normal noise, and
+    # the difference of two values has twice the variance of the noise.
+    sigma = 1.4826 * stats.median_absolute_deviation(diffs) / math.sqrt(2)
+    floor = _MIN_RELATIVE_NOISE * abs(stats.median(values))
+    sigma = max(sigma, floor, 1e-12)
+    return sigma * sigma
+
+
+def segment(values, penalty=DEFAULT_PENALTY,
+            min_size=DEFAULT_MIN_SEGMENT_SIZE):
+    """segment(values, [penalty], [min_size]) -> [index]
+
+    Return the optimal change-points of values, as the indices of the first
+    value of every segment but the first, using PELT."""
+    n = len(values)
+    if n < 2 * min_size:
+        return []
+
+    variance = _noise_variance(values)
+    beta = penalty * math.log(n)
+    s1 = [0.0]
+    s2 = [0.0]
+    for v in values:
+        v = float(v)
+        s1.append(s1[-1] + v)
+        s2.append(s2[-1] + v * v)
+
+    def cost(s, t):
+        total = s1[t] - s1[s]
+        return (s2[t] - s2[s] - total * total / (t - s)) / variance
+
+    best = [None] * (n + 1)
+    best[0] = -beta
+    last = [0] * (n + 1)
+    candidates = [0]
+    for t in range(min_size, n + 1):
+        # A segment may start at s once a segment can end there.
+        s = t - min_size
+        if s >= min_size and best[s] is not None:
+            candidates.append(s)
+
+        costs = [(best[start] + cost(start, t), start)
+                 for start in candidates]
+        best[t], last[t] = min(costs)
+        best[t] += beta
+        # Candidates which can not be optimal now can never be later.
+        candidates = [start for c, start in costs if c <= best[t]]
+
+    changepoints = []
+    t = last[n]
+    while t > 0:
+        changepoints.append(t)
+        t = last[t]
+    changepoints.reverse()
+    return changepoints
+
+
+def detect(values, penalty=DEFAULT_PENALTY, min_size=DEFAULT_MIN_SEGMENT_SIZE,
+           confidence=DEFAULT_CONFIDENCE):
+    """detect(values, ...) -> [ChangePoint]
+
+    Return the significant change-points of values, with the median values
+    of the segments before and after each of them."""
+    bounds = [0] + segment(values, penalty, min_size) + [len(values)]
+    result = []
+    start = 0
+    for i in range(1, len(bounds) - 1):
+        before = values[start:bounds[i]]
+        after = values[bounds[i]:bounds[i + 1]]
+        old_value = stats.median(before)
+        new_value = stats.median(after)
+        if old_value == 0:
+            significant = new_value != 0
+        else:
+            delta = abs(new_value - old_value) / abs(old_value)
+            significant = delta >= MIN_PERCENTAGE_CHANGE
+        significant = significant and \
+            stats.mannwhitneyu_pvalue(before, after) < confidence
+        if significant:
+            result.append(ChangePoint(bounds[i], old_value, new_value))
+            start = bounds[i]
+        elif result:
+            # The segments merge, update the value after the last change.
+            result[-1] = result[-1]._replace(
+                new_value=stats.median(values[start:bounds[i + 1]]))
+    return result
+
+
+def _detect_series(args):
+    series, penalty, min_size, confidence = args
+    return series, detect(series.values, penalty, min_size, confidence)
+
+
+def detect_all(series, penalty=DEFAULT_PENALTY,
+               min_size=DEFAULT_MIN_SEGMENT_SIZE,
+               confidence=DEFAULT_CONFIDENCE, jobs=1):
+    """detect_all(series, ..., [jobs]) -> iterator of (Series, [ChangePoint])
+
+    Detect the change-points of all series, using jobs worker processes."""
+    tasks = ((s, penalty, min_size, confidence) for s in series)
+    if jobs <= 1:
+        for task in tasks:
+            yield _detect_series(task)
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for result in pool.imap_unordered(_detect_series, tasks,
+                                          _CHUNK_SIZE):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _sorted_orders(session, ts, machine_id):
+    """Return the orders of the runs on the machine in ascending order."""
+    return session.query(ts.Order) \
+        .join(ts.Run) \
+        .filter(ts.Run.machine_id == machine_id) \
+        .distinct() \
+        .order_by(ts.Order.sort_key, ts.Order.id) \
+        .all()
+
+
+def load_series(session, ts, machine_id, orders, test_ids=None,
+                min_length=2 * DEFAULT_MIN_SEGMENT_SIZE):
+    """load_series(session, ts, machine_id, orders, [test_ids]) -> [Series]
+
+    Load the series of every test and metric on the machine for the given
+    sorted orders. Samples are aggregated per order, failing samples are
+    ignored."""
+    order_index = dict((o.id, i) for i, o in enumerate(orders))
+    if test_ids is not None:
+        test_ids = set(test_ids)
+    result = []
+    for field in ts.Sample.get_metric_fields():
+        q = session.query(ts.Run.order_id, ts.Sample.test_id, field.column) \
+            .select_from(ts.Sample) \
+            .join(ts.Run) \
+            .filter(ts.Run.machine_id == machine_id) \
+            .filter(field.column.isnot(None))
+        if field.status_field is not None:
+            q = q.filter((field.status_field.column == PASS) |
+                         (field.status_field.column.is_(None)))
+        # Short lists of tests and orders are selected in the query, other
+        # samples are skipped below.
+        if test_ids is not None and len(test_ids) <= _MAX_IN_VALUES:
+            q = q.filter(ts.Sample.test_id.in_(test_ids))
+        if len(order_index) <= _MAX_IN_VALUES:
+            q = q.filter(ts.Run.order_id.in_(order_index.keys()))
+
+        values = collections.defaultdict(lambda: collections.defaultdict(list))
+        for order_id, test_id, value in q:
+            index = order_index.get(order_id)
+            if index is None or (test_ids is not None and
+                                 test_id not in test_ids):
+                continue
+            values[test_id][index].append(value)
+
+        aggregate = stats.safe_max if field.bigger_is_better else \
+            stats.safe_min
+        for test_id, by_order in sorted(values.items()):
+            if len(by_order) < min_length:
+                continue
+            indices = sorted(by_order)
+            result.append(Series(
+                machine_id, test_id, field.id,
+                [orders[i].id for i in indices],
+                [aggregate(by_order[i]) for i in indices]))
+    return result
+
+
+def _covered_changes(session, ts, machine_id, order_index):
+    """Return the (test, field) keys of the existing field changes on the
+    machine, with the range of order indices they cover."""
+    covered = collections.defaultdict(list)
+    q = session.query(ts.FieldChange.test_id, ts.FieldChange.field_id,
+                      ts.FieldChange.start_order_id,
+                      ts.FieldChange.end_order_id) \
+        .filter(ts.FieldChange.machine_id == machine_id)
+    for test_id, field_id, start_order_id, end_order_id in q:
+        start = order_index.get(start_order_id)
+        end = order_index.get(end_order_id)
+        if start is not None and end is not None:
+            covered[(test_id, field_id)].append((start, end))
+    return covered
+
+
+def detect_changes(session, ts, machine_ids=None, test_ids=None, window=None,
+                   penalty=DEFAULT_PENALTY, min_size=DEFAULT_MIN_SEGMENT_SIZE,
+                   confidence=DEFAULT_CONFIDENCE, jobs=1):
+    """detect_changes(session, ts, ...) -> int
+
+    Detect the change-points in the history of the given machines (default:
+    all) and tests (default: all), or of the last window orders of every
+    machine, and record them as field changes. Returns the number of field
+    changes created."""
+    if machine_ids is None:
+        machine_ids = [m.id for m in session.query(ts.Machine.id)]
+
+    active_indicators = session.query(ts.FieldChange) \
+        .join(ts.RegressionIndicator) \
+        .join(ts.Regression) \
+        .filter(or_(ts.Regression.state == RegressionState.DETECTED,
+                    ts.Regression.state == RegressionState.DETECTED_FIXED)) \
+        .options(joinedload(ts.FieldChange.start_order),
+                 joinedload(ts.FieldChange.end_order),
+                 joinedload(ts.FieldChange.test),
+                 joinedload(ts.FieldChange.machine)) \
+        .all()
+
+    created = 0
+    for machine_id in machine_ids:
+        orders = _sorted_orders(session, ts, machine_id)
+        # Change-points close to the start of a window are misplaced when the
+        # segment before them is cut off, they were found before anyway.
+        first_index = 0
+        if window is not None and len(orders) > window:
+            orders = orders[-window:]
+            first_index = 2 * min_size
+        series = load_series(session, ts, machine_id, orders, test_ids,
+                             2 * min_size)
+        if not series:
+            continue
+        logger.info("Detecting change-points in %d series of machine %d" %
+                    (len(series), machine_id))
+
+        order_index = dict((o.id, i) for i, o in enumerate(orders))
+        covered = _covered_changes(session, ts, machine_id, order_index)
+        for s, changepoints in detect_all(series, penalty, min_size,
+                                          confidence, jobs):
+            for cp in changepoints:
+                if cp.index < first_index:
+                    continue
+                start = order_index[s.order_ids[cp.index - 1]]
+                end = order_index[s.order_ids[cp.index]]
+                # Skip changes already known, also if they were placed a few
+                # orders apart.
+                ranges = covered[(s.test_id, s.field_id)]
+                if any(a < end + min_size - 1 and b > start - min_size + 1
+                       for a, b in ranges):
+                    continue
+                ranges.append((start, end))
+                _add_fieldchange(session, ts, s, orders[start], orders[end],
+                                 cp, active_indicators)
+                created += 1
+        session.commit()
+    return created
+
+
+def _add_fieldchange(session, ts, series, start_order, end_order, cp,
+                     active_indicators):
+    run = session.query(ts.Run) \
+        .filter(ts.Run.machine_id == series.machine_id) \
+        .filter(ts.Run.order_id == end_order.id) \
+        .order_by(ts.Run.id.desc()) \
+        .first()
+    fc = ts.FieldChange(start_order=start_order,
+                        end_order=end_order,
+                        machine=run.machine,
+                        test=session.query(ts.Test).get(series.test_id),
+                        field_id=series.field_id)
+    fc.old_value = cp.old_value
+    fc.new_value = cp.new_value
+    fc.run = run
+    session.add(fc)
+    # New regressions refer to the change by id.
+    session.flush()
+    identify_related_changes(session, ts, fc, active_indicators)
+    logger.info("Found change-point: %s %s %s %s" %
+                (fc.machine.name, fc.test.name, start_order.name,
+                 end_order.name))
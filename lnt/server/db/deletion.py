@@ -0,0 +1,246 @@
+"""
+Set based deletion of runs, machines and orders.
+
+Deleting objects with ``session.delete()`` makes SQLAlchemy load every
+dependent row to process the ORM cascades. For machines with thousands of runs
+this takes hours and lots of memory. The functions in this module issue
+``DELETE ... WHERE ... IN (...)`` statements against the dependent tables
+instead and work through the runs in batches, so callers can report progress.
+"""
+import os
+
+from lnt.server.db import profilecatalog
+from lnt.util import logger
+
+# Number of runs removed per transaction.
+DEFAULT_BATCH_SIZE = 100
+
+
+def _delete_field_changes(session, ts, criterion):
+    """Delete the FieldChanges matching criterion, together with their
+    RegressionIndicators and ChangeIgnores. Regressions left without any
+    indicator are deleted as well."""
+    fieldchange_ids = session.query(ts.FieldChange.id).filter(criterion)
+
+    regression_ids = set(
+        r for r, in session.query(ts.RegressionIndicator.regression_id)
+        .filter(ts.RegressionIndicator.field_change_id.in_(fieldchange_ids))
+        .distinct())
+
+    session.query(ts.RegressionIndicator) \
+        .filter(ts.RegressionIndicator.field_change_id.in_(fieldchange_ids)) \
+        .delete(synchronize_session=False)
+    session.query(ts.ChangeIgnore) \
+        .filter(ts.ChangeIgnore.field_change_id.in_(fieldchange_ids)) \
+        .delete(synchronize_session=False)
+    session.query(ts.FieldChange).filter(criterion) \
+        .delete(synchronize_session=False)
+
+    if regression_ids:
+        remaining = set(
+            r for r, in session.query(ts.RegressionIndicator.regression_id)
+            .filter(ts.RegressionIndicator.regression_id.in_(regression_ids))
+            .distinct())
+        orphans = regression_ids - remaining
+        if orphans:
+            logger.info("Deleting regressions without changes: %s" %
+                        ", ".join(str(r) for r in sorted(orphans)))
+            session.query(ts.Regression) \
+                .filter(ts.Regression.id.in_(orphans)) \
+                .delete(synchronize_session=False)
+
+
+def _delete_orphaned_profiles(session, ts, profiles):
+    """Delete the profiles from the (id, filename) list which are no longer
+    referenced by any sample. Returns the file names of the deleted
+    profiles."""
+    if not profiles:
+        return []
+    profile_ids = set(p.id for p in profiles)
+    still_used = set(
+        p for p, in session.query(ts.Sample.profile_id)
+        .filter(ts.Sample.profile_id.in_(profile_ids))
+        .distinct())
+    orphans = profile_ids - still_used
+    if not orphans:
+        return []
+    session.query(ts.Profile) \
+        .filter(ts.Profile.id.in_(orphans)) \
+        .delete(synchronize_session=False)
+    filenames = [p.filename for p in profiles
+                 if p.id in orphans and p.filename]
+    profilecatalog.remove(session, filenames)
+    return filenames
+
+
+def _query_sample_profiles(session, ts, criterion):
+    return session.query(ts.Profile.id, ts.Profile.filename) \
+        .join(ts.Sample, ts.Sample.profile_id == ts.Profile.id) \
+        .filter(criterion) \
+        .distinct() \
+        .all()
+
+
+def delete_samples(session, ts, sample_ids):
+    """Delete the samples with the given ids and the profiles only they
+    referenced.
+
+    Returns the file names of the deleted profiles; the caller should pass
+    them to remove_profile_files() once the transaction is committed."""
+    if not sample_ids:
+        return []
+    profiles = _query_sample_profiles(session, ts,
+                                      ts.Sample.id.in_(sample_ids))
+    session.query(ts.Sample) \
+        .filter(ts.Sample.id.in_(sample_ids)) \
+        .delete(synchronize_session=False)
+    return _delete_orphaned_profiles(session, ts, profiles)
+
+
+def _delete_run_batch(session, ts, run_ids):
+    """Delete the runs with the given ids and everything hanging off them.
+
+    Returns the file names of the profiles which are no longer referenced."""
+    profiles = _query_sample_profiles(session, ts,
+                                      ts.Sample.run_id.in_(run_ids))
+
+    _delete_field_changes(session, ts, ts.FieldChange.run_id.in_(run_ids))
+    session.query(ts.Sample) \
+        .filter(ts.Sample.run_id.in_(run_ids)) \
+        .delete(synchronize_session=False)
+    filenames = _delete_orphaned_profiles(session, ts, profiles)
+
+    session.query(ts.Run) \
+        .filter(ts.Run.id.in_(run_ids)) \
+        .delete(synchronize_session=False)
+    return filenames
+
+
+def remove_profile_files(ts, filenames):
+    """Remove the given files from the profile directory."""
+    config = ts.v4db.config
+    if config is None or not filenames:
+        return
+    for filename in filenames:
+        path = os.path.join(config.profileDir, filename)
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning("Could not remove profile %s: %s" % (path, e))
+
+
+def delete_orphaned_orders(session, ts, order_ids):
+    """Delete the orders from order_ids which are no longer referenced by any
+    run, field change or baseline. The total ordering linked list is patched
+    up to skip the deleted orders. Returns the number of deleted orders."""
+    candidates = set(order_ids)
+    if not candidates:
+        return 0
+
+    referenced = set()
+    for column in (ts.Run.order_id, ts.FieldChange.start_order_id,
+                   ts.FieldChange.end_order_id, ts.Baseline.order_id):
+        referenced.update(
+            o for o, in session.query(column)
+            .filter(column.in_(candidates))
+            .distinct())
+    orphans = candidates - referenced
+    if not orphans:
+        return 0
+
+    links = dict(
+        (order_id, (previous_id, next_id))
+        for order_id, previous_id, next_id in
+        session.query(ts.Order.id, ts.Order.previous_order_id,
+                      ts.Order.next_order_id)
+        .filter(ts.Order.id.in_(orphans)))
+
+    def closest_survivor(order_id, direction):
+        while order_id in links:
+            order_id = links[order_id][direction]
+        return order_id
+
+    for order_id, (previous_id, next_id) in links.items():
+        previous_id = closest_survivor(previous_id, 0)
+        next_id = closest_survivor(next_id, 1)
+        if previous_id is not None:
+            session.query(ts.Order) \
+                .filter(ts.Order.id == previous_id) \
+                .update({ts.Order.next_order_id: next_id},
+                        synchronize_session=False)
+        if next_id is not None:
+            session.query(ts.Order) \
+                .filter(ts.Order.id == next_id) \
+                .update({ts.Order.previous_order_id: previous_id},
+                        synchronize_session=False)
+
+    # Unlink the orphans from each other first, some databases check the self
+    # referencing foreign keys row by row.
+    session.query(ts.Order) \
+        .filter(ts.Order.id.in_(orphans)) \
+        .update({ts.Order.previous_order_id: None,
+                 ts.Order.next_order_id: None},
+                synchronize_session=False)
+    session.query(ts.Order) \
+        .filter(ts.Order.id.in_(orphans)) \
+        .delete(synchronize_session=False)
+    logger.info("Deleted orphaned orders %s" %
+                " ".join(str(o) for o in sorted(orphans)))
+    return len(orphans)
+
+
+def delete_runs(session, ts, run_ids, batch_size=DEFAULT_BATCH_SIZE,
+                cleanup_orders=True):
+    """Delete the runs with the given ids, together with their samples,
+    profiles and field changes. If cleanup_orders is set, orders that become
+    unused are deleted as well.
+
+    This is a generator: it deletes one batch of runs per step, commits, and
+    yields a progress message. It must be exhausted for the deletion to
+    complete."""
+    run_ids = sorted(run_ids)
+    count = len(run_ids)
+    order_ids = set()
+    for at in range(0, count, batch_size):
+        batch = run_ids[at:at + batch_size]
+        msg = "Deleting runs %s (%d/%d)" % \
+            (" ".join(str(run_id) for run_id in batch), at + len(batch),
+             count)
+        logger.info(msg)
+        yield msg
+
+        order_ids.update(
+            o for o, in session.query(ts.Run.order_id)
+            .filter(ts.Run.id.in_(batch))
+            .distinct())
+        filenames = _delete_run_batch(session, ts, batch)
+        session.commit()
+        remove_profile_files(ts, filenames)
+
+    if cleanup_orders and delete_orphaned_orders(session, ts, order_ids):
+        session.commit()
+    session.expire_all()
+
+
+def delete_machine(session, ts, machine, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete a machine with all its runs. Like delete_runs this is a
+    generator yielding progress messages."""
+    machine_id = machine.id
+    machine_name = "%s:%s" % (machine.name, machine.id)
+    # Remove the field changes first, so the orders they reference can be
+    # cleaned up together with the runs.
+    _delete_field_changes(session, ts,
+                          ts.FieldChange.machine_id == machine_id)
+    run_ids = [r for r, in session.query(ts.Run.id)
+               .filter(ts.Run.machine_id == machine_id)]
+    for msg in delete_runs(session, ts, run_ids, batch_size):
+        yield msg
+
+    session.query(ts.Machine) \
+        .filter(ts.Machine.id == machine_id) \
+        .delete(synchronize_session=False)
+    session.commit()
+    session.expire_all()
+    msg = "Deleted machine %s" % machine_name
+    logger.info(msg)
+    yield msg
@@ -0,0 +1,243 @@
+"""
+Columnar export of test suite samples.
+
+The samples of a test suite are joined with their machine, order, run and test
+and streamed as Apache Arrow record batches, which can be written as an Arrow
+IPC stream or as a Parquet file. This is meant for offline analysis of large
+amounts of data where the row-based JSON API is too slow.
+
+Sample ids only ever grow, so the largest exported sample id serves as a
+watermark for incremental exports: passing it as ``after_sample_id`` to the
+next export only returns samples submitted since.
+
+This module requires the optional ``pyarrow`` package.
+"""
+import datetime
+
+import sqlalchemy
+
+from lnt.server.ui.util import ORDER_SORT_KEY_SIZE, order_sort_key
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Number of samples per record batch.
+DEFAULT_BATCH_SIZE = 65536
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def check_available():
+    if pyarrow is None:
+        raise RuntimeError("Exporting requires the 'pyarrow' package")
+
+
+class ExportFilter(object):
+    """Describes the samples to export. All criteria are optional:
+
+    machines: list of machine names.
+    start_date, end_date: only runs started in [start_date, end_date).
+    min_order, max_order: only orders in [min_order, max_order] (inclusive),
+        given as the value of the primary order field.
+    after_sample_id: watermark of a previous export.
+    """
+
+    def __init__(self, machines=None, start_date=None, end_date=None,
+                 min_order=None, max_order=None, after_sample_id=None):
+        self.machines = machines
+        self.start_date = start_date
+        self.end_date = end_date
+        self.min_order = min_order
+        self.max_order = max_order
+        # Compared with the stored, possibly truncated, sort keys.
+        self._min_key = order_sort_key([min_order], ORDER_SORT_KEY_SIZE) \
+            if min_order is not None else None
+        self._max_key = order_sort_key([max_order], ORDER_SORT_KEY_SIZE) \
+            if max_order is not None else None
+        self.after_sample_id = after_sample_id
+
+    def apply(self, session, ts, query):
+        if self.machines:
+            query = query.filter(ts.Machine.name.in_(self.machines))
+        if self.start_date is not None:
+            query = query.filter(ts.Run.start_time >= self.start_date)
+        if self.end_date is not None:
+            query = query.filter(ts.Run.start_time < self.end_date)
+        # The sort key of an order starts with the sort key of its primary
+        # field, see order_sort_key.
+        if self._min_key is not None:
+            query = query.filter(ts.Order.sort_key >= self._min_key)
+        if self._max_key is not None:
+            query = query.filter(
+                sqlalchemy.func.substr(ts.Order.sort_key, 1,
+                                       len(self._max_key)) <= self._max_key)
+        if self.after_sample_id is not None:
+            query = query.filter(ts.Sample.id > self.after_sample_id)
+        return query
+
+
+def _columns(ts):
+    """Return a list of (name, sqlalchemy column, arrow type) describing the
+    exported table."""
+    columns = [
+        ('sample_id', ts.Sample.id, pyarrow.int64()),
+        ('run_id', ts.Run.id, pyarrow.int64()),
+        ('start_time', ts.Run.start_time, pyarrow.timestamp('us')),
+        ('machine_id', ts.Machine.id, pyarrow.int64()),
+        ('machine', ts.Machine.name, pyarrow.string()),
+        ('order_id', ts.Order.id, pyarrow.int64()),
+    ]
+    for field in ts.Order.fields:
+        columns.append((field.name, field.column, pyarrow.string()))
+    columns += [
+        ('test_id', ts.Test.id, pyarrow.int64()),
+        ('test', ts.Test.name, pyarrow.string()),
+    ]
+    for field in ts.sample_fields:
+        type_name = field.type.name
+        if type_name == 'Real':
+            arrow_type = pyarrow.float64()
+        elif type_name == 'Status':
+            arrow_type = pyarrow.int64()
+        else:
+            arrow_type = pyarrow.string()
+        columns.append((field.name, field.column, arrow_type))
+
+    names = [name for name, _, _ in columns]
+    if len(set(names)) != len(names):
+        raise ValueError("test suite '%s' has clashing field names" % ts.name)
+    return columns
+
+
+def schema(ts):
+    """Return the arrow schema of the exported table."""
+    check_available()
+    return pyarrow.schema([pyarrow.field(name, arrow_type)
+                           for name, _, arrow_type in _columns(ts)])
+
+
+def iter_record_batches(session, ts, export_filter=None,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """Yield the samples selected by export_filter as arrow record batches,
+    ordered by sample id."""
+    check_available()
+    columns = _columns(ts)
+    query = session.query(*[column for _, column, _ in columns]) \
+        .select_from(ts.Sample) \
+        .join(ts.Run, ts.Sample.run_id == ts.Run.id) \
+        .join(ts.Machine, ts.Run.machine_id == ts.Machine.id) \
+        .join(ts.Order, ts.Run.order_id == ts.Order.id) \
+        .join(ts.Test, ts.Sample.test_id == ts.Test.id)
+    if export_filter is not None:
+        query = export_filter.apply(session, ts, query)
+    query = query.order_by(ts.Sample.id)
+
+    names = [name for name, _, _ in columns]
+    types = [arrow_type for _, _, arrow_type in columns]
+    rows = []
+    for row in query.yield_per(batch_size):
+        rows.append(row)
+        if len(rows) == batch_size:
+            yield _make_batch(rows, names, types)
+            rows = []
+    if rows:
+        yield _make_batch(rows, names, types)
+
+
+def _make_batch(rows, names, types):
+    arrays = [pyarrow.array(list(values), type=arrow_type)
+              for values, arrow_type in zip(zip(*rows), types)]
+    return pyarrow.RecordBatch.from_arrays(arrays, names)
+
+
+def _watermark(batch, watermark):
+    if batch.num_rows:
+        watermark = max(watermark, batch.column(0)[batch.num_rows - 1]
+                        .as_py())
+    return watermark
+
+
+def write_parquet(session, ts, path, export_filter=None,
+                  batch_size=DEFAULT_BATCH_SIZE):
+    """Write the selected samples to a parquet file. Returns the number of
+    samples written and the new watermark (the largest sample id)."""
+    writer = pyarrow.parquet.ParquetWriter(path, schema(ts))
+    count, watermark = _write_batches(
+        session, ts, export_filter, batch_size,
+        lambda batch: writer.write_table(
+            pyarrow.Table.from_batches([batch])))
+    writer.close()
+    return count, watermark
+
+
+def write_arrow_stream(session, ts, sink, export_filter=None,
+                       batch_size=DEFAULT_BATCH_SIZE):
+    """Write the selected samples as an arrow IPC stream to sink. Returns the
+    number of samples written and the new watermark."""
+    writer = pyarrow.RecordBatchStreamWriter(sink, schema(ts))
+    count, watermark = _write_batches(session, ts, export_filter, batch_size,
+                                      writer.write_batch)
+    writer.close()
+    return count, watermark
+
+
+def _write_batches(session, ts, export_filter, batch_size, write):
+    count = 0
+    watermark = export_filter.after_sample_id \
+        if export_filter is not None and export_filter.after_sample_id \
+        else 0
+    for batch in iter_record_batches(session, ts, export_filter, batch_size):
+        write(batch)
+        count += batch.num_rows
+        watermark = _watermark(batch, watermark)
+    return count, watermark
+
+
+class _ChunkSink(object):
+    """File-like object collecting the bytes written by an arrow writer."""
+
+    def __init__(self):
+        self.closed = False
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow_stream_chunks(session, ts, export_filter=None,
+                             batch_size=DEFAULT_BATCH_SIZE):
+    """Yield an arrow IPC stream of the selected samples as chunks of bytes,
+    one per record batch. Suitable for streaming HTTP responses."""
+    sink = _ChunkSink()
+    writer = pyarrow.RecordBatchStreamWriter(sink, schema(ts))
+    for batch in iter_record_batches(session, ts, export_filter, batch_size):
+        writer.write_batch(batch)
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD[ HH:MM:SS] date used in export filters."""
+    if value is None:
+        return None
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError("Invalid date '%s', expected YYYY-MM-DD" % value)
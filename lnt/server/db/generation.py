@@ -0,0 +1,73 @@
+"""
+Change generations of the test suites.
+
+Every flush and every bulk ``UPDATE`` or ``DELETE`` of a session which
+writes to the tables of a test suite increments the generation of that test
+suite, in the same transaction. Readers can then tell whether anything in a
+test suite changed with one cheap query, see lnt.server.ui.caching.
+"""
+import sqlalchemy
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+metadata = MetaData()
+
+generation_table = Table(
+    'TestSuiteGeneration', metadata,
+    Column('Name', String(256), primary_key=True),
+    Column('Generation', Integer, nullable=False))
+
+# Test suite name of every table of a test suite.
+_suite_of_table = {}
+
+
+def register_tables(ts_name, tables):
+    """Record that changes to the tables are changes of test suite
+    `ts_name`."""
+    for table in tables:
+        _suite_of_table[table] = ts_name
+
+
+def _increment(session, ts_names):
+    connection = session.connection()
+    for name in sorted(ts_names):
+        column = generation_table.c.Generation
+        result = connection.execute(
+            generation_table.update()
+            .where(generation_table.c.Name == name)
+            .values(Generation=column + 1))
+        if result.rowcount == 0:
+            connection.execute(generation_table.insert()
+                               .values(Name=name, Generation=1))
+
+
+def _after_flush(session, flush_context):
+    ts_names = set()
+    for obj in list(session.new) + list(session.dirty) + \
+            list(session.deleted):
+        mapper = sqlalchemy.inspect(obj).mapper
+        name = _suite_of_table.get(mapper.local_table)
+        if name is not None:
+            ts_names.add(name)
+    if ts_names:
+        _increment(session, ts_names)
+
+
+def _after_bulk(context):
+    name = _suite_of_table.get(context.mapper.local_table)
+    if name is not None:
+        _increment(context.session, [name])
+
+
+def track_changes(sessionmaker):
+    """Increment the generations of the test suites written to by the
+    sessions of the sessionmaker."""
+    sqlalchemy.event.listen(sessionmaker, 'after_flush', _after_flush)
+    sqlalchemy.event.listen(sessionmaker, 'after_bulk_update', _after_bulk)
+    sqlalchemy.event.listen(sessionmaker, 'after_bulk_delete', _after_bulk)
+
+
+def get_generation(session, ts_name):
+    """Return the generation of the test suite, 0 if it never changed."""
+    return session.query(generation_table.c.Generation) \
+        .filter(generation_table.c.Name == ts_name) \
+        .scalar() or 0
@@ -182,20 +182,49 @@ def update_schema(engine, versions, available_migrations, schema_name):
     return True
 
 
+_available_migrations = None
+
+
+def _get_migrations():
+    global _available_migrations
+    if _available_migrations is None:
+        _available_migrations = _load_migrations()
+    return _available_migrations
+
+
+def _get_versions(engine):
+    session = sqlalchemy.orm.sessionmaker(engine)()
+    try:
+        version_list = session.query(SchemaVersion).all()
+    finally:
+        session.close()
+    return dict((v.name, v.version) for v in version_list)
+
+
+def _is_up_to_date(engine, available_migrations):
+    """Check whether the stored schema versions are current, without
+    creating any tables."""
+    if not engine.has_table(SchemaVersion.__tablename__):
+        return False
+    versions = _get_versions(engine)
+    return all(versions.get(name) == migrations['current_version']
+               for name, migrations in available_migrations.items())
+
+
 def update(engine):
     any_changed = False
 
     # Load the available migrations.
-    available_migrations = _load_migrations()
+    available_migrations = _get_migrations()
 
-    Base.metadata.create_all(engine)
+    # Opening an up to date database is the common case, don't bother with
+    # creating tables then.
+    if _is_up_to_date(engine, available_migrations):
+        return
 
-    session = sqlalchemy.orm.sessionmaker(engine)()
-    version_list = session.query(SchemaVersion).all()
-    session.close()
+    Base.metadata.create_all(engine)
 
-    versions = dict((v.name, v.version)
-                    for v in version_list)
+    versions = _get_versions(engine)
 
     # Update the core schema.
     any_changed |= update_schema(engine, versions,
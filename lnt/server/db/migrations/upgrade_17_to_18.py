@@ -0,0 +1,61 @@
+"""This upgrade adds a sort key column to the orders of every test-suite, so
+that orders can be sorted and paged by the database.
+"""
+
+import sqlalchemy
+from sqlalchemy import Column, Index, String, bindparam, select, update
+from lnt.server.db.migrations.util import introspect_table
+from lnt.server.db.util import add_column
+from lnt.server.ui.util import ORDER_SORT_KEY_SIZE, order_sort_key
+
+BATCH_SIZE = 1000
+
+
+def _add_sort_key(engine, suite_id, db_key_name):
+    order_table_name = "{}_Order".format(db_key_name)
+    try:
+        order_table = introspect_table(engine, order_table_name)
+    except sqlalchemy.exc.NoSuchTableError:
+        return
+    if 'SortKey' not in order_table.c:
+        with engine.begin() as trans:
+            add_column(trans, order_table_name,
+                       Column('SortKey', String(ORDER_SORT_KEY_SIZE)))
+        order_table = introspect_table(engine, order_table_name)
+        sort_key_index = Index('ix_{}_SortKey'.format(order_table_name),
+                               order_table.c.SortKey)
+        sort_key_index.create(engine)
+
+    order_fields = introspect_table(engine, 'TestSuiteOrderFields')
+    with engine.begin() as trans:
+        field_names = [row[0] for row in trans.execute(
+            select([order_fields.c.Name])
+            .where(order_fields.c.TestSuiteID == suite_id)
+            .order_by(order_fields.c.Ordinal, order_fields.c.ID))]
+    columns = [order_table.c[name] for name in field_names]
+
+    set_sort_key = update(order_table) \
+        .where(order_table.c.ID == bindparam('order_id')) \
+        .values(SortKey=bindparam('sort_key'))
+    with engine.begin() as trans:
+        orders = trans.execute(select([order_table.c.ID] + columns)).fetchall()
+        for start in range(0, len(orders), BATCH_SIZE):
+            trans.execute(set_sort_key, [
+                {'order_id': row[0],
+                 'sort_key': order_sort_key(row[1:], ORDER_SORT_KEY_SIZE)}
+                for row in orders[start:start + BATCH_SIZE]])
+
+
+def upgrade(engine):
+    """Add and fill the SortKey column of the Order table of each of the
+    test-suites.
+    """
+
+    test_suite = introspect_table(engine, 'TestSuite')
+
+    with engine.begin() as trans:
+        suites = list(trans.execute(select([test_suite.c.ID,
+                                            test_suite.c.DBKeyName])))
+
+    for suite_id, db_key_name in suites:
+        _add_sort_key(engine, suite_id, db_key_name)
@@ -0,0 +1,15 @@
+"""This upgrade adds the TestSuiteGeneration table, which counts the changes
+of every test-suite so that unchanged pages can be served from caches.
+"""
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+
+
+def upgrade(engine):
+    """Create the TestSuiteGeneration table."""
+    metadata = MetaData()
+    generation_table = Table(
+        'TestSuiteGeneration', metadata,
+        Column('Name', String(256), primary_key=True),
+        Column('Generation', Integer, nullable=False))
+    generation_table.create(engine, checkfirst=True)
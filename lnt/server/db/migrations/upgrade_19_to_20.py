@@ -0,0 +1,65 @@
+"""This upgrade adds the ProfileCatalog and ProfileUsage tables, which record
+the profile files and the space they take, and fills the catalogue with the
+profiles of every test-suite. The sizes of these profiles are measured later,
+see lnt.server.db.profilecatalog.measure().
+"""
+
+import sqlalchemy
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, \
+    String, Table, select
+from lnt.server.db.migrations.util import introspect_table
+
+BATCH_SIZE = 1000
+
+
+def _add_profiles(engine, catalog_table, ts_name, db_key_name, seen):
+    try:
+        profile_table = introspect_table(engine,
+                                         "{}_Profile".format(db_key_name))
+    except sqlalchemy.exc.NoSuchTableError:
+        return
+
+    with engine.begin() as trans:
+        rows = trans.execute(
+            select([profile_table.c.Filename, profile_table.c.CreatedTime,
+                    profile_table.c.AccessedTime])
+            .where(profile_table.c.Filename.isnot(None)))
+        # Every file is catalogued once.
+        profiles = []
+        for row in rows:
+            if row[0] not in seen:
+                seen.add(row[0])
+                profiles.append(row)
+        for start in range(0, len(profiles), BATCH_SIZE):
+            trans.execute(catalog_table.insert(), [
+                {'Filename': filename, 'TestSuite': ts_name,
+                 'CreatedTime': created, 'AccessedTime': accessed or created}
+                for filename, created, accessed
+                in profiles[start:start + BATCH_SIZE]])
+
+
+def upgrade(engine):
+    """Create the ProfileCatalog and ProfileUsage tables and add the profiles
+    of each of the test-suites to the catalogue.
+    """
+    metadata = MetaData()
+    catalog_table = Table(
+        'ProfileCatalog', metadata,
+        Column('Filename', String(256), primary_key=True),
+        Column('TestSuite', String(256), nullable=False),
+        Column('Size', Integer),
+        Column('CreatedTime', DateTime),
+        Column('AccessedTime', DateTime, index=True))
+    Table('ProfileUsage', metadata,
+          Column('Time', DateTime, primary_key=True),
+          Column('Size', BigInteger, nullable=False))
+    metadata.create_all(engine, checkfirst=True)
+
+    test_suite = introspect_table(engine, 'TestSuite')
+    with engine.begin() as trans:
+        suites = list(trans.execute(select([test_suite.c.Name,
+                                            test_suite.c.DBKeyName])))
+
+    seen = set()
+    for ts_name, db_key_name in suites:
+        _add_profiles(engine, catalog_table, ts_name, db_key_name, seen)
@@ -0,0 +1,221 @@
+"""
+Catalogue of the profile files.
+
+Every profile file of a database has a row in the ProfileCatalog table with
+its size and the times it was created and last viewed. The rows are written
+in the same transactions as the Profile rows of the test suites, so the space
+taken by the profiles and their ages are known without walking the profile
+directory. The ProfileUsage table keeps a history of the total size, see
+record_usage().
+
+collect_garbage() removes the least recently viewed profiles once they take
+more space than a quota; remove_unused_blobs() in lnt.server.db.profilestore
+removes the uploaded profiles which are no longer used.
+"""
+import datetime
+import functools
+import os
+
+import sqlalchemy
+from sqlalchemy import BigInteger, Column, DateTime, Integer, MetaData, \
+    String, Table
+
+from lnt.util import logger
+
+metadata = MetaData()
+
+catalog_table = Table(
+    'ProfileCatalog', metadata,
+    Column('Filename', String(256), primary_key=True),
+    Column('TestSuite', String(256), nullable=False),
+    # The size of the file, None until it is measured (for the profiles
+    # imported before the catalogue existed, see measure()).
+    Column('Size', Integer),
+    Column('CreatedTime', DateTime),
+    Column('AccessedTime', DateTime, index=True))
+
+usage_table = Table(
+    'ProfileUsage', metadata,
+    Column('Time', DateTime, primary_key=True),
+    Column('Size', BigInteger, nullable=False))
+
+# Views of a profile less than this apart only update its access time once.
+ACCESS_TIME_RESOLUTION = datetime.timedelta(hours=1)
+
+# Minimum time between two entries of the usage history.
+USAGE_INTERVAL = datetime.timedelta(hours=1)
+
+# Number of profiles measured or removed per transaction.
+BATCH_SIZE = 1000
+
+
+def _after_insert(ts_name, mapper, connection, target):
+    if not target.filename:
+        return
+    connection.execute(catalog_table.insert().values(
+        Filename=target.filename, TestSuite=ts_name,
+        Size=getattr(target, 'file_size', None),
+        CreatedTime=target.created_time, AccessedTime=target.accessed_time))
+
+
+def track_profiles(ts_name, profile_class):
+    """Add the profiles of test suite ts_name to the catalogue when they are
+    inserted."""
+    sqlalchemy.event.listen(profile_class, 'after_insert',
+                            functools.partial(_after_insert, ts_name))
+
+
+def _batches(items):
+    items = list(items)
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+def remove(session, filenames):
+    """Remove the profile files from the catalogue."""
+    for batch in _batches(filenames):
+        session.execute(catalog_table.delete()
+                        .where(catalog_table.c.Filename.in_(batch)))
+
+
+def rename(session, filename, new_filename):
+    """Record that the profile file filename was moved to new_filename."""
+    session.execute(catalog_table.update()
+                    .where(catalog_table.c.Filename == filename)
+                    .values(Filename=new_filename))
+
+
+def touch(session, filenames, now=None):
+    """Record that the profile files were viewed."""
+    now = now or datetime.datetime.now()
+    cutoff = now - ACCESS_TIME_RESOLUTION
+    session.execute(catalog_table.update()
+                    .where(catalog_table.c.Filename.in_(list(filenames)))
+                    .where(catalog_table.c.AccessedTime < cutoff)
+                    .values(AccessedTime=now))
+
+
+def measure(session, profile_dir, limit=None):
+    """Fill in the sizes of up to limit (all by default) profile files not
+    measured yet, and remove the files which no longer exist from the
+    catalogue. Returns the number of files measured."""
+    query = sqlalchemy.select([catalog_table.c.Filename]) \
+        .where(catalog_table.c.Size.is_(None))
+    if limit is not None:
+        query = query.limit(limit)
+    filenames = [f for f, in session.execute(query)]
+
+    set_size = catalog_table.update() \
+        .where(catalog_table.c.Filename == sqlalchemy.bindparam('filename')) \
+        .values(Size=sqlalchemy.bindparam('size'))
+    for batch in _batches(filenames):
+        sizes = []
+        missing = []
+        for filename in batch:
+            try:
+                size = os.path.getsize(os.path.join(profile_dir, filename))
+                sizes.append({'filename': filename, 'size': size})
+            except OSError:
+                missing.append(filename)
+        if sizes:
+            session.execute(set_size, sizes)
+        remove(session, missing)
+        session.commit()
+    return len(filenames)
+
+
+def get_total_size(session):
+    """Return the number of bytes taken by the measured profiles."""
+    return session.execute(sqlalchemy.select(
+        [sqlalchemy.func.sum(catalog_table.c.Size)])).scalar() or 0
+
+
+def record_usage(session, now=None):
+    """Add the total size of the profiles to the usage history, unless the
+    last entry is more recent than USAGE_INTERVAL."""
+    now = now or datetime.datetime.now()
+    last = session.execute(sqlalchemy.select(
+        [sqlalchemy.func.max(usage_table.c.Time)])).scalar()
+    if last is not None and now - last < USAGE_INTERVAL:
+        return
+    session.execute(usage_table.insert().values(
+        Time=now, Size=get_total_size(session)))
+
+
+def get_usage_history(session):
+    """Return the [(time, size)] history of the total size of the
+    profiles."""
+    return [tuple(row) for row in session.execute(
+        sqlalchemy.select([usage_table.c.Time, usage_table.c.Size])
+        .order_by(usage_table.c.Time))]
+
+
+def get_sizes_by_age(session):
+    """Return a [(created time, size)] list of the measured profiles, oldest
+    first."""
+    return [tuple(row) for row in session.execute(
+        sqlalchemy.select([catalog_table.c.CreatedTime,
+                           catalog_table.c.Size])
+        .where(catalog_table.c.Size.isnot(None))
+        .where(catalog_table.c.CreatedTime.isnot(None))
+        .order_by(catalog_table.c.CreatedTime))]
+
+
+def _remove_profiles(session, db, profiles):
+    """Remove the (filename, test suite) profiles from the catalogue and
+    their test suites. Returns the file names to remove from disk."""
+    by_suite = {}
+    for filename, ts_name in profiles:
+        by_suite.setdefault(ts_name, []).append(filename)
+    for ts_name, filenames in sorted(by_suite.items()):
+        ts = db.testsuite.get(ts_name)
+        if ts is None:
+            continue
+        profile_ids = session.query(ts.Profile.id) \
+            .filter(ts.Profile.filename.in_(filenames))
+        session.query(ts.Sample) \
+            .filter(ts.Sample.profile_id.in_(profile_ids)) \
+            .update({ts.Sample.profile_id: None}, synchronize_session=False)
+        session.query(ts.Profile) \
+            .filter(ts.Profile.filename.in_(filenames)) \
+            .delete(synchronize_session=False)
+    remove(session, [filename for filename, _ in profiles])
+    return [filename for filename, _ in profiles]
+
+
+def collect_garbage(session, db, max_size, dry_run=False):
+    """Remove the least recently viewed profiles of the database until the
+    profiles take no more than max_size bytes. Returns the number of removed
+    profiles and the number of bytes they took."""
+    profile_dir = db.config.profileDir
+    measure(session, profile_dir)
+    excess = get_total_size(session) - max_size
+    if excess <= 0:
+        return 0, 0
+
+    victims = []
+    freed = 0
+    rows = session.execute(
+        sqlalchemy.select([catalog_table.c.Filename,
+                           catalog_table.c.TestSuite,
+                           catalog_table.c.Size])
+        .order_by(catalog_table.c.AccessedTime, catalog_table.c.Filename))
+    for filename, ts_name, size in rows:
+        if freed >= excess:
+            break
+        victims.append((filename, ts_name))
+        freed += size or 0
+    rows.close()
+    if dry_run:
+        return len(victims), freed
+
+    for batch in _batches(victims):
+        filenames = _remove_profiles(session, db, batch)
+        session.commit()
+        for filename in filenames:
+            path = os.path.join(profile_dir, filename)
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning("Could not remove profile %s: %s" % (path, e))
+    return len(victims), freed
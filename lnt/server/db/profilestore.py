@@ -0,0 +1,170 @@
+"""
+Content addressed storage of uploaded profiles.
+
+Instead of embedding every profile base64 encoded in the report, clients
+upload the profiles to ``/profile/blobs/<sha256>`` first, skipping the ones the
+server already has, and refer to them in the report as ``sha256:<digest>``.
+The blobs live in the ``blobs`` directory of the profile directory, next to a
+small JSON file with the top level counters of the profile, so importing a run
+neither transfers nor parses profiles the server has seen before.
+
+Samples do not refer to the blobs directly: every imported profile gets a hard
+link (or a copy) in the profile directory, like an embedded profile, so
+deleting and archiving runs works the same for both.
+"""
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import lnt.testing.profile.profile as profile
+
+# Prefix of profile references in reports.
+REFERENCE_PREFIX = 'sha256:'
+
+BLOB_DIR = 'blobs'
+
+_digest_re = re.compile(r'^[0-9a-f]{64}$')
+
+
+def digest(data):
+    """Return the digest identifying the profile data."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_reference(value):
+    return isinstance(value, basestring) and \
+        value.startswith(REFERENCE_PREFIX)
+
+
+def blob_path(profile_dir, digest):
+    """Return the path of the blob with the given digest. Raises ValueError
+    if digest is not a valid digest."""
+    if not _digest_re.match(digest):
+        raise ValueError("invalid profile digest %r" % (digest,))
+    return os.path.join(profile_dir, BLOB_DIR, digest[:2],
+                        digest + '.lntprof')
+
+
+def _counters_path(path):
+    """Return the path of the JSON file with the counters of the blob at
+    path. It is written last, a blob is complete once it exists."""
+    return os.path.splitext(path)[0] + '.json'
+
+
+def _write_atomically(directory, data, path):
+    """Write data to a temporary file in directory and rename it to path."""
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def store_blob(profile_dir, expected_digest, data):
+    """Store the profile data under expected_digest. Raises ValueError if the
+    data does not match the digest or is not a profile."""
+    path = blob_path(profile_dir, expected_digest)
+    if digest(data) != expected_digest:
+        raise ValueError("profile data does not match digest %s" %
+                         (expected_digest,))
+
+    blob_dir = os.path.dirname(path)
+    _makedirs(blob_dir)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=blob_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        try:
+            p = profile.Profile.fromFile(tmp_path)
+        except Exception as e:
+            raise ValueError("invalid profile %s: %s" % (expected_digest, e))
+        if p is None:
+            raise ValueError("invalid profile %s" % (expected_digest,))
+        # Concurrent uploads of the same profile write the same data.
+        os.rename(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    _write_atomically(blob_dir,
+                      json.dumps({'counters': p.getTopLevelCounters()}),
+                      _counters_path(path))
+
+
+def has_blob(profile_dir, digest):
+    return os.path.exists(_counters_path(blob_path(profile_dir, digest)))
+
+
+def link_blob(profile_dir, reference, prefix=''):
+    """link_blob(profile_dir, reference, [prefix]) -> (filename, counters)
+
+    Make the blob referenced by reference available as a new profile file in
+    profile_dir, named like the files of embedded profiles. Returns the name
+    of the file relative to profile_dir and the top level counters of the
+    profile. Raises ValueError if the blob does not exist."""
+    path = blob_path(profile_dir, reference[len(REFERENCE_PREFIX):])
+    try:
+        with open(_counters_path(path)) as f:
+            counters = json.load(f)['counters']
+    except (IOError, ValueError, KeyError):
+        raise ValueError("unknown profile %r, it has to be uploaded before "
+                         "the report" % (reference,))
+
+    fd, filename = tempfile.mkstemp(prefix=prefix, suffix='.lntprof',
+                                    dir=profile_dir)
+    os.close(fd)
+    try:
+        # Replace the placeholder atomically, so the name stays reserved.
+        link_path = filename + '.link'
+        os.link(path, link_path)
+        os.rename(link_path, filename)
+    except (OSError, AttributeError):
+        shutil.copyfile(path, filename)
+    return os.path.relpath(filename, profile_dir), counters
+
+
+def remove_unused_blobs(profile_dir, min_age, now=None):
+    """Remove the blobs no profile file links to any more, when they were
+    uploaded more than min_age seconds ago. Returns the number of removed
+    blobs and the number of bytes they took."""
+    now = now or time.time()
+    removed = 0
+    freed = 0
+    blob_root = os.path.join(profile_dir, BLOB_DIR)
+    if not os.path.isdir(blob_root):
+        return removed, freed
+    for dirpath, _, filenames in os.walk(blob_root):
+        for name in filenames:
+            if not name.endswith('.lntprof'):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_nlink > 1 or now - stat.st_mtime < min_age:
+                    continue
+                # Remove the counters first, so the blob is no longer found.
+                try:
+                    os.remove(_counters_path(path))
+                except OSError:
+                    pass
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += stat.st_size
+    return removed, freed
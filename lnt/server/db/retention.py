@@ -0,0 +1,262 @@
+"""
+Data retention policies for old test suite data.
+
+A retention policy is configured per test suite, either with a ``retention``
+section in the test suite schema (``schemas/*.yaml``) or with a ``retention``
+dictionary in ``lnt.cfg`` which maps test suite names to the same settings.
+Settings from ``lnt.cfg`` take precedence. All ages are given in days:
+
+``aggregate_samples_after``
+    For runs older than this, the samples of each test are collapsed into
+    three samples holding the minimum, median and maximum of every metric.
+    The original number of samples per test is kept in the run parameter
+    ``aggregated_sample_counts``.
+
+``thin_runs_after``
+    Runs older than this are thinned out to one run per machine and week.
+    Runs referenced by field changes or by a baseline are always kept.
+
+``archive_profiles_after``
+    Profiles older than this are moved into ``archive_dir`` (relative to the
+    profile directory, ``archive`` by default).
+
+The policies are applied with ``lnt apply-retention``. Reports and graphs
+keep working on compacted runs since the minimum, median and maximum of each
+test are still stored as regular samples.
+"""
+import collections
+import datetime
+import os
+import shutil
+
+import sqlalchemy
+
+from lnt.server.db import deletion
+from lnt.server.db import profilecatalog
+from lnt.util import logger
+from lnt.util import stats
+
+# Number of runs processed per transaction.
+DEFAULT_BATCH_SIZE = 100
+
+# Number of samples a test keeps after aggregation (min, median and max).
+AGGREGATED_SAMPLE_COUNT = 3
+
+
+class RetentionPolicy(object):
+    """The retention settings of a test suite. Ages are in days, None
+    disables the respective step."""
+
+    def __init__(self, aggregate_samples_after=None, thin_runs_after=None,
+                 archive_profiles_after=None, archive_dir='archive'):
+        self.aggregate_samples_after = aggregate_samples_after
+        self.thin_runs_after = thin_runs_after
+        self.archive_profiles_after = archive_profiles_after
+        self.archive_dir = archive_dir
+
+    @staticmethod
+    def from_data(*datas):
+        """Create a policy from the given dictionaries (or None), later
+        dictionaries override earlier ones."""
+        settings = {}
+        for data in datas:
+            if data is None:
+                continue
+            for key, value in data.items():
+                if key not in ('aggregate_samples_after', 'thin_runs_after',
+                               'archive_profiles_after', 'archive_dir'):
+                    raise ValueError("Unknown retention setting '%s'" % key)
+                if key != 'archive_dir' and value is not None:
+                    if not isinstance(value, int) or value < 0:
+                        raise ValueError("Retention setting '%s' must be a "
+                                         "number of days" % key)
+                settings[str(key)] = value
+        return RetentionPolicy(**settings)
+
+    @property
+    def is_empty(self):
+        return self.aggregate_samples_after is None and \
+            self.thin_runs_after is None and \
+            self.archive_profiles_after is None
+
+    def __repr__(self):
+        return '%s%r' % (self.__class__.__name__,
+                         (self.aggregate_samples_after, self.thin_runs_after,
+                          self.archive_profiles_after, self.archive_dir))
+
+
+def _chunks(items, size=500):
+    """Split items into lists small enough to be used as query parameters."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _most_common(values):
+    return collections.Counter(values).most_common(1)[0][0]
+
+
+def _aggregate_test_samples(ts, samples):
+    """Overwrite the first three of the given samples with the minimum,
+    median and maximum of all of them and return the remaining samples."""
+    kept = samples[:AGGREGATED_SAMPLE_COUNT]
+    for field in ts.Sample.fields:
+        values = [s.get_field(field) for s in samples]
+        values = [v for v in values if v is not None]
+        if not values:
+            continue
+        if field.type.name == 'Real':
+            aggregates = (min(values), stats.median(values), max(values))
+        else:
+            # Status and hash fields cannot be aggregated, use the
+            # predominant value.
+            aggregates = (_most_common(values),) * AGGREGATED_SAMPLE_COUNT
+        for sample, value in zip(kept, aggregates):
+            sample.set_field(field, value)
+    return samples[AGGREGATED_SAMPLE_COUNT:]
+
+
+def aggregate_samples(session, ts, cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Collapse the samples of runs started before cutoff into min, median
+    and max samples. Returns the number of removed samples."""
+    Sample = ts.Sample
+    groups = session.query(Sample.run_id) \
+        .join(ts.Run) \
+        .filter(ts.Run.start_time < cutoff) \
+        .group_by(Sample.run_id, Sample.test_id) \
+        .having(sqlalchemy.func.count(Sample.id) > AGGREGATED_SAMPLE_COUNT)
+    run_ids = sorted(set(run_id for run_id, in groups))
+
+    removed = 0
+    for at in range(0, len(run_ids), batch_size):
+        batch = run_ids[at:at + batch_size]
+        samples = session.query(Sample) \
+            .filter(Sample.run_id.in_(batch)) \
+            .order_by(Sample.run_id, Sample.test_id, Sample.id) \
+            .all()
+        by_test = collections.OrderedDict()
+        for sample in samples:
+            by_test.setdefault((sample.run_id, sample.test_id),
+                               []).append(sample)
+
+        to_delete = []
+        counts = collections.defaultdict(dict)
+        for (run_id, test_id), test_samples in by_test.items():
+            if len(test_samples) <= AGGREGATED_SAMPLE_COUNT:
+                continue
+            to_delete.extend(s.id
+                             for s in _aggregate_test_samples(ts,
+                                                              test_samples))
+            counts[run_id][test_id] = len(test_samples)
+
+        test_ids = list(set(t for c in counts.values() for t in c))
+        test_names = {}
+        for chunk in _chunks(test_ids):
+            test_names.update(session.query(ts.Test.id, ts.Test.name)
+                              .filter(ts.Test.id.in_(chunk)))
+
+        for run in session.query(ts.Run).filter(ts.Run.id.in_(counts)):
+            parameters = run.parameters
+            aggregated = parameters.get('aggregated_sample_counts', {})
+            for test_id, count in counts[run.id].items():
+                aggregated[test_names[test_id]] = count
+            parameters['aggregated_sample_counts'] = aggregated
+            run.parameters = parameters
+        session.flush()
+
+        filenames = []
+        for chunk in _chunks(to_delete):
+            filenames += deletion.delete_samples(session, ts, chunk)
+        session.commit()
+        deletion.remove_profile_files(ts, filenames)
+        removed += len(to_delete)
+        logger.info("Aggregated samples of runs %s (%d/%d)" %
+                    (" ".join(str(r) for r in batch), at + len(batch),
+                     len(run_ids)))
+    return removed
+
+
+def thin_runs(session, ts, cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete runs started before cutoff so that at most one run per machine
+    and week remains. Runs referenced by field changes or baselines are kept.
+    Returns the number of deleted runs."""
+    pinned_runs = set(r for r, in session.query(ts.FieldChange.run_id)
+                      .distinct())
+    pinned_orders = set(o for o, in session.query(ts.Baseline.order_id))
+
+    runs = session.query(ts.Run.id, ts.Run.machine_id, ts.Run.order_id,
+                         ts.Run.start_time) \
+        .filter(ts.Run.start_time < cutoff) \
+        .order_by(ts.Run.machine_id, ts.Run.start_time.desc())
+    seen_weeks = set()
+    to_delete = []
+    for run_id, machine_id, order_id, start_time in runs:
+        week = (machine_id,) + tuple(start_time.isocalendar()[:2])
+        if run_id in pinned_runs or order_id in pinned_orders:
+            seen_weeks.add(week)
+        elif week in seen_weeks:
+            to_delete.append(run_id)
+        else:
+            seen_weeks.add(week)
+
+    for _ in deletion.delete_runs(session, ts, to_delete, batch_size):
+        pass
+    return len(to_delete)
+
+
+def archive_profiles(session, ts, cutoff, archive_dir,
+                     batch_size=DEFAULT_BATCH_SIZE):
+    """Move the profiles created before cutoff into archive_dir. Returns the
+    number of archived profiles."""
+    profile_dir = ts.v4db.config.profileDir
+    archive_path = os.path.join(profile_dir, archive_dir)
+    if not os.path.isdir(archive_path):
+        os.makedirs(archive_path)
+
+    profiles = session.query(ts.Profile.id, ts.Profile.filename) \
+        .filter(ts.Profile.created_time < cutoff) \
+        .all()
+    archived = 0
+    for at in range(0, len(profiles), batch_size):
+        for profile_id, filename in profiles[at:at + batch_size]:
+            if not filename or os.path.dirname(filename) == archive_dir:
+                continue
+            new_filename = os.path.join(archive_dir,
+                                        os.path.basename(filename))
+            try:
+                shutil.move(os.path.join(profile_dir, filename),
+                            os.path.join(profile_dir, new_filename))
+            except (IOError, OSError) as e:
+                logger.warning("Could not archive profile %s: %s" %
+                               (filename, e))
+                continue
+            session.query(ts.Profile) \
+                .filter(ts.Profile.id == profile_id) \
+                .update({ts.Profile.filename: new_filename},
+                        synchronize_session=False)
+            profilecatalog.rename(session, filename, new_filename)
+            archived += 1
+        session.commit()
+    return archived
+
+
+def apply_policy(session, ts, policy, now=None,
+                 batch_size=DEFAULT_BATCH_SIZE):
+    """Apply the retention policy to the test suite. Returns a dictionary
+    with the number of affected samples, runs and profiles."""
+    if now is None:
+        now = datetime.datetime.utcnow()
+
+    def cutoff(days):
+        return now - datetime.timedelta(days=days)
+
+    result = {}
+    if policy.thin_runs_after is not None:
+        result['deleted_runs'] = thin_runs(
+            session, ts, cutoff(policy.thin_runs_after), batch_size)
+    if policy.aggregate_samples_after is not None:
+        result['aggregated_samples'] = aggregate_samples(
+            session, ts, cutoff(policy.aggregate_samples_after), batch_size)
+    if policy.archive_profiles_after is not None:
+        result['archived_profiles'] = archive_profiles(
+            session, ts, cutoff(policy.archive_profiles_after),
+            policy.archive_dir, batch_size)
+    return result
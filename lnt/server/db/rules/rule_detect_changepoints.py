@@ -0,0 +1,32 @@
+"""
+Post submission hook detecting change-points in the recent history of the
+tests of the submitted run, see lnt.server.db.changepoints. Enabled per test
+suite by the 'changepoint_detection' dictionary of lnt.cfg.
+"""
+from lnt.server.db import changepoints
+
+# Number of orders of the machine searched for change-points by default.
+DEFAULT_WINDOW = 100
+
+
+def detect_changepoints(session, ts, run_id):
+    config = ts.v4db.config
+    settings = config.changepoint_detection.get(ts.name)
+    if settings is None:
+        return
+    run = session.query(ts.Run).get(run_id)
+    if run is None:
+        return
+
+    test_ids = [t for t, in session.query(ts.Sample.test_id)
+                .filter(ts.Sample.run_id == run_id)
+                .distinct()]
+    changepoints.detect_changes(
+        session, ts, machine_ids=[run.machine_id], test_ids=test_ids,
+        window=settings.get('window', DEFAULT_WINDOW),
+        penalty=settings.get('penalty', changepoints.DEFAULT_PENALTY),
+        min_size=settings.get('min_segment_size',
+                              changepoints.DEFAULT_MIN_SEGMENT_SIZE))
+
+
+post_submission_hook = detect_changepoints
@@ -1,45 +1,23 @@
 """
-Post submission hook to write the current state of the profiles directory. This
-gets fed into the profile/admin page.
+Post submission hook recording the space taken by the profiles, see
+lnt.server.db.profilecatalog. This gets fed into the profile/admin page.
 """
-import datetime
-import glob
-import json
-import os
-import subprocess
-import time
+from lnt.server.db import profilecatalog
+
+# Number of profiles imported before the catalogue existed measured per
+# submission.
+MEASURE_BATCH_SIZE = 1000
 
 
 def update_profile_stats(session, ts, run_id):
     config = ts.v4db.config
-
-    history_path = os.path.join(config.profileDir, '_profile-history.json')
-    age_path = os.path.join(config.profileDir, '_profile-age.json')
-    profile_path = config.profileDir
-
-    if not os.path.exists(profile_path):
+    if config is None:
         return
 
-    try:
-        history = json.loads(open(history_path).read())
-    except Exception:
-        history = []
-    age = []
-
-    dt = time.time()
-    blocks = subprocess.check_output("du -s -k %s" % profile_path,
-                                     shell=True).split('\t')[0]
-    kb = float(blocks)  # 1024 byte blocks.
-
-    history.append((dt, kb))
-
-    for f in glob.glob('%s/*.lntprof' % profile_path):
-        mtime = os.stat(f).st_mtime
-        sz = os.stat(f).st_size / 1000
-        age.append([mtime, sz])
-
-    open(history_path, 'w').write(json.dumps(history))
-    open(age_path, 'w').write(json.dumps(age))
+    profilecatalog.measure(session, config.profileDir,
+                           limit=MEASURE_BATCH_SIZE)
+    profilecatalog.record_usage(session)
+    session.commit()
 
 
 post_submission_hook = update_profile_stats
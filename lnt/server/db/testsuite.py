@@ -80,12 +80,17 @@ def make_sample_column(name, type):
     return Column(name, sqltype, *options)
 
 
-def make_run_column(name):
-    return Column(name, String(256))
+def make_run_column(name, index=False):
+    return Column(name, String(256), index=index)
 
 
-def make_machine_column(name):
-    return Column(name, String(256))
+def make_machine_column(name, index=False):
+    return Column(name, String(256), index=index)
+
+
+def _index_name(table_name, column_name):
+    # The name SQLAlchemy gives to the index of a column with index=True.
+    return 'ix_%s_%s' % (table_name, column_name)
 
 
 class _MigrationError(Exception):
@@ -151,7 +156,7 @@ class TestSuite(Base):
         machine_fields = []
         for field_desc in data.get('machine_fields', []):
             name = field_desc['name']
-            field = MachineField(name)
+            field = MachineField(name, index=field_desc.get('index', False))
             machine_fields.append(field)
         ts.machine_fields = machine_fields
 
@@ -164,7 +169,7 @@ class TestSuite(Base):
                 field = OrderField(name, ordinal=0)
                 order_fields.append(field)
             else:
-                field = RunField(name)
+                field = RunField(name, index=field_desc.get('index', False))
                 run_fields.append(field)
         ts.run_fields = run_fields
         ts.order_fields = order_fields
@@ -209,12 +214,16 @@ class TestSuite(Base):
             field = {
                 'name': machine_field.name
             }
+            if machine_field.index:
+                field['index'] = True
             machine_fields.append(field)
         run_fields = []
         for run_field in self.run_fields:
             field = {
                 'name': run_field.name
             }
+            if run_field.index:
+                field['index'] = True
             run_fields.append(field)
         for order_field in self.order_fields:
             field = {
@@ -252,18 +261,28 @@ class MachineField(FieldMixin, Base):
                            index=True)
     name = Column("Name", String(256))
 
-    def __init__(self, name):
+    def __init__(self, name, index=False):
         self.name = name
+        # Whether the column of the field is indexed, only known for test
+        # suites defined by a schema file.
+        self.index = bool(index)
 
         # Column instance for fields which have been bound (non-DB
         # parameter). This is provided for convenience in querying.
         self.column = None
 
+    @sqlalchemy.orm.reconstructor
+    def init_on_load(self):
+        self.index = False
+
     def __repr__(self):
         return '%s%r' % (self.__class__.__name__, (self.name, ))
 
     def __copy__(self):
-        return MachineField(self.name)
+        return MachineField(self.name, self.index)
+
+    def copy_info(self, other):
+        self.index = other.index
 
 
 class OrderField(FieldMixin, Base):
@@ -303,18 +322,28 @@ class RunField(FieldMixin, Base):
                            index=True)
     name = Column("Name", String(256))
 
-    def __init__(self, name):
+    def __init__(self, name, index=False):
         self.name = name
+        # Whether the column of the field is indexed, only known for test
+        # suites defined by a schema file.
+        self.index = bool(index)
 
         # Column instance for fields which have been bound (non-DB
         # parameter). This is provided for convenience in querying.
         self.column = None
 
+    @sqlalchemy.orm.reconstructor
+    def init_on_load(self):
+        self.index = False
+
     def __repr__(self):
         return '%s%r' % (self.__class__.__name__, (self.name, ))
 
     def __copy__(self):
-        return RunField(self.name)
+        return RunField(self.name, self.index)
+
+    def copy_info(self, other):
+        self.index = other.index
 
 
 class SampleField(FieldMixin, Base):
@@ -377,6 +406,49 @@ class SampleField(FieldMixin, Base):
         self.schema_index = other.schema_index
 
 
+def _move_parameter_to_column(connectable, table_name, name):
+    """Move the values of the parameter `name` out of the JSON encoded
+    parameters of the rows of the machine or run table `table_name` and into
+    the column of the same name."""
+    table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                             Column('ID', Integer, primary_key=True),
+                             Column('Parameters', Binary),
+                             Column(name, String(256)))
+    # The parameters are encoded as a list of [key, value] pairs.
+    key = '[%s, ' % json.dumps(name)
+    rows = connectable.execute(
+        sqlalchemy.select([table.c.ID, table.c.Parameters])
+        .where(util.contains_substring(table.c.Parameters, key))).fetchall()
+    for row_id, data in rows:
+        parameters = dict(json.loads(data))
+        if name not in parameters:
+            continue
+        value = parameters.pop(name)
+        connectable.execute(
+            table.update().where(table.c.ID == row_id)
+            .values({name: value,
+                     'Parameters': json.dumps(sorted(parameters.items()))}))
+
+
+def _upgrade_field(connectable, table_name, old_desc, new_desc, make_column):
+    """Upgrade the column of a run or machine field: add the column of a new
+    field and fill it with the values recorded in the parameters so far, and
+    create or drop the index of the column."""
+    name = new_desc['name']
+    if old_desc is None:
+        util.add_column(connectable, table_name, make_column(name))
+        _move_parameter_to_column(connectable, table_name, name)
+        old_desc = {}
+
+    was_indexed = old_desc.get('index', False)
+    indexed = new_desc.get('index', False)
+    index_name = _index_name(table_name, name)
+    if indexed and not was_indexed:
+        util.add_index(connectable, table_name, name, index_name)
+    elif was_indexed and not indexed:
+        util.drop_index(connectable, table_name, name, index_name)
+
+
 def _upgrade_to(connectable, tsschema, new_schema, dry_run=False):
     new = json.loads(new_schema.jsonschema)
     old = json.loads(tsschema.jsonschema)
@@ -423,10 +495,9 @@ def _upgrade_to(connectable, tsschema, new_schema, dry_run=False):
             continue
 
         old_field = old_run_fields.pop(name, None)
-        # Add missing columns
-        if old_field is None and not dry_run:
-            column = make_run_column(name)
-            util.add_column(connectable, '%s_Run' % ts_name, column)
+        if not dry_run:
+            _upgrade_field(connectable, '%s_Run' % ts_name, old_field,
+                           field_desc, make_run_column)
 
     if len(old_run_fields) > 0:
         raise _MigrationError("Run fields removed: %s" %
@@ -443,10 +514,9 @@ def _upgrade_to(connectable, tsschema, new_schema, dry_run=False):
     for field_desc in new.get('machine_fields', []):
         name = field_desc['name']
         old_field = old_machine_fields.pop(name, None)
-        # Add missing columns
-        if old_field is None and not dry_run:
-            column = make_machine_column(name)
-            util.add_column(connectable, '%s_Machine' % ts_name, column)
+        if not dry_run:
+            _upgrade_field(connectable, '%s_Machine' % ts_name, old_field,
+                           field_desc, make_machine_column)
 
     if len(old_machine_fields) > 0:
         raise _MigrationError("Machine fields removed: %s" %
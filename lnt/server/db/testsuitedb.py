@@ -9,9 +9,9 @@ from __future__ import absolute_import
 import datetime
 import json
 import os
-import itertools
 
 import aniso8601
+import bisect
 import sqlalchemy
 import flask
 from sqlalchemy import Float, String, Integer, Column, ForeignKey, Binary, DateTime
@@ -20,10 +20,14 @@ from sqlalchemy.orm.exc import ObjectDeletedError
 from typing import List
 from lnt.util import logger
 
+from . import generation
+from . import profilecatalog
+from . import profilestore
 from . import testsuite
+from . import util
 import lnt.testing.profile.profile as profile
 import lnt
-from lnt.server.ui.util import convert_revision
+from lnt.server.ui.util import ORDER_SORT_KEY_SIZE, order_sort_key
 
 
 def _dict_update_abort_on_duplicates(base_dict, to_merge):
@@ -38,6 +42,114 @@ class MachineInfoChanged(ValueError):
     pass
 
 
+# Key of the machine timelines in Session.info.
+_TIMELINES_KEY = 'lnt_machine_timelines'
+
+
+def _clear_timelines(session, *args):
+    session.info[_TIMELINES_KEY].clear()
+
+
+class MachineTimeline(object):
+    """The orders and runs of one machine, sorted by order.
+
+    A timeline loads the sorted orders of a machine once and then answers the
+    neighbour, window and baseline queries of a page, a report or an email.
+    Use TestSuiteDB.get_machine_timeline, which keeps the timelines of a
+    session until it writes to the database.
+    """
+
+    def __init__(self, session, ts, machine_id):
+        self.ts = ts
+        self.machine_id = machine_id
+        self.orders = session.query(ts.Order) \
+            .join(ts.Run) \
+            .filter(ts.Run.machine_id == machine_id) \
+            .distinct() \
+            .order_by(ts.Order.sort_key, ts.Order.id) \
+            .all()
+        self._index = dict((o.id, i) for i, o in enumerate(self.orders))
+        # (start time, run id) of the runs of every order.
+        self._runs = dict((o.id, []) for o in self.orders)
+        for run_id, order_id, start_time in session.query(
+                ts.Run.id, ts.Run.order_id, ts.Run.start_time) \
+                .filter(ts.Run.machine_id == machine_id):
+            self._runs[order_id].append((start_time, run_id))
+
+    def index(self, order):
+        """Return the position of order in the timeline."""
+        return self._index[order.id]
+
+    def _get_runs(self, session, orders):
+        ids = [run_id for o in orders for _, run_id in self._runs[o.id]]
+        if not ids:
+            return []
+        return session.query(self.ts.Run) \
+            .filter(self.ts.Run.id.in_(ids)).all()
+
+    def adjacent_runs(self, session, run, N, direction=-1):
+        """See TestSuiteDB.get_adjacent_runs_on_machine."""
+        index = self.index(run.order)
+
+        # Gather the next N orders.
+        if direction == -1:
+            orders_to_return = self.orders[max(0, index - N):index]
+        else:
+            orders_to_return = self.orders[index+1:index+N]
+
+        runs = self._get_runs(session, orders_to_return)
+
+        # Sort the result by order, accounting for direction to satisfy our
+        # requirement of returning the runs in adjacency order.
+        runs.sort(key=lambda r: self.index(r.order),
+                  reverse=(direction == -1))
+        return runs
+
+    def closest_run(self, session, order_to_find):
+        """Return the most recent run of the first order not before
+        order_to_find, or None."""
+        index = bisect.bisect_left(self.orders, order_to_find)
+        if index == len(self.orders):
+            return None
+        _, run_id = max(self._runs[self.orders[index].id])
+        return session.query(self.ts.Run).get(run_id)
+
+
+class _ParametersMixin(object):
+    """Access to the JSON encoded parameters blob of machines and runs.
+
+    The blob is decoded once and the result is kept with the instance until
+    parameters_data changes."""
+
+    def _get_parameters(self):
+        data = self.parameters_data
+        decoded = self.__dict__.get('_decoded_parameters')
+        if decoded is None or decoded[0] is not data:
+            decoded = (data, dict(json.loads(data)))
+            self.__dict__['_decoded_parameters'] = decoded
+        return decoded[1]
+
+    @property
+    def parameters(self):
+        """dictionary access to the BLOB encoded parameters data"""
+        # Callers are free to modify the result.
+        return dict(self._get_parameters())
+
+    @parameters.setter
+    def parameters(self, data):
+        self.parameters_data = json.dumps(sorted(data.items()))
+
+    def get_parameter(self, name, default=None):
+        """Return the value of the field or parameter `name`."""
+        for field in self.fields:
+            if field.name == name:
+                value = self.get_field(field)
+                if value is not None:
+                    return value
+                break
+        return self._get_parameters().get(name, default)
+
+
 class TestSuiteDB(object):
     """
     Wrapper object for an individual test suites database tables.
@@ -62,6 +174,8 @@ class TestSuiteDB(object):
         self.sample_fields = list(sorted(self.test_suite.sample_fields,
             key = lambda s: s.schema_index))
         self.machine_to_latest_order_cache = {}
+        # The RetentionPolicy, set by V4DB when loading the test suites.
+        self.retention_policy = None
         sample_field_indexes = dict()
 
         for i, field in enumerate(self.sample_fields):
@@ -102,7 +216,7 @@ class TestSuiteDB(object):
 
         db_key_name = self.test_suite.db_key_name
 
-        class Machine(self.base, ParameterizedMixin):
+        class Machine(self.base, ParameterizedMixin, _ParametersMixin):
             __tablename__ = db_key_name + '_Machine'
             __table_args__ = {'mysql_collate': 'utf8_bin'}
             DEFAULT_BASELINE_REVISION = v4db.baseline_revision
@@ -125,7 +239,8 @@ class TestSuiteDB(object):
                     raise ValueError("test suite defines reserved key %r" % (
                         iname))
 
-                item.column = testsuite.make_machine_column(iname)
+                item.column = testsuite.make_machine_column(iname,
+                                                            item.index)
                 class_dict[iname] = item.column
 
             def __init__(self, name_value):
@@ -136,15 +251,6 @@ class TestSuiteDB(object):
                 return '%s_%s%r' % (db_key_name, self.__class__.__name__,
                                     (self.id, self.name))
 
-            @property
-            def parameters(self):
-                """dictionary access to the BLOB encoded parameters data"""
-                return dict(json.loads(self.parameters_data))
-
-            @parameters.setter
-            def parameters(self, data):
-                self.parameters_data = json.dumps(sorted(data.items()))
-
             def get_baseline_run(self, session):
                 ts = Machine.testsuite
                 user_baseline = ts.get_users_baseline(session)
@@ -166,27 +272,9 @@ class TestSuiteDB(object):
                 this machine also reported.
                 """
 
-                # FIXME: Scalability! Pretty fast in practice, but still.
                 ts = Machine.testsuite
-                # Search for best order.
-                best_order = None
-                for order in session.query(ts.Order).\
-                        join(ts.Run).\
-                        filter(ts.Run.machine_id == self.id).distinct():
-                    if order >= order_to_find and \
-                          (best_order is None or order < best_order):
-                        best_order = order
-
-                # Find the most recent run on this machine that used
-                # that order.
-                closest_run = None
-                if best_order:
-                    closest_run = session.query(ts.Run)\
-                        .filter(ts.Run.machine_id == self.id)\
-                        .filter(ts.Run.order_id == best_order.id)\
-                        .order_by(ts.Run.start_time.desc()).first()
-
-                return closest_run
+                timeline = ts.get_machine_timeline(session, self.id)
+                return timeline.closest_run(session, order_to_find)
 
             def set_from_dict(self, data):
                 data_name = data.pop('name', None)
@@ -228,7 +316,11 @@ class TestSuiteDB(object):
             join = 'Order.previous_order_id==Order.id'
             next_order = relation("Order", backref=backref, primaryjoin=join,
                                   uselist=False)
-            order_name_cache = {}
+            # The order fields encoded by order_sort_key, so the database
+            # can sort orders. It is kept up to date on every flush and
+            # orders are compared by it in Python as well.
+            sort_key = Column("SortKey", String(ORDER_SORT_KEY_SIZE),
+                              index=True)
 
             # Dynamically create fields for all of the test suite defined order
             # fields.
@@ -275,58 +367,51 @@ class TestSuiteDB(object):
             def name(self):
                 return self.as_ordered_string()
 
-            def _get_comparison_discriminant(self, b):
-                """Return a representative pair of converted revision from self
-                and b. Order of the element on this pair is the same as the
-                order of self relative to b.
-                """
-                # SA occasionally uses comparison to check model instances
-                # versus some sentinels, so we ensure we support comparison
-                # against non-instances.
-                if self.__class__ is not b.__class__:
-                    return (0, 1)
-
-                # Pair converted revision from self and b.
-                converted_revisions = map(
-                    lambda item: (
-                        convert_revision(
-                            self.get_field(item), cache=Order.order_name_cache
-                        ),
-                        convert_revision(
-                            b.get_field(item), cache=Order.order_name_cache
-                        ),
-                    ),
-                    self.fields,
-                )
-                # Return the first unequal pair, or (0, 0) otherwise.
-                return next(
-                    itertools.dropwhile(lambda x: x[0] == x[1], converted_revisions),
-                    (0, 0),
-                )
-
+            def __getattr__(self, name):
+                # comparison_key is computed once, on first use, and then
+                # stored as a plain attribute, so comparisons are cheap.
+                if name != 'comparison_key':
+                    raise AttributeError(name)
+                key = self.sort_key
+                # Keys which fill the column may have been truncated.
+                if key is None or len(key) >= ORDER_SORT_KEY_SIZE:
+                    key = order_sort_key(
+                        [self.get_field(item) for item in self.fields])
+                self.__dict__['comparison_key'] = key
+                return key
+
+            # SA occasionally uses comparison to check model instances versus
+            # some sentinels, so we ensure we support comparison against
+            # non-instances: they compare as bigger.
             def __eq__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] == discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return False
+                return self.comparison_key == b.comparison_key
 
             def __ne__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] != discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return True
+                return self.comparison_key != b.comparison_key
 
             def __lt__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] < discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return True
+                return self.comparison_key < b.comparison_key
 
             def __le__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] <= discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return True
+                return self.comparison_key <= b.comparison_key
 
             def __gt__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] > discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return False
+                return self.comparison_key > b.comparison_key
 
             def __ge__(self, b):
-                discriminant = self._get_comparison_discriminant(b)
-                return discriminant[0] >= discriminant[1]
+                if self.__class__ is not b.__class__:
+                    return False
+                return self.comparison_key >= b.comparison_key
 
             def __json__(self, include_id=True):
                 result = {}
@@ -335,7 +420,23 @@ class TestSuiteDB(object):
                 _dict_update_abort_on_duplicates(result, self.get_fields())
                 return result
 
-        class Run(self.base, ParameterizedMixin):
+        def update_sort_key(mapper, connection, order):
+            order.sort_key = order_sort_key(
+                [order.get_field(item) for item in order.fields],
+                ORDER_SORT_KEY_SIZE)
+        sqlalchemy.event.listen(Order, 'before_insert', update_sort_key)
+        sqlalchemy.event.listen(Order, 'before_update', update_sort_key)
+
+        # Changing an order field invalidates the sort key.
+        def reset_sort_key(order, value, oldvalue, initiator):
+            if value != oldvalue:
+                order.sort_key = None
+                order.__dict__.pop('comparison_key', None)
+        for item in self.order_fields:
+            sqlalchemy.event.listen(getattr(Order, item.name), 'set',
+                                    reset_sort_key)
+
+        class Run(self.base, ParameterizedMixin, _ParametersMixin):
             __tablename__ = db_key_name + '_Run'
 
             fields = self.run_fields
@@ -359,10 +460,8 @@ class TestSuiteDB(object):
             order = relation(Order)
 
             # Dynamically create fields for all of the test suite defined run
-            # fields.
-            #
-            # FIXME: We are probably going to want to index on some of these,
-            # but need a bit for that in the test suite definition.
+            # fields. Fields marked with "index: true" in the schema get an
+            # indexed column.
             class_dict = locals()
             for item in fields:
                 iname = item.name
@@ -370,7 +469,7 @@ class TestSuiteDB(object):
                     raise ValueError("test suite defines reserved key %r" %
                                      (iname,))
 
-                item.column = testsuite.make_run_column(iname)
+                item.column = testsuite.make_run_column(iname, item.index)
                 class_dict[iname] = item.column
 
             def __init__(self, new_id, machine, order, start_time, end_time):
@@ -386,15 +485,6 @@ class TestSuiteDB(object):
                                     (self.id, self.machine, self.order,
                                      self.start_time, self.end_time))
 
-            @property
-            def parameters(self):
-                """dictionary access to the BLOB encoded parameters data"""
-                return dict(json.loads(self.parameters_data))
-
-            @parameters.setter
-            def parameters(self, data):
-                self.parameters_data = json.dumps(sorted(data.items()))
-
             def __json__(self, flatten_order=True):
                 result = {
                     'id': self.id,
@@ -453,19 +543,37 @@ class TestSuiteDB(object):
                 self.created_time = datetime.datetime.now()
                 self.accessed_time = datetime.datetime.now()
 
-                if config is not None:
+                if profilestore.is_reference(encoded):
+                    # The profile was uploaded beforehand, only link it.
+                    if config is None:
+                        raise ValueError("cannot import profile %r without "
+                                         "a profile directory" % (encoded,))
+                    self.filename, counters = profilestore.link_blob(
+                        config.config.profileDir, encoded,
+                        prefix='t-%s-s-' % os.path.basename(testid))
+                elif config is not None:
                     profileDir = config.config.profileDir
                     prefix = 't-%s-s-' % os.path.basename(testid)
                     self.filename = \
                         profile.Profile.saveFromRendered(encoded,
                                                          profileDir=profileDir,
                                                          prefix=prefix)
+                    p = profile.Profile.fromFile(
+                        os.path.join(profileDir, self.filename))
+                    counters = p.getTopLevelCounters()
+                else:
+                    p = profile.Profile.fromRendered(encoded)
+                    counters = p.getTopLevelCounters()
 
-                p = profile.Profile.fromRendered(encoded)
-                s = ','.join('%s=%s' % (k, v)
-                             for k, v in p.getTopLevelCounters().items())
+                s = ','.join('%s=%s' % (k, v) for k, v in counters.items())
                 self.counters = s[:512]
 
+                # Recorded in the profile catalogue, see
+                # lnt.server.db.profilecatalog.
+                if config is not None:
+                    self.file_size = os.path.getsize(os.path.join(
+                        config.config.profileDir, self.filename))
+
             def getTopLevelCounters(self):
                 d = dict()
                 for i in self.counters.split('='):
@@ -767,6 +875,10 @@ class TestSuiteDB(object):
         sqlalchemy.schema.Index("ix_%s_Sample_RunID_TestID" % db_key_name,
                                 Sample.run_id, Sample.test_id)
 
+        generation.register_tables(self.name,
+                                   self.base.metadata.tables.values())
+        profilecatalog.track_profiles(self.name, Profile)
+
     def create_tables(self, engine):
         self.base.metadata.create_all(engine)
 
@@ -916,24 +1028,32 @@ class TestSuiteDB(object):
         # If not, then we need to insert this order into the total ordering
         # linked list.
 
-        # Add the new order and commit, to assign an ID.
+        # Add the new order and commit, to assign an ID and a sort key.
         session.add(order)
         session.commit()
 
-        # Load all the orders and sort them to form the total ordering.
-        orders = sorted(session.query(self.Order))
-
-        # Find the order we just added.
-        index = orders.index(order)
-
         # Insert this order into the linked list which forms the total
-        # ordering.
-        if index > 0:
-            previous_order = orders[index - 1]
+        # ordering, between its neighbours by sort key. Orders which compare
+        # equal are ordered by ID.
+        Order = self.Order
+        previous_order = session.query(Order) \
+            .filter(sqlalchemy.or_(
+                Order.sort_key < order.sort_key,
+                sqlalchemy.and_(Order.sort_key == order.sort_key,
+                                Order.id < order.id))) \
+            .order_by(Order.sort_key.desc(), Order.id.desc()) \
+            .first()
+        next_order = session.query(Order) \
+            .filter(sqlalchemy.or_(
+                Order.sort_key > order.sort_key,
+                sqlalchemy.and_(Order.sort_key == order.sort_key,
+                                Order.id > order.id))) \
+            .order_by(Order.sort_key, Order.id) \
+            .first()
+        if previous_order is not None:
             previous_order.next_order_id = order.id
             order.previous_order_id = previous_order.id
-        if index + 1 < len(orders):
-            next_order = orders[index + 1]
+        if next_order is not None:
             next_order.previous_order_id = order.id
             order.next_order_id = next_order.id
 
@@ -1056,8 +1176,11 @@ class TestSuiteDB(object):
                     all_samples_to_add.append(sample)
                 for sample, value in zip(samples, values):
                     if key == 'profile':
-                        profile = self.Profile(value, config, name)
-                        sample.profile = profiles.get(hash(value), profile)
+                        profile = profiles.get(value)
+                        if profile is None:
+                            profile = self.Profile(value, config, name)
+                            profiles[value] = profile
+                        sample.profile = profile
                     else:
                         sample.set_field(field, value)
         session.add_all(all_samples_to_add)
@@ -1087,6 +1210,21 @@ class TestSuiteDB(object):
             q = q.filter_by(name=name)
         return q
 
+    def match_parameter(self, model, name, value):
+        """
+        match_parameter(model, name, value) -> filter expression
+
+        Select the machines or runs (`model` is Machine or Run) with the field
+        or parameter `name` set to `value`. Fields are compared in their
+        column, other parameters in the JSON encoded parameters blob.
+        """
+        for field in model.fields:
+            if field.name == name:
+                return getattr(model, name) == value
+        # The parameters are encoded as a list of [key, value] pairs.
+        return util.contains_substring(model.parameters_data,
+                                       json.dumps([name, value]))
+
     def getMachine(self, session, id):
         return session.query(self.Machine).filter_by(id=id).one()
 
@@ -1136,46 +1274,87 @@ class TestSuiteDB(object):
         # better in the worst cast, and I prefer that response times be
         # uniform. In practice, this appears to perform fine even for quite
         # large (~1GB, ~20k runs) databases.
-
-        # Find all the orders on this machine, then sort them.
         #
-        # FIXME: Scalability! However, pretty fast in practice, see elaborate
-        # explanation above.
-        all_machine_orders = sorted(
-            session.query(self.Order)
-            .join(self.Run)
-            .filter(self.Run.machine == run.machine)
-            .distinct()
-            .all()
-        )
+        # The sorted orders are kept in the machine timeline, so the lookups
+        # of one request only load and sort them once.
+        timeline = self.get_machine_timeline(session, run.machine_id)
+        return timeline.adjacent_runs(session, run, N, direction)
 
-        # Find the index of the current run.
-        index = all_machine_orders.index(run.order)
+    def get_machine_timeline(self, session, machine_id):
+        """
+        get_machine_timeline(session, machine_id) -> MachineTimeline
 
-        # Gather the next N orders.
-        if direction == -1:
-            orders_to_return = all_machine_orders[max(0, index - N):index]
+        Return the timeline of the machine. The timeline is kept until the
+        session flushes, commits or rolls back, so all the neighbour lookups
+        of a request share it.
+        """
+        timelines = session.info.get(_TIMELINES_KEY)
+        if timelines is None:
+            timelines = session.info[_TIMELINES_KEY] = {}
+            for event in ('after_flush', 'after_bulk_delete',
+                          'after_bulk_update', 'after_commit',
+                          'after_rollback'):
+                sqlalchemy.event.listen(session, event, _clear_timelines)
+        key = (self.name, machine_id)
+        timeline = timelines.get(key)
+        if timeline is None:
+            timeline = timelines[key] = MachineTimeline(session, self,
+                                                        machine_id)
+        return timeline
+
+    def get_order_rows(self, session, limit=-1, before=None, after=None,
+                       prefix=None):
+        """
+        get_order_rows(session, limit, before, after, prefix) -> rows, more
+
+        Return (id, previous order id, next order id, order field values...)
+        tuples of up to `limit` orders, newest first, sorted by their sort key
+        in the database. Without `before` or `after` (order IDs) the newest
+        orders are returned, otherwise the ones right before or after the
+        given order. With a `prefix` only orders with a field value starting
+        with it are returned. `more` tells whether there are more orders past
+        the returned ones.
+        """
+        Order = self.Order
+        query = session.query(Order.id, Order.previous_order_id,
+                              Order.next_order_id,
+                              *[item.column for item in self.order_fields])
+        if prefix:
+            pattern = prefix.replace('\\', '\\\\').replace('%', '\\%') \
+                .replace('_', '\\_') + '%'
+            query = query.filter(sqlalchemy.or_(*[
+                item.column.like(pattern, escape='\\')
+                for item in self.order_fields]))
+
+        newest_first = after is None
+        cursor = before if newest_first else after
+        if cursor is not None:
+            cursor_key = session.query(Order.sort_key) \
+                .filter(Order.id == cursor) \
+                .as_scalar()
+            if newest_first:
+                query = query.filter(sqlalchemy.or_(
+                    Order.sort_key < cursor_key,
+                    sqlalchemy.and_(Order.sort_key == cursor_key,
+                                    Order.id < cursor)))
+            else:
+                query = query.filter(sqlalchemy.or_(
+                    Order.sort_key > cursor_key,
+                    sqlalchemy.and_(Order.sort_key == cursor_key,
+                                    Order.id > cursor)))
+        if newest_first:
+            query = query.order_by(Order.sort_key.desc(), Order.id.desc())
         else:
-            orders_to_return = all_machine_orders[index+1:index+N]
-
-        # Get all the runs for those orders on this machine in a single query.
-        ids_to_fetch = [o.id
-                        for o in orders_to_return]
-        if not ids_to_fetch:
-            return []
-
-        runs = session.query(self.Run).\
-            filter(self.Run.machine == run.machine).\
-            filter(self.Run.order_id.in_(ids_to_fetch)).all()
-
-        # Sort the result by order, accounting for direction to satisfy our
-        # requirement of returning the runs in adjacency order.
-        #
-        # Even though we already know the right order, this is faster than
-        # issueing separate queries.
-        runs.sort(key=lambda r: r.order, reverse=(direction == -1))
-
-        return runs
+            query = query.order_by(Order.sort_key, Order.id)
+        if limit != -1:
+            query = query.limit(limit + 1)
+        rows = query.all()
+        more = limit != -1 and len(rows) > limit
+        if more:
+            rows = rows[:limit]
+        if not newest_first:
+            rows.reverse()
+        return rows, more
 
     def get_previous_runs_on_machine(self, session, run, N):
         return self.get_adjacent_runs_on_machine(session, run, N, direction=-1)
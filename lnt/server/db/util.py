@@ -1,7 +1,8 @@
 import sqlalchemy
 import sqlalchemy.ext.compiler
 from sqlalchemy.engine.interfaces import Connectable
-from sqlalchemy.schema import DDLElement
+from sqlalchemy.schema import CreateIndex, DDLElement, DropIndex
+from sqlalchemy.sql.expression import ColumnElement
 from sqlalchemy.ext.compiler import compiles
 from typing import Text
 
@@ -36,3 +37,54 @@ def add_column(connectable, table_name, column):
     """
     statement = _AddColumn(table_name, column)
     statement.execute(bind=connectable)
+
+
+def _make_index(table_name, column_name, index_name):
+    table = sqlalchemy.Table(table_name, sqlalchemy.MetaData(),
+                             sqlalchemy.Column(column_name))
+    return sqlalchemy.Index(index_name, table.c[column_name])
+
+
+def add_index(connectable, table_name, column_name, index_name):
+    # type: (Connectable, Text, Text, Text) -> None
+    """Create the index `index_name` on the column `column_name` of the table
+    named `table_name`."""
+    index = _make_index(table_name, column_name, index_name)
+    connectable.execute(CreateIndex(index))
+
+
+def drop_index(connectable, table_name, column_name, index_name):
+    # type: (Connectable, Text, Text, Text) -> None
+    """Drop the index `index_name` on the column `column_name` of the table
+    named `table_name`."""
+    index = _make_index(table_name, column_name, index_name)
+    connectable.execute(DropIndex(index))
+
+
+class contains_substring(ColumnElement):
+    """Case sensitive check whether the string or binary `column` contains
+    `substring`.
+
+    Unlike column.contains(), this takes `substring` literally and does not
+    depend on the case sensitivity of LIKE, which sqlite ignores.
+    """
+    type = sqlalchemy.Boolean()
+
+    def __init__(self, column, substring):
+        self.column = column
+        self.substring = substring
+
+
+@compiles(contains_substring)
+def _visit_contains_substring(element, compiler, **kw):
+    pattern = element.substring.replace('\\', '\\\\') \
+        .replace('%', '\\%').replace('_', '\\_')
+    expression = element.column.like('%' + pattern + '%', escape='\\')
+    return compiler.process(expression, **kw)
+
+
+@compiles(contains_substring, 'sqlite')
+def _visit_contains_substring_sqlite(element, compiler, **kw):
+    substring = sqlalchemy.literal(element.substring, element.column.type)
+    expression = sqlalchemy.func.instr(element.column, substring) > 0
+    return compiler.process(expression, **kw)
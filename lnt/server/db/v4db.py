@@ -1,4 +1,7 @@
+import copy
 import glob
+import hashlib
+import json
 import yaml
 
 try:
@@ -13,19 +16,115 @@ import lnt.testing
 import lnt.server.db.testsuitedb
 import lnt.server.db.migrate
 
+from lnt.server.db import generation
+from lnt.server.db import retention
 from lnt.server.db import testsuite
 from sqlalchemy.orm import joinedload
 import lnt.server.db.util
 
 
+# Test suite databases are expensive to set up: every schema file is parsed,
+# checked against the database and turned into a set of mapped classes. They
+# are kept in a process wide registry keyed by database path, configuration,
+# baseline revision and a hash of the schema, so opening the same database
+# again (as command line tools and shadow imports do) reuses them. Registered
+# test suites are never modified; every V4DB works on a shallow copy holding
+# its own database, retention policy and caches. In-memory databases are
+# never shared.
+_testsuite_registry = {}
+_migrated_paths = set()
+_registry_lock = threading.Lock()
+
+
+def _is_shareable(path):
+    return path not in ('sqlite://', 'sqlite:///:memory:')
+
+
+def _suite_fingerprint(suite):
+    """Return a hash of the schema of a test suite loaded from the
+    database."""
+    def fields(field_list):
+        return sorted((f.id, f.name) for f in field_list)
+    data = (suite.db_key_name, fields(suite.machine_fields),
+            fields(suite.run_fields), fields(suite.order_fields),
+            sorted((f.id, f.name, f.type.name, f.status_field_id,
+                    f.bigger_is_better) for f in suite.sample_fields))
+    return hashlib.sha1(json.dumps(data)).hexdigest()
+
+
+def clear_testsuite_registry(path=None):
+    """Forget the shared test suite databases and migration checks, either
+    for all databases or only for the database at path."""
+    with _registry_lock:
+        if path is None:
+            _testsuite_registry.clear()
+            _migrated_paths.clear()
+            return
+        for key in list(_testsuite_registry):
+            if key[0] == path:
+                del _testsuite_registry[key]
+        _migrated_paths.discard(path)
+
+
+def _has_schema_version(engine):
+    """Check whether the database has recorded any schema version, i.e.
+    whether it has been migrated at all."""
+    table = lnt.server.db.migrate.SchemaVersion.__tablename__
+    if not engine.has_table(table):
+        return False
+    session = sqlalchemy.orm.sessionmaker(engine)()
+    try:
+        return session.query(lnt.server.db.migrate.SchemaVersion) \
+                      .first() is not None
+    finally:
+        session.close()
+
+
 class V4DB(object):
     """
     Wrapper object for LNT v0.4+ databases.
     """
+    def _bind_testsuite(self, shared, schema_retention):
+        """Return a copy of the shared test suite database for use by this
+        instance. The copy shares the mapped classes but has its own
+        database, retention policy and caches."""
+        tsdb = copy.copy(shared)
+        tsdb.v4db = self
+        tsdb.retention_policy = self._get_retention_policy(tsdb.name,
+                                                           schema_retention)
+        tsdb.machine_to_latest_order_cache = {}
+        return tsdb
+
+    def _get_shared_testsuite(self, key):
+        """Return the test suite database registered under key, bound to
+        this instance, or None."""
+        if not self._shareable:
+            return None
+        with _registry_lock:
+            entry = _testsuite_registry.get(key)
+        if entry is None:
+            return None
+        return self._bind_testsuite(*entry)
+
+    def _make_testsuite(self, key, suite, schema_retention):
+        shared = lnt.server.db.testsuitedb.TestSuiteDB(self, suite.name,
+                                                       suite)
+        if self._shareable:
+            with _registry_lock:
+                _testsuite_registry[key] = (shared, schema_retention)
+        return self._bind_testsuite(shared, schema_retention)
+
     def _load_schema_file(self, schema_file):
-        session = self.make_session(expire_on_commit=False)
         with open(schema_file) as schema_fd:
-            data = yaml.load(schema_fd)
+            schema_text = schema_fd.read()
+        key = (self.path, self.config, self.baseline_revision,
+               hashlib.sha1(schema_text).hexdigest())
+        tsdb = self._get_shared_testsuite(key)
+        if tsdb is not None:
+            return tsdb
+
+        session = self.make_session(expire_on_commit=False)
+        data = yaml.load(schema_text)
         suite = testsuite.TestSuite.from_json(data)
         testsuite.check_testsuite_schema_changes(session, suite)
         suite = testsuite.sync_testsuite_with_metatables(session, suite)
@@ -33,10 +132,14 @@ class V4DB(object):
         session.close()
 
         # Create tables if necessary
-        tsdb = lnt.server.db.testsuitedb.TestSuiteDB(self, suite.name, suite)
+        tsdb = self._make_testsuite(key, suite, data.get('retention'))
         tsdb.create_tables(self.engine)
         return tsdb
 
+    def _get_retention_policy(self, name, schema_data):
+        config_data = self.config.retention.get(name)
+        return retention.RetentionPolicy.from_data(schema_data, config_data)
+
     def _load_schemas(self):
         # Load schema files (preferred)
         schemasDir = self.config.schemasDir
@@ -53,7 +156,11 @@ class V4DB(object):
             name = suite.name
             if name in self.testsuite:
                 continue
-            tsdb = lnt.server.db.testsuitedb.TestSuiteDB(self, name, suite)
+            key = (self.path, self.config, self.baseline_revision,
+                   _suite_fingerprint(suite))
+            tsdb = self._get_shared_testsuite(key)
+            if tsdb is None:
+                tsdb = self._make_testsuite(key, suite, None)
             self.testsuite[name] = tsdb
 
     def __init__(self, path, config, baseline_revision=0):
@@ -74,10 +181,19 @@ class V4DB(object):
                                                connect_args=connect_args)
 
         # Update the database to the current version, if necessary. Only check
-        # this once per path.
-        lnt.server.db.migrate.update(self.engine)
+        # this once per path, unless the database has been recreated since.
+        self._shareable = _is_shareable(path)
+        if self._shareable and path in _migrated_paths and \
+                not _has_schema_version(self.engine):
+            clear_testsuite_registry(path)
+        if not self._shareable or path not in _migrated_paths:
+            lnt.server.db.migrate.update(self.engine)
+            if self._shareable:
+                with _registry_lock:
+                    _migrated_paths.add(path)
 
         self.sessionmaker = sqlalchemy.orm.sessionmaker(self.engine)
+        generation.track_changes(self.sessionmaker)
 
         self.testsuite = dict()
         self._load_schemas()
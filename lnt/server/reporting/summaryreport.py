@@ -1,7 +1,15 @@
+import collections
+import hashlib
+import json
+import multiprocessing.pool
 import re
+import threading
+
+import sqlalchemy
 
 import lnt.testing
 import lnt.util.stats
+from lnt.server.ui import caching
 
 ###
 # Aggregation Function
@@ -86,13 +94,199 @@ class NormalizedMean(Mean):
                             for v in values])
 
 ###
+# Datapoint Keys
+#
+# The datapoints of the summary are keyed by test name, metric, arch, build
+# mode and machine. Depending on the test suite, these are derived from the
+# test name or from the run parameters.
+
+
+def _get_nts_run_key(run):
+    arch = run.get_parameter('cc_target').split('-')[0]
+    if '86' in arch:
+        arch = 'x86'
+
+    if run.get_parameter('OPTFLAGS') == '-O0':
+        build_mode = 'Debug'
+    else:
+        build_mode = 'Release'
+    return arch, build_mode
+
+
+def _get_nts_test_key(test_name, field_name):
+    # The test name for a sample in the NTS suite is just the name of the
+    # sample test, the build mode is derived from the run flags.
+    if field_name == 'compile_time':
+        return test_name, 'Compile Time', None
+    else:
+        assert field_name == 'execution_time'
+        return test_name, 'Execution Time', None
+
+
+def _get_compile_run_key(run):
+    # Extract the arch from the run info (and normalize), the build mode is
+    # derived from the test name.
+    arch = run.get_parameter('cc_target').split('-')[0]
+    if arch.startswith('arm'):
+        arch = 'ARM'
+    elif '86' in arch:
+        arch = 'x86'
+    return arch, None
+
+
+def _get_compile_test_key(test_name, field_name):
+    # Extract the compile flags from the test name.
+    base_name, flags = test_name.split('(')
+    assert flags[-1] == ')'
+    other_flags = []
+    build_mode = None
+    for flag in flags[:-1].split(','):
+        # If this is an optimization flag, derive the build mode from it.
+        if flag.startswith('-O'):
+            if '-O0' in flag:
+                build_mode = 'Debug'
+            else:
+                build_mode = 'Release'
+            continue
+
+        # If this is a 'config' flag, derive the build mode from it.
+        if flag.startswith('config='):
+            if flag == "config='Debug'":
+                build_mode = 'Debug'
+            else:
+                assert flag == "config='Release'"
+                build_mode = 'Release'
+            continue
+
+        # Otherwise, treat the flag as part of the test name.
+        other_flags.append(flag)
+
+    # Form the test name prefix from the remaining flags.
+    test_name_prefix = '%s(%s)' % (base_name, ','.join(other_flags))
+
+    # The metric is fixed.
+    return '%s.%s' % (test_name_prefix, field_name), 'Compile Time', build_mode
+
+
+# The summarized test suites: the metric fields and the prefixes of the test
+# names used by the summary, and the functions computing the datapoint key
+# from the run parameters and from the test name.
+_SUITES = {
+    'nts': (('compile_time', 'execution_time'),
+            ('SingleSource/', 'MultiSource/', 'External/'),
+            _get_nts_run_key, _get_nts_test_key),
+    # Only the wall time is summarized for now.
+    'compile': (('wall_time',), ('build/', 'compile/', 'pch-gen/'),
+                _get_compile_run_key, _get_compile_test_key),
+}
+
+
+def _load_data_table(session, ts, run_columns, run_keys, num_columns):
+    """_load_data_table(session, ts, run_columns, run_keys, num_columns)
+        -> {key: [[value*]*]}
+
+    Load the datapoints of the runs in run_columns, which maps run ids to the
+    report columns the run belongs to. run_keys maps run ids to the arch,
+    build mode and machine name of the run."""
+    field_names, test_prefixes, _, get_test_key = _SUITES[ts.name]
+    fields = [f for f in ts.Sample.get_metric_fields()
+              if f.name in field_names]
+
+    # Select the values of the summarized fields, failing samples are
+    # replaced with NULL by the database.
+    columns = [ts.Sample.run_id, ts.Sample.test_id]
+    for field in fields:
+        if field.status_field is None:
+            columns.append(field.column)
+        else:
+            columns.append(sqlalchemy.case(
+                [(field.status_field.column == lnt.testing.FAIL, None)],
+                else_=field.column))
+    is_summarized_test = sqlalchemy.or_(*[ts.Test.name.like(prefix + '%')
+                                          for prefix in test_prefixes])
+    test_names = dict(session.query(ts.Test.id, ts.Test.name)
+                      .filter(is_summarized_test))
+    samples = session.query(*columns) \
+        .join(ts.Test) \
+        .filter(ts.Sample.run_id.in_(list(run_columns.keys()))) \
+        .filter(is_summarized_test)
+
+    data_table = {}
+    test_keys = {}
+    for sample in samples:
+        run_id, test_id = sample[:2]
+        arch, run_build_mode, machine_name = run_keys[run_id]
+        for field, value in zip(fields, sample[2:]):
+            # Ignore missing and failing samples.
+            if value is None:
+                continue
+
+            test_key = test_keys.get((test_id, field.name))
+            if test_key is None:
+                test_key = test_keys[(test_id, field.name)] = \
+                    get_test_key(test_names[test_id], field.name)
+            test_name, metric, build_mode = test_key
+            key = (test_name, metric, arch, build_mode or run_build_mode,
+                   machine_name)
+
+            items = data_table.get(key)
+            if items is None:
+                items = data_table[key] = \
+                    [[] for _column in range(num_columns)]
+            for index in run_columns[run_id]:
+                items[index].append(value)
+    return data_table
+
+
+###
+# Report Cache
+
+# Number of built reports kept by get_report.
+REPORT_CACHE_SIZE = 4
+
+_report_cache = collections.OrderedDict()
+_report_cache_lock = threading.Lock()
+
+
+def get_report(session, db, config_data):
+    """get_report(session, db, config_data) -> SummaryReport
+
+    Return the built summary report for the JSON encoded configuration. The
+    report is reused until the configuration or the data of one of the
+    summarized test suites changes, see caching.get_validator."""
+    validators = tuple(caching.get_validator(session, ts)
+                       for ts in _get_testsuites(db))
+    key = (db.path, hashlib.sha1(config_data).hexdigest(), validators)
+    with _report_cache_lock:
+        report = _report_cache.pop(key, None)
+        if report is not None:
+            _report_cache[key] = report
+            return report
+
+    config = json.loads(config_data)
+    report = SummaryReport(db, config['orders'], config['machine_names'],
+                           config['machine_patterns'])
+    report.build(session)
+
+    with _report_cache_lock:
+        _report_cache[key] = report
+        while len(_report_cache) > REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+    return report
+
+
+def _get_testsuites(db):
+    return [ts for name, ts in sorted(db.testsuite.items())
+            if name in _SUITES]
+
+###
 
 
 class SummaryReport(object):
     def __init__(self, db, report_orders, report_machine_names,
                  report_machine_patterns):
         self.db = db
-        self.testsuites = list(db.testsuite.values())
+        self.testsuites = _get_testsuites(db)
         self.report_orders = list((name, orders)
                                   for name, orders in report_orders)
         self.report_machine_names = set(report_machine_names)
@@ -156,11 +350,6 @@ class SummaryReport(object):
                 runs.append((ts_runs, ts_order_ids))
             self.runs_at_index.append(runs)
 
-        # Load the tests for each testsuite.
-        self.tests = dict((ts, dict((test.id, test)
-                                    for test in session.query(ts.Test)))
-                          for ts in self.testsuites)
-
         # Compute the base table for aggregation.
         #
         # The table is indexed by a test name and test features, which are
@@ -179,7 +368,7 @@ class SummaryReport(object):
         #   <machine id>)
 
         self.data_table = {}
-        self._build_data_table()
+        self._build_data_table(session)
 
         # Compute indexed data table by applying the indexing functions.
         self._build_indexed_data_table()
@@ -190,169 +379,49 @@ class SummaryReport(object):
         # Build final organized data tables.
         self._build_final_data_tables()
 
-    def _build_data_table(self):
-        def get_nts_datapoints_for_sample(ts, sample):
-            # Get the basic sample info.
-            run_id = sample[0]
-            machine_id = run_machine_id_map[run_id]
-            run_parameters = run_parameters_map[run_id]
-
-            # Get the test.
-            test = ts_tests[sample[1]]
-
-            # The test name for a sample in the NTS suite is just the name of
-            # the sample test.
-            test_name = test.name
-
-            # The arch and build mode are derived from the run flags.
-            arch = run_parameters['cc_target'].split('-')[0]
-            if '86' in arch:
-                arch = 'x86'
-
-            if run_parameters['OPTFLAGS'] == '-O0':
-                build_mode = 'Debug'
-            else:
-                build_mode = 'Release'
-
-            # Return a datapoint for each passing field.
-            for field_name, field, status_field in ts_sample_metric_fields:
-                # Ignore failing samples.
-                if status_field:
-                    status_field_index = ts.get_field_index(status_field)
-                    if sample[2 + status_field_index] == lnt.testing.FAIL:
-                        continue
-
-                # Ignore missing samples.
-                field_index = ts.get_field_index(field)
-                value = sample[2 + field_index]
-                if value is None:
-                    continue
-
-                # Otherwise, return a datapoint.
-                if field_name == 'compile_time':
-                    metric = 'Compile Time'
+    def _build_data_table(self, session):
+        # Collect the report columns and the key of every run, so the samples
+        # of each test suite are loaded with a single query.
+        loads = []
+        for i, ts in enumerate(self.testsuites):
+            get_run_key = _SUITES[ts.name][2]
+            run_columns = {}
+            run_keys = {}
+            for index, runs in enumerate(self.runs_at_index):
+                for run in runs[i][0]:
+                    run_columns.setdefault(run.id, []).append(index)
+                    if run.id not in run_keys:
+                        run_keys[run.id] = get_run_key(run) + \
+                            (run.machine.name,)
+            if run_columns:
+                loads.append((ts, run_columns, run_keys))
+
+        num_columns = len(self.report_orders)
+        if len(loads) > 1:
+            # Load the test suites in parallel, each with its own session.
+            def load(args):
+                ts_session = self.db.make_session()
+                try:
+                    return _load_data_table(ts_session, *args + (num_columns,))
+                finally:
+                    ts_session.close()
+            pool = multiprocessing.pool.ThreadPool(len(loads))
+            try:
+                tables = pool.map(load, loads)
+            finally:
+                pool.close()
+        else:
+            tables = [_load_data_table(session, *args + (num_columns,))
+                      for args in loads]
+
+        for table in tables:
+            for key, values in table.items():
+                items = self.data_table.get(key)
+                if items is None:
+                    self.data_table[key] = values
                 else:
-                    assert field_name == 'execution_time'
-                    metric = 'Execution Time'
-                yield ((test_name, metric, arch, build_mode, machine_id),
-                       value)
-
-        def get_compile_datapoints_for_sample(ts, sample):
-            # Get the basic sample info.
-            run_id = sample[0]
-            machine_id = run_machine_id_map[run_id]
-            run_parameters = run_parameters_map[run_id]
-
-            # Get the test.
-            test = ts_tests[sample[1]]
-
-            # Extract the compile flags from the test name.
-            base_name, flags = test.name.split('(')
-            assert flags[-1] == ')'
-            other_flags = []
-            build_mode = None
-            for flag in flags[:-1].split(','):
-                # If this is an optimization flag, derive the build mode from
-                # it.
-                if flag.startswith('-O'):
-                    if '-O0' in flag:
-                        build_mode = 'Debug'
-                    else:
-                        build_mode = 'Release'
-                    continue
-
-                # If this is a 'config' flag, derive the build mode from it.
-                if flag.startswith('config='):
-                    if flag == "config='Debug'":
-                        build_mode = 'Debug'
-                    else:
-                        assert flag == "config='Release'"
-                        build_mode = 'Release'
-                    continue
-
-                # Otherwise, treat the flag as part of the test name.
-                other_flags.append(flag)
-
-            # Form the test name prefix from the remaining flags.
-            test_name_prefix = '%s(%s)' % (base_name, ','.join(other_flags))
-
-            # Extract the arch from the run info (and normalize).
-            arch = run_parameters['cc_target'].split('-')[0]
-            if arch.startswith('arm'):
-                arch = 'ARM'
-            elif '86' in arch:
-                arch = 'x86'
-
-            # The metric is fixed.
-            metric = 'Compile Time'
-
-            # Report the user and wall time.
-            for field_name, field, status_field in ts_sample_metric_fields:
-                if field_name not in ('user_time', 'wall_time'):
-                    continue
-
-                # Ignore failing samples.
-                if status_field:
-                    status_field_index = ts.get_field_index(status_field)
-                    if sample[2 + status_field_index] == lnt.testing.FAIL:
-                        continue
-
-                # Ignore missing samples.
-                field_index = ts.get_field_index(field)
-                value = sample[2 + field_index]
-                if value is None:
-                    continue
-
-                # Otherwise, return a datapoint.
-                yield (('%s.%s' % (test_name_prefix, field_name), metric, arch,
-                        build_mode, machine_id), value)
-
-        def get_datapoints_for_sample(ts, sample):
-            # The exact datapoints in each sample depend on the testsuite
-            if ts.name == 'nts':
-                return get_nts_datapoints_for_sample(ts, sample)
-            else:
-                assert ts.name == 'compile'
-                return get_compile_datapoints_for_sample(ts, sample)
-
-        # For each column...
-        for index, runs in enumerate(self.runs_at_index):
-            # For each test suite and run list...
-            for ts, (ts_runs, _) in zip(self.testsuites, runs):
-                ts_tests = self.tests[ts]
-
-                # Compute the metric fields.
-                ts_sample_metric_fields = [
-                    (f.name, f, f.status_field)
-                    for f in ts.Sample.get_metric_fields()]
-
-                # Compute a mapping from run id to run.
-                run_id_map = dict((r.id, r)
-                                  for r in ts_runs)
-
-                # Compute a mapping from run id to machine id.
-                run_machine_id_map = dict((r.id, r.machine.name)
-                                          for r in ts_runs)
-
-                # Preload the run parameters.
-                run_parameters_map = dict((r.id, r.parameters)
-                                          for r in ts_runs)
-
-                # Load all the samples for all runs we are interested in.
-                columns = [ts.Sample.run_id, ts.Sample.test_id]
-                columns.extend(f.column for f in ts.sample_fields)
-                samples = session.query(*columns).filter(
-                    ts.Sample.run_id.in_(list(run_id_map.keys())))
-                for sample in samples:
-                    run = run_id_map[sample[0]]
-                    datapoints = list()
-                    for key, value in get_datapoints_for_sample(ts, sample):
-                        items = self.data_table.get(key)
-                        if items is None:
-                            items = [[]
-                                     for _ in self.report_orders]
-                            self.data_table[key] = items
-                        items[index].append(value)
+                    for samples, more_samples in zip(items, values):
+                        samples.extend(more_samples)
 
     def _build_indexed_data_table(self):
         def is_in_execution_time_filter(name):
@@ -7,6 +7,9 @@ from flask_restful import Resource, abort
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 
+from lnt.server.db import deletion
+from lnt.server.db import export
+from lnt.server.ui.caching import cached_resource
 from lnt.server.ui.util import convert_revision
 from lnt.server.ui.decorators import in_db
 from lnt.testing import PASS
@@ -14,6 +17,9 @@ from lnt.util import logger
 from functools import wraps
 
 
+ORDERS_PAGE_SIZE = 1000
+
+
 def requires_auth_token(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -64,7 +70,7 @@ def add_common_fields(to_update):
 
 class Fields(Resource):
     """List all the fields in the test suite."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get():
@@ -79,7 +85,7 @@ class Fields(Resource):
 
 class Tests(Resource):
     """List all the tests in the test suite."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get():
@@ -94,7 +100,7 @@ class Tests(Resource):
 
 class Machines(Resource):
     """List all the machines and give summary information."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get():
@@ -109,7 +115,7 @@ class Machines(Resource):
 
 class Machine(Resource):
     """Detailed results about a particular machine, including runs on it."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def _get_machine(machine_spec):
@@ -157,36 +163,19 @@ class Machine(Resource):
         session = request.session
         machine = Machine._get_machine(machine_spec)
 
+        batch_size = request.values.get('batch_size', type=int,
+                                        default=deletion.DEFAULT_BATCH_SIZE)
+        if batch_size <= 0:
+            abort(400, msg="batch_size must be positive")
+
         # Just saying session.delete(machine) takes a long time and risks
         # running into OOM or timeout situations for machines with a hundreds
-        # of runs. So instead remove machine runs in chunks.
+        # of runs. So instead remove machine runs in chunks with set based
+        # deletes, streaming the progress to the client.
         def perform_delete(ts, machine):
-            count = session.query(ts.Run) \
-                .filter(ts.Run.machine_id == machine.id).count()
-            at = 0
-            while True:
-                runs = session.query(ts.Run) \
-                    .filter(ts.Run.machine_id == machine.id) \
-                    .options(joinedload(ts.Run.samples)) \
-                    .options(joinedload(ts.Run.fieldchanges)) \
-                    .order_by(ts.Run.id).limit(10).all()
-                if len(runs) == 0:
-                    break
-                at += len(runs)
-                msg = "Deleting runs %s (%d/%d)" % \
-                    (" ".join([str(run.id) for run in runs]), at, count)
-                logger.info(msg)
+            for msg in deletion.delete_machine(session, ts, machine,
+                                               batch_size):
                 yield msg + '\n'
-                for run in runs:
-                    session.delete(run)
-                session.commit()
-
-            machine_name = "%s:%s" % (machine.name, machine.id)
-            session.delete(machine)
-            session.commit()
-            msg = "Deleted machine %s" % machine_name
-            logger.info(msg)
-            yield msg + '\n'
 
         stream = stream_with_context(perform_delete(ts, machine))
         return Response(stream, mimetype="text/plain")
@@ -249,7 +238,7 @@ class Machine(Resource):
 
 
 class Run(Resource):
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get(run_id):
@@ -291,8 +280,10 @@ class Run(Resource):
         run = session.query(ts.Run).filter(ts.Run.id == run_id).first()
         if run is None:
             abort(404, msg="Did not find run " + str(run_id))
-        session.delete(run)
-        session.commit()
+        # Keep the order, so resubmitting the run maps to the same order id.
+        for _ in deletion.delete_runs(session, ts, [run.id],
+                                      cleanup_orders=False):
+            pass
         logger.info("Deleted run %s" % (run_id,))
 
 
@@ -331,8 +322,32 @@ class Runs(Resource):
         return response
 
 
+class Orders(Resource):
+    """List the orders newest first, as compact rows, a page at a time."""
+    method_decorators = [cached_resource, in_db]
+
+    @staticmethod
+    def get():
+        ts = request.get_testsuite()
+        session = request.session
+        limit = request.args.get('limit', ORDERS_PAGE_SIZE, type=int)
+        if limit <= 0:
+            limit = -1
+        rows, more = ts.get_order_rows(
+            session, limit, before=request.args.get('before', type=int),
+            prefix=request.args.get('prefix'))
+
+        result = common_fields_factory()
+        result['columns'] = ['id', 'previous_order_id', 'next_order_id'] + \
+            [item.name for item in ts.order_fields]
+        result['orders'] = [list(row) for row in rows]
+        # Pass as 'before' to get the next page.
+        result['next_before'] = rows[-1][0] if more else None
+        return result
+
+
 class Order(Resource):
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get(order_id):
@@ -358,7 +373,7 @@ class Schema(Resource):
 
 
 class SampleData(Resource):
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get(sample_id):
@@ -377,7 +392,7 @@ class SampleData(Resource):
 
 class SamplesData(Resource):
     """List all the machines and give summary information."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get():
@@ -414,9 +429,39 @@ class SamplesData(Resource):
         return result
 
 
+class Export(Resource):
+    """Bulk export of samples as an arrow IPC stream."""
+    method_decorators = [in_db]
+
+    @staticmethod
+    def get():
+        ts = request.get_testsuite()
+        session = request.session
+        if export.pyarrow is None:
+            abort(501, msg="Export requires the 'pyarrow' package")
+        try:
+            export_filter = export.ExportFilter(
+                machines=request.args.getlist('machine'),
+                start_date=export.parse_date(request.args.get('start_date')),
+                end_date=export.parse_date(request.args.get('end_date')),
+                min_order=request.args.get('min_order'),
+                max_order=request.args.get('max_order'),
+                after_sample_id=request.args.get('after_sample_id', type=int))
+        except ValueError as e:
+            abort(400, msg=str(e))
+        batch_size = request.args.get('batch_size', type=int,
+                                      default=export.DEFAULT_BATCH_SIZE)
+        if batch_size <= 0:
+            abort(400, msg="batch_size must be positive")
+
+        stream = stream_with_context(export.iter_arrow_stream_chunks(
+            session, ts, export_filter, batch_size))
+        return Response(stream, mimetype=export.ARROW_STREAM_MIMETYPE)
+
+
 class Graph(Resource):
     """List all the machines and give summary information."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get(machine_id, test_id, field_index):
@@ -465,7 +510,7 @@ class Graph(Resource):
 
 class Regression(Resource):
     """List all the machines and give summary information."""
-    method_decorators = [in_db]
+    method_decorators = [cached_resource, in_db]
 
     @staticmethod
     def get(machine_id, test_id, field_index):
@@ -540,7 +585,9 @@ def load_api_resources(api):
     api.add_resource(SamplesData, ts_path("samples"), ts_path("samples/"))
     api.add_resource(SampleData, ts_path("samples/<sample_id>"))
     api.add_resource(Schema, ts_path("schema"), ts_path("schema/"))
+    api.add_resource(Orders, ts_path("orders"), ts_path("orders/"))
     api.add_resource(Order, ts_path("orders/<int:order_id>"))
+    api.add_resource(Export, ts_path("export"), ts_path("export/"))
     graph_url = "graph/<int:machine_id>/<int:test_id>/<int:field_index>"
     api.add_resource(Graph, ts_path(graph_url))
     regression_url = \
@@ -8,8 +8,10 @@ import traceback
 from logging import Formatter
 
 import datetime
+import zlib
 import flask
 import jinja2
+import werkzeug.exceptions
 from flask import current_app
 from flask import g
 from flask import session
@@ -23,8 +25,10 @@ import lnt
 import lnt.server.db.rules_manager
 import lnt.server.db.v4db
 import lnt.server.instance
+import lnt.server.ui.caching
 import lnt.server.ui.filters
 import lnt.server.ui.globals
+import lnt.server.ui.profile_service
 import lnt.server.ui.profile_views
 import lnt.server.ui.regression_views
 import lnt.server.ui.views
@@ -47,6 +51,43 @@ class RootSlashPatchMiddleware(object):
         return self.app(environ, start_response)
 
 
+class GzipRequestMiddleware(object):
+    """Decompress request bodies sent with 'Content-Encoding: gzip', as done
+    by 'lnt submit'. Request bodies are limited to the MAX_CONTENT_LENGTH of
+    the flask app, before and after decompression."""
+    def __init__(self, app, flask_app):
+        self.app = app
+        self.flask_app = flask_app
+
+    def __call__(self, environ, start_response):
+        max_size = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        too_large = werkzeug.exceptions.RequestEntityTooLarge()
+        if max_size is not None and length > max_size:
+            return too_large(environ, start_response)
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').lower()
+        if encoding == 'gzip':
+            body = environ['wsgi.input'].read(length)
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                # Stop decompressing as soon as the limit is exceeded.
+                body = decompressor.decompress(
+                    body, max_size + 1 if max_size is not None else 0)
+                if not decompressor.unconsumed_tail:
+                    body += decompressor.flush()
+            except zlib.error:
+                error = werkzeug.exceptions.BadRequest(
+                    "request body is not valid gzip data")
+                return error(environ, start_response)
+            if max_size is not None and (len(body) > max_size or
+                                         decompressor.unconsumed_tail):
+                return too_large(environ, start_response)
+            environ['wsgi.input'] = StringIO.StringIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.app(environ, start_response)
+
+
 class LNTObjectJSONEncoder(flask.json.JSONEncoder):
     """Take SQLAlchemy objects and jsonify them. If the object has an __json__
     method, use that instead."""
@@ -221,11 +262,19 @@ class App(LNTExceptionLoggerFlask):
         # Inject a fix for missing slashes on the root URL (see Flask issue
         # #169).
         self.wsgi_app = RootSlashPatchMiddleware(self.wsgi_app)
+        self.wsgi_app = GzipRequestMiddleware(self.wsgi_app, self)
         self.logger.setLevel(logging.DEBUG)
 
     def load_config(self, instance):
         self.instance = instance
         self.old_config = self.instance.config
+        self.response_cache = lnt.server.ui.caching.ResponseCache.from_config(
+            self.old_config.response_cache)
+        self.profile_cache = \
+            lnt.server.ui.profile_service.ProfileCache.from_config(
+                self.old_config)
+        self.config['MAX_CONTENT_LENGTH'] = \
+            self.old_config.max_request_size_mb * 1024 * 1024
 
         self.jinja_env.globals.update(
             app=current_app,
@@ -0,0 +1,169 @@
+"""
+HTTP caching of the read-mostly pages and API resources.
+
+The responses of a test suite only change when the test suite does, so the
+ETag of a response is derived from the test suite's validator (its highest
+run id and its generation, see lnt.server.db.generation) and from everything
+else the response depends on: the URL, the user's session and the accepted
+content types. A request whose If-None-Match matches is answered with 304
+before the view runs.
+
+Optionally complete responses are kept in a ResponseCache, a directory of
+files shared by all the worker processes of the server, configured with the
+``response_cache`` dictionary of ``lnt.cfg``::
+
+  response_cache = { 'dir' : 'data/response_cache', 'max_size_mb' : 256 }
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+import flask
+import sqlalchemy
+from flask import current_app, g, request
+from flask_restful.utils import unpack
+
+from lnt.server.db import generation
+from lnt.util import logger
+
+DEFAULT_RESPONSE_CACHE_SIZE_MB = 256
+
+# Headers stored with a cached response.
+_CACHED_HEADERS = ('Content-Type', 'Content-Disposition')
+
+
+def get_validator(session, ts):
+    """Return a string which changes whenever the data of the test suite
+    does."""
+    max_run_id = session.query(sqlalchemy.func.max(ts.Run.id)).scalar()
+    return '%d.%d' % (max_run_id or 0, generation.get_generation(session,
+                                                                  ts.name))
+
+
+def _get_etag():
+    ts = request.get_testsuite()
+    key = [current_app.version, g.db_name, ts.name,
+           get_validator(request.session, ts), request.full_path,
+           request.headers.get('Accept', ''),
+           sorted(flask.session.items())]
+    return hashlib.sha1(json.dumps(key, default=repr)).hexdigest()
+
+
+class ResponseCache(object):
+    """Complete responses stored as files in a directory, by ETag, evicting
+    the least recently used ones once they take more than max_size bytes."""
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    @staticmethod
+    def from_config(config_data):
+        if not config_data:
+            return None
+        size_mb = config_data.get('max_size_mb',
+                                  DEFAULT_RESPONSE_CACHE_SIZE_MB)
+        return ResponseCache(config_data['dir'], size_mb * 1024 * 1024)
+
+    def _file(self, etag):
+        return os.path.join(self.path, etag + '.response')
+
+    def get(self, etag):
+        """Return the response stored for etag, or None."""
+        path = self._file(etag)
+        try:
+            with open(path, 'rb') as f:
+                headers = json.loads(f.readline())
+                data = f.read()
+            # Mark the response as recently used.
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return flask.Response(data, headers=headers)
+
+    def put(self, etag, response):
+        headers = dict((name, response.headers[name])
+                       for name in _CACHED_HEADERS if name in response.headers)
+        # Write to a temporary file first, so readers never see partial
+        # responses.
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(json.dumps(headers) + '\n')
+            f.write(response.get_data())
+        os.rename(temp_path, self._file(etag))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used responses until the cache is no
+        larger than max_size."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            if not name.endswith('.response'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+
+
+def _cached(f, make_response):
+    @functools.wraps(f)
+    def wrap(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or 'db_log' in request.args:
+            return f(*args, **kwargs)
+
+        etag = _get_etag()
+        if request.if_none_match.contains(etag):
+            response = flask.Response(status=304)
+            response.set_etag(etag)
+            return response
+        cache = current_app.response_cache
+        response = cache.get(etag) if cache is not None else None
+        if response is None:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            if cache is not None:
+                try:
+                    cache.put(etag, response)
+                except (IOError, OSError) as e:
+                    logger.warning("Could not cache response: %s" % e)
+        response.set_etag(etag)
+        # Clients have to revalidate, which is cheap.
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrap
+
+
+def cached_view(f):
+    """Add ETags and caching to a view of a test suite, see v4_route."""
+    return _cached(f, flask.make_response)
+
+
+def _make_api_response(rv):
+    if isinstance(rv, flask.Response):
+        return rv
+    data, code, headers = unpack(rv)
+    return current_app.api.make_response(data, code, headers=headers)
+
+
+def cached_resource(f):
+    """Add ETags and caching to a method of a REST API resource. List it
+    before in_db in method_decorators."""
+    return _cached(f, _make_api_response)
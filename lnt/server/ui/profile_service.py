@@ -0,0 +1,174 @@
+"""
+Access to the decoded profiles for the profile viewer.
+
+Decoding a profile reads and decompresses the whole file, and the profile
+page asks for the same one or two profiles several times. Every server
+process therefore keeps the most recently used decoded profiles in a
+ProfileCache, keyed by the path and the modification time of the file and
+bounded by the memory they take, configured with ``profile_cache_size_mb`` in
+``lnt.cfg``. The differences between pairs of profiles (see
+lnt.testing.profile.diff) are kept alongside.
+"""
+import collections
+import os
+import threading
+
+from lnt.testing.profile import diff
+from lnt.testing.profile.profile import Profile
+
+DEFAULT_PROFILE_CACHE_SIZE_MB = 256
+
+# Number of profile differences kept.
+DIFF_CACHE_SIZE = 64
+
+# Memory taken by a decoded profile per byte of its file, for the profile
+# formats we cannot measure.
+_EXPANSION_FACTOR = 10
+
+# Rough memory taken by the index entry of a function.
+_FUNCTION_SIZE = 256
+
+
+def _estimate_size(impl, file_size):
+    """Return roughly how many bytes the decoded profile takes."""
+    sections = getattr(impl, 'sections', None)
+    if sections is None:
+        return file_size * _EXPANSION_FACTOR
+    size = 0
+    for section in sections:
+        data = getattr(section, 'data', '')
+        if hasattr(data, 'getvalue'):
+            data = data.getvalue()
+        size += len(data)
+    return size + _FUNCTION_SIZE * len(impl.getFunctions())
+
+
+class CachedProfile(object):
+    """A decoded profile shared by the threads of the process.
+
+    The sections of a decoded profile read their data through shared file
+    objects, so the code of a function is extracted under a lock and returned
+    as a list."""
+
+    def __init__(self, key, profile, size):
+        self.key = key
+        self.profile = profile
+        self.size = size
+        self._lock = threading.Lock()
+
+    def getTopLevelCounters(self):
+        return self.profile.getTopLevelCounters()
+
+    def getFunctions(self):
+        return self.profile.getFunctions()
+
+    def getCodeForFunction(self, fname):
+        with self._lock:
+            return list(self.profile.getCodeForFunction(fname))
+
+    def getHottestFunction(self, counter):
+        """Return the name of the function with the largest value of counter,
+        or None if the profile has no functions."""
+        functions = self.getFunctions()
+        if not functions:
+            return None
+        return max(sorted(functions),
+                   key=lambda f: functions[f]['counters'].get(counter, 0))
+
+
+class ProfileCache(object):
+    """The least recently used decoded profiles, taking up to max_size bytes.
+
+    A profile is reloaded once its file changes, that is when its
+    modification time does."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = collections.OrderedDict()
+        self._diffs = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config(config):
+        size_mb = config.profile_cache_size_mb
+        if size_mb is None:
+            size_mb = DEFAULT_PROFILE_CACHE_SIZE_MB
+        return ProfileCache(size_mb * 1024 * 1024)
+
+    def get(self, path):
+        """Return the CachedProfile of the profile file at path, or None if it
+        cannot be decoded. Raises OSError if the file is missing."""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+
+        # Decode without holding the lock, so that requests for other
+        # profiles are not held up.
+        profile = Profile.fromFile(path)
+        if profile is None:
+            return None
+        entry = CachedProfile(key, profile,
+                              _estimate_size(profile.impl, stat.st_size))
+        with self._lock:
+            # Drop the other versions of the file, and the entry of another
+            # thread which decoded the profile at the same time.
+            for old_key in [k for k in self._entries if k[0] == path]:
+                self.size -= self._entries.pop(old_key).size
+            self._entries[key] = entry
+            self.size += entry.size
+            # Always keep the profile just loaded.
+            while self.size > self.max_size and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.size -= old.size
+        return entry
+
+    def _get_diff(self, key, compute):
+        with self._lock:
+            result = self._diffs.pop(key, None)
+            if result is not None:
+                self._diffs[key] = result
+                return result
+        result = compute()
+        with self._lock:
+            self._diffs[key] = result
+            while len(self._diffs) > DIFF_CACHE_SIZE:
+                self._diffs.popitem(last=False)
+        return result
+
+    def get_diff(self, path1, path2, counter=None, top=diff.DEFAULT_TOP):
+        """Return the differences between the profile files at path1 and
+        path2, see lnt.testing.profile.diff.diff_profiles, or None if one
+        cannot be decoded."""
+        p1 = self.get(path1)
+        p2 = self.get(path2)
+        if p1 is None or p2 is None:
+            return None
+        return self._get_diff(
+            ('profiles', p1.key, p2.key, counter, top),
+            lambda: diff.diff_profiles(p1, p2, counter=counter, top=top))
+
+    def get_function_diff(self, path1, path2, fname):
+        """Return the aligned code of function fname in the profile files at
+        path1 and path2, see lnt.testing.profile.diff.diff_function, or None
+        if one cannot be decoded."""
+        p1 = self.get(path1)
+        p2 = self.get(path2)
+        if p1 is None or p2 is None:
+            return None
+        return self._get_diff(
+            ('function', p1.key, p2.key, fname),
+            lambda: diff.diff_function(p1, p2, fname))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._diffs.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,13 +1,20 @@
 from flask import abort
+from flask import jsonify
 from flask import request
+from flask import send_file
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 
 from flask import render_template, current_app
 import os
 import json
-from lnt.server.ui.decorators import v4_route, frontend
+import time
+from lnt.server.db import profilecatalog
+from lnt.server.db import profilestore
+from lnt.server.ui.decorators import db_route, v4_route, frontend
 from lnt.server.ui.globals import v4_url_for
 from lnt.server.ui.views import ts_data
+from lnt.testing.profile import diff
 
 
 def _get_sample(session, ts, run_id, test_id):
@@ -17,31 +24,26 @@ def _get_sample(session, ts, run_id, test_id):
                     .filter(ts.Sample.profile_id.isnot(None)).first()
 
 
-@frontend.route('/profile/admin')
-def profile_admin():
-    profileDir = current_app.old_config.profileDir
+def _js_time(dt):
+    """Return the Javascript timestamp of the local datetime dt."""
+    return time.mktime(dt.timetuple()) * 1000
 
-    history_path = os.path.join(profileDir, '_profile-history.json')
-    age_path = os.path.join(profileDir, '_profile-age.json')
 
-    try:
-        history = json.loads(open(history_path).read())
-    except Exception:
-        history = []
-    try:
-        age = json.loads(open(age_path).read())
-    except Exception:
-        age = []
+@db_route('/profile/admin')
+def profile_admin():
+    session = request.session
 
-    # Convert from UNIX timestamps to Javascript timestamps.
-    history = [[x * 1000, y] for x, y in history]
-    age = [[x * 1000, y] for x, y in age]
+    # Sizes in kB.
+    history = [[_js_time(t), size / 1000.0]
+               for t, size in profilecatalog.get_usage_history(session)]
+    age = [[_js_time(t), size / 1000.0]
+           for t, size in profilecatalog.get_sizes_by_age(session)]
 
     # Calculate a histogram bucket size that shows ~20 bars on the screen
     num_buckets = 20
 
     if len(age) > 0:
-        range = max(a[0] for a in age) - min(a[0] for a in age)
+        range = age[-1][0] - age[0][0]
     else:
         range = 0
     bucket_size = float(range) / float(num_buckets)
@@ -49,7 +51,7 @@ def profile_admin():
     # Construct the histogram.
     hist = {}
     for x, y in age:
-        z = int(float(x) / bucket_size)
+        z = int(float(x) / bucket_size) if bucket_size else 0
         hist.setdefault(z, 0)
         hist[z] += y
     age = [[k * bucket_size, hist[k]] for k in sorted(hist.keys())]
@@ -58,68 +60,217 @@ def profile_admin():
                            history=history, age=age, bucket_size=bucket_size)
 
 
-@v4_route("/profile/ajax/getFunctions")
-def v4_profile_ajax_getFunctions():
-    session = request.session
-    ts = request.get_testsuite()
-    runid = request.args.get('runid')
-    testid = request.args.get('testid')
+def _check_upload():
+    """Apply the rules of submitRun to uploads: the size of the upload is
+    limited to MAX_CONTENT_LENGTH."""
+    if request.content_length is None:
+        abort(411)
+    max_size = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_size is not None and request.content_length > max_size:
+        abort(413)
+
 
+@frontend.route('/profile/blobs/<digest>', methods=('GET', 'PUT'))
+def profile_blob(digest):
+    """Upload endpoint for profiles referenced by digest in submissions, see
+    lnt.server.db.profilestore."""
     profileDir = current_app.old_config.profileDir
+    try:
+        path = profilestore.blob_path(profileDir, digest)
+    except ValueError:
+        abort(404)
 
-    idx = 0
-    tlc = {}
-    sample = _get_sample(session, ts, runid, testid)
+    if request.method == 'PUT':
+        _check_upload()
+        if not profilestore.has_blob(profileDir, digest):
+            try:
+                profilestore.store_blob(profileDir, digest,
+                                        request.get_data())
+            except ValueError as e:
+                response = jsonify({'error': str(e)})
+                response.status_code = 400
+                return response
+        response = jsonify({'error': None,
+                            'profile': profilestore.REFERENCE_PREFIX + digest})
+        response.status_code = 201
+        return response
+
+    if not profilestore.has_blob(profileDir, digest):
+        abort(404)
+    return send_file(path, mimetype='application/octet-stream')
+
+
+def _get_profile_paths(session, ts, run_ids, test_id):
+    """Return the paths of the profile files of the test in the runs, None
+    for the runs without one."""
+    samples = session.query(ts.Sample) \
+        .options(joinedload(ts.Sample.profile)) \
+        .filter(ts.Sample.run_id.in_(run_ids)) \
+        .filter(ts.Sample.test_id == test_id) \
+        .filter(ts.Sample.profile_id.isnot(None))
+    profiles = {}
+    for sample in samples:
+        profiles.setdefault(sample.run_id, sample.profile)
+    if profiles:
+        profilecatalog.touch(session, set(p.filename
+                                          for p in profiles.values()))
+        session.commit()
 
-    if sample and sample.profile:
-        p = sample.profile.load(profileDir)
-        return json.dumps([[n, f] for n, f in p.getFunctions().items()])
-    else:
+    profileDir = current_app.old_config.profileDir
+    return [os.path.join(profileDir, profiles[run_id].filename)
+            if run_id in profiles else None
+            for run_id in run_ids]
+
+
+def _get_profiles(session, ts, run_ids, test_id):
+    """Return the decoded profiles of the test in the runs, None for the runs
+    without one."""
+    result = []
+    for path in _get_profile_paths(session, ts, run_ids, test_id):
+        profile = None
+        if path is not None:
+            try:
+                profile = current_app.profile_cache.get(path)
+            except (IOError, OSError):
+                pass
+        result.append(profile)
+    return result
+
+
+def _get_profile(session, ts, run_id, test_id):
+    profile = _get_profiles(session, ts, [run_id], test_id)[0]
+    if profile is None:
         abort(404)
+    return profile
 
 
-@v4_route("/profile/ajax/getTopLevelCounters")
-def v4_profile_ajax_getTopLevelCounters():
-    session = request.session
-    ts = request.get_testsuite()
-    runids = request.args.get('runids').split(',')
-    testid = request.args.get('testid')
+def _get_int_args(name):
+    try:
+        return [int(x) for x in request.args.get(name, '').split(',')]
+    except ValueError:
+        abort(400)
 
-    profileDir = current_app.old_config.profileDir
 
-    idx = 0
+def _get_top_level_counters(profiles):
     tlc = {}
-    for rid in runids:
-        sample = _get_sample(session, ts, rid, testid)
-        if sample and sample.profile:
-            p = sample.profile.load(profileDir)
+    for idx, p in enumerate(profiles):
+        if p is not None:
             for k, v in p.getTopLevelCounters().items():
-                tlc.setdefault(k, [None]*len(runids))[idx] = v
-        idx += 1
+                tlc.setdefault(k, [None]*len(profiles))[idx] = v
 
     # If the 1'th counter is None for all keys, truncate the list.
     if all(len(k) > 1 and k[1] is None for k in tlc.values()):
         tlc = {k: [v[0]] for k, v in tlc.items()}
+    return tlc
+
+
+@v4_route("/profile/ajax/getFunctions")
+def v4_profile_ajax_getFunctions():
+    session = request.session
+    ts = request.get_testsuite()
+    runid = _get_int_args('runid')[0]
+    testid = request.args.get('testid')
 
-    return json.dumps(tlc)
+    p = _get_profile(session, ts, runid, testid)
+    return json.dumps([[n, f] for n, f in p.getFunctions().items()])
+
+
+@v4_route("/profile/ajax/getTopLevelCounters")
+def v4_profile_ajax_getTopLevelCounters():
+    session = request.session
+    ts = request.get_testsuite()
+    runids = _get_int_args('runids')
+    testid = request.args.get('testid')
+
+    profiles = _get_profiles(session, ts, runids, testid)
+    return json.dumps(_get_top_level_counters(profiles))
 
 
 @v4_route("/profile/ajax/getCodeForFunction")
 def v4_profile_ajax_getCodeForFunction():
     session = request.session
     ts = request.get_testsuite()
-    runid = request.args.get('runid')
+    runid = _get_int_args('runid')[0]
     testid = request.args.get('testid')
     f = request.args.get('f')
 
-    profileDir = current_app.old_config.profileDir
+    p = _get_profile(session, ts, runid, testid)
+    return json.dumps(p.getCodeForFunction(f))
+
+
+@v4_route("/profile/ajax/getProfile")
+def v4_profile_ajax_getProfile():
+    """Return in one reply what the profile page first shows: the top level
+    counters of the profiles of the runs 'runids' (as getTopLevelCounters
+    does), and the functions of the profile of run 'runid' (by default the
+    first of 'runids') with the code of function 'f', by default of the
+    function with the largest value of 'counter' (by default 'cycles', or
+    else the first top level counter)."""
+    session = request.session
+    ts = request.get_testsuite()
+    runids = _get_int_args('runids')
+    testid = request.args.get('testid')
+    runid = request.args.get('runid', runids[0], type=int)
+    if runid not in runids:
+        abort(400)
+
+    profiles = _get_profiles(session, ts, runids, testid)
+    p = profiles[runids.index(runid)]
+    if p is None:
+        abort(404)
 
-    sample = _get_sample(session, ts, runid, testid)
-    if not sample or not sample.profile:
+    counters = _get_top_level_counters(profiles)
+    functions = p.getFunctions()
+    f = request.args.get('f')
+    if f is None:
+        counter = request.args.get('counter')
+        if counter is None and counters:
+            counter = 'cycles' if 'cycles' in counters \
+                else sorted(counters)[0]
+        f = p.getHottestFunction(counter)
+    if f is not None and f not in functions:
         abort(404)
 
-    p = sample.profile.load(profileDir)
-    return json.dumps([x for x in p.getCodeForFunction(f)])
+    return json.dumps({
+        'counters': counters,
+        'functions': [[n, fn] for n, fn in functions.items()],
+        'function': f,
+        'code': p.getCodeForFunction(f) if f is not None else [],
+    })
+
+
+@v4_route("/profile/ajax/getDiff")
+def v4_profile_ajax_getDiff():
+    """Return the differences between the profiles of the two runs 'runids',
+    see lnt.testing.profile.diff: the 'top' functions which changed most by
+    'counter', and with 'f' also the aligned code of function 'f'."""
+    session = request.session
+    ts = request.get_testsuite()
+    runids = _get_int_args('runids')
+    testid = request.args.get('testid')
+    counter = request.args.get('counter')
+    try:
+        top = int(request.args.get('top', diff.DEFAULT_TOP))
+    except ValueError:
+        abort(400)
+    f = request.args.get('f')
+    if len(runids) != 2:
+        abort(400)
+
+    paths = _get_profile_paths(session, ts, runids, testid)
+    if None in paths:
+        abort(404)
+    cache = current_app.profile_cache
+    try:
+        result = cache.get_diff(paths[0], paths[1], counter=counter, top=top)
+        if result is None:
+            abort(404)
+        if f is not None:
+            result = dict(result,
+                          code=cache.get_function_diff(paths[0], paths[1], f))
+    except (IOError, OSError):
+        abort(404)
+    return json.dumps(result)
 
 
 @v4_route("/profile/<int:testid>/<int:run1_id>")
@@ -191,6 +342,8 @@ def v4_profile(testid, run1_id, run2_id=None):
         'getFunctions': v4_url_for('.v4_profile_ajax_getFunctions'),
         'getCodeForFunction':
             v4_url_for('.v4_profile_ajax_getCodeForFunction'),
+        'getProfile': v4_url_for('.v4_profile_ajax_getProfile'),
+        'getDiff': v4_url_for('.v4_profile_ajax_getDiff'),
     }
     return render_template("v4_profile.html",
                            test=test, run1=json_run1, run2=json_run2,
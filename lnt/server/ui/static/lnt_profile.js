@@ -461,6 +461,13 @@ Profile.prototype = {
             this._display();
     },
 
+    // Use the code of a function which was fetched along with other data,
+    // a following go() for the function does not fetch it again.
+    preload: function(function_name, data) {
+        this.function_name = function_name;
+        this.data = data;
+    },
+
     _fetch_and_display: function(fname, then) {
         this.function_name = fname;
         var this_ = this;
@@ -499,7 +506,11 @@ Profile.prototype = {
     _display_cfg: function(instructionSet) {
         this.instructionSet = instructionSet; 
         this.element.empty();
-        var profiledDisassembly = this.data;
+        // Lines only present in the other run of a comparison have no
+        // address, see pf_compare.
+        var profiledDisassembly = this.data.filter(function (line) {
+            return line[1] !== null;
+        });
         var instructionParser;
         if (this.instructionSet == 'aarch64') 
             instructionParser = new InstructionSetParser(
@@ -650,10 +661,14 @@ Profile.prototype = {
             else
                 row.append($('<td></td>'));
 
-            address = line[1].toString(16);
-            id = this.unique_id + address;
-            a = $('<a id="' + id + '" href="#' + id + '"></a>').text(address);
-            row.append($('<td></td>').addClass('address').append(a));
+            if (line[1] !== null) {
+                address = line[1].toString(16);
+                id = this.unique_id + address;
+                a = $('<a id="' + id + '" href="#' + id + '"></a>').text(address);
+                row.append($('<td></td>').addClass('address').append(a));
+            } else {
+                row.append($('<td></td>').addClass('address'));
+            }
             row.append($('<td></td>').text(line[2]));
             this.element.append(row);
         }
@@ -803,75 +818,82 @@ StatsBar.prototype = {
             dataType: "json",
             data: {'runids': this.runids.join(), 'testid': this.testid},
             success: function(data) {
-                this_.data = data;
-                var t = $('<table></table>').addClass('table table-striped table-condensed table-hover');
-                this_.element.html(t);
-
-                var gdata = [];
-                var ticks = [];
-                var i = 0;
-                var n = 0;
-                for (counter in data)
-                    ++n;
-                for (counter in data) {
-                    var barvalue = data[counter][0] - data[counter][1];
-                    var percent = (barvalue / data[counter][0]) * 100;
-                    
-                    var r = $('<tr></tr>');
-                 
-                    r.append($('<th>' + counter + '</th>').addClass('span2'));
-                    r.append($('<td></td>').append(this_._formatValue(data[counter][0]))
-                             .addClass('span4')
-                             .css({'text-align': 'right'}));
-                    r.append($('<td></td>').append(this_._formatValue(data[counter][1]))
-                             .addClass('span2')
-                             .css({'text-align': 'left'}));
-                    r.append($('<td></td>').append(this_._formatPercentage(percent))
-                             .addClass('span1')
-                             .css({'text-align': 'right'}));
-                    t.append(r);
-
-                    var color = 'red';
-                    if (barvalue < 0)
-                        color = 'green';
-
-                    gdata.push({data: [[percent, n - i]], color: color});
-                    ticks.push([i, counter]);
-                    ++i;
-                }
-
-                $('#stats-graph').height(this_.element.height());
-                $.plot('#stats-graph', gdata, {
-                    series: {
-                        bars: {
-                            show: true,
-                            barWidth: 0.6,
-                            align: "center",
-                            horizontal: true
-                        }
-                    },
-                    xaxis: {
-                        tickFormatter: function(f) {
-                            return this_._percentageify(f);
-                        },
-                        autoscaleMargin: 0.05
-                    },
-                    yaxis: {
-                        show: false
-                    },
-                    grid: {
-                        borderWidth: 0
-                    }
-                });
-
-                $('#toolbar').toolBar().triggerResize();
+                this_.set(runids, data);
             },
             error: function(xhr, textStatus, errorThrown) {
                 pf_flash_error('accessing URL ' + g_urls.getTopLevelCounters +
                                '; ' + errorThrown);
             }
         });
+    },
+
+    // Show the top level counters 'data' of the runs 'runids', as returned
+    // by getTopLevelCounters.
+    set: function (runids, data) {
+        var this_ = this;
+        this.runids = runids;
+        this.data = data;
+        var t = $('<table></table>').addClass('table table-striped table-condensed table-hover');
+        this_.element.html(t);
+
+        var gdata = [];
+        var ticks = [];
+        var i = 0;
+        var n = 0;
+        for (counter in data)
+            ++n;
+        for (counter in data) {
+            var barvalue = data[counter][0] - data[counter][1];
+            var percent = (barvalue / data[counter][0]) * 100;
+            
+            var r = $('<tr></tr>');
+         
+            r.append($('<th>' + counter + '</th>').addClass('span2'));
+            r.append($('<td></td>').append(this_._formatValue(data[counter][0]))
+                     .addClass('span4')
+                     .css({'text-align': 'right'}));
+            r.append($('<td></td>').append(this_._formatValue(data[counter][1]))
+                     .addClass('span2')
+                     .css({'text-align': 'left'}));
+            r.append($('<td></td>').append(this_._formatPercentage(percent))
+                     .addClass('span1')
+                     .css({'text-align': 'right'}));
+            t.append(r);
+
+            var color = 'red';
+            if (barvalue < 0)
+                color = 'green';
+
+            gdata.push({data: [[percent, n - i]], color: color});
+            ticks.push([i, counter]);
+            ++i;
+        }
+
+        $('#stats-graph').height(this_.element.height());
+        $.plot('#stats-graph', gdata, {
+            series: {
+                bars: {
+                    show: true,
+                    barWidth: 0.6,
+                    align: "center",
+                    horizontal: true
+                }
+            },
+            xaxis: {
+                tickFormatter: function(f) {
+                    return this_._percentageify(f);
+                },
+                autoscaleMargin: 0.05
+            },
+            yaxis: {
+                show: false
+            },
+            grid: {
+                borderWidth: 0
+            }
+        });
 
+        $('#toolbar').toolBar().triggerResize();
     },
 
     getCounterValue: function(counter) {
@@ -1113,18 +1135,26 @@ FunctionTypeahead.prototype = {
             this.options.updated(name);
     },
     changeSourceRun: function(rid, tid) {
+        // Fetch the functions of the run together with the top level
+        // counters of the selected runs and the code of the hottest
+        // function, see getProfile.
         var this_ = this;
-        $.ajax(g_urls.getFunctions, {
+        var args = {'runids': pf_get_runids().join(), 'runid': rid,
+                    'testid': tid};
+        if (pf_get_counter() != null)
+            args['counter'] = pf_get_counter();
+        $.ajax(g_urls.getProfile, {
             dataType: "json",
-            data: {'runid': rid, 'testid': tid},
+            data: args,
             success: function(data) {
-                this_.data = data;
+                this_.data = data.functions;
+                data.runids = args['runids'];
 
                 if (this_.options.sourceRunUpdated)
                     this_.options.sourceRunUpdated(data);
             },
             error: function(xhr, textStatus, errorThrown) {
-                pf_flash_error('accessing URL ' + g_urls.getFunctions +
+                pf_flash_error('accessing URL ' + g_urls.getProfile +
                                '; ' + errorThrown);
             }
         });
@@ -1247,6 +1277,8 @@ function pf_init(run1, run2, testid, urls) {
                 return pf_get_counter();
             },
             updated: function(fname) {
+                if (pf_compare(fname))
+                    return;
                 var fn_percentage = $('#fn1_box').functionTypeahead().getFunctionPercentage(fname) / 100.0;
                 var ctr_value = $('#stats').statsBar().getCounterValue(pf_get_counter())[0];
                 $('#profile1').profile('go', fname,
@@ -1255,23 +1287,19 @@ function pf_init(run1, run2, testid, urls) {
                                        fn_percentage * ctr_value);
             },
             sourceRunUpdated: function(data) {
-                pf_set_default_counter(data);
-
-                var r1 = $('#run1_box').runTypeahead().getSelectedRunId();
-                var r2 = $('#run2_box').runTypeahead().getSelectedRunId();
-                var ids = [];
-                if (r1)
-                    ids.push(r1);
-                if (r2)
-                    ids.push(r2);
-                
+                pf_set_default_counter(data.functions);
+
                 $('#fn1_box').prop('disabled', false);
-                $('#stats')
-                    .statsBar({testid: testid})
-                    .go(ids);
-                $('#profile1').profile({runid: r1,
+                pf_set_stats(testid, data);
+                $('#profile1').profile({runid: pf_get_runid(1),
                                         testid: testid,
                                         uniqueid: 'l'});
+                if (data.function != null) {
+                    // Show the hottest function right away.
+                    $('#profile1').profile().preload(data.function,
+                                                      data.code);
+                    $('#fn1_box').functionTypeahead().update(data.function);
+                }
             }
         });
 
@@ -1282,6 +1310,8 @@ function pf_init(run1, run2, testid, urls) {
                 return pf_get_counter();
             },
             updated: function(fname) {
+                if (pf_compare(fname))
+                    return;
                 var fn_percentage = $('#fn2_box').functionTypeahead().getFunctionPercentage(fname) / 100.0;
                 var ctr_value = $('#stats').statsBar().getCounterValue(pf_get_counter())[1];
                 $('#profile2').profile('go', fname,
@@ -1290,24 +1320,19 @@ function pf_init(run1, run2, testid, urls) {
                                        fn_percentage * ctr_value);
             },
             sourceRunUpdated: function(data) {
-                pf_set_default_counter(data);
-
-                var r1 = $('#run1_box').runTypeahead().getSelectedRunId();
-                var r2 = $('#run2_box').runTypeahead().getSelectedRunId();
-                var ids = [];
-                if (r1)
-                    ids.push(r1);
-                if (r2)
-                    ids.push(r2);
+                pf_set_default_counter(data.functions);
 
                 $('#fn2_box').prop('disabled', false);
-                $('#stats')
-                    .statsBar({testid: testid})
-                    .go(ids);
-                $('#profile2').profile({runid: r2,
+                pf_set_stats(testid, data);
+                $('#profile2').profile({runid: pf_get_runid(2),
                                         testid: testid,
                                         uniqueid: 'r'});
-
+                if (data.function != null) {
+                    // Show the hottest function right away.
+                    $('#profile2').profile().preload(data.function,
+                                                      data.code);
+                    $('#fn2_box').functionTypeahead().update(data.function);
+                }
             }
         });
     
@@ -1324,6 +1349,7 @@ function pf_init(run1, run2, testid, urls) {
             cleared: function(name, id) {
                 $('#fn1_box').val('').prop('disabled', true);
                 $('#profile1').profile().reset();
+                pf_uncompare(2);
             }
         });
 
@@ -1340,6 +1366,7 @@ function pf_init(run1, run2, testid, urls) {
             cleared: function(name, id) {
                 $('#fn2_box').val('').prop('disabled', true);
                 $('#profile2').profile().reset();
+                pf_uncompare(1);
             }
         });
 
@@ -1472,6 +1499,88 @@ function pf_set_default_counter(data) {
     }
 }
 
+// pf_set_stats - Show the top level counters of a getProfile reply. The
+// replies for the two runs may arrive in any order, the counters of a reply
+// for other than the selected runs are only shown until the reply for the
+// selected runs arrives.
+function pf_set_stats(testid, data) {
+    var stats = $('#stats').statsBar();
+    if (stats && stats.data && data.runids != pf_get_runids().join())
+        return;
+    $('#stats')
+        .statsBar({testid: testid})
+        .set(data.runids.split(','), data.counters);
+}
+
+// pf_compare - When two runs are selected, show function 'fname' of both
+// runs side by side, with the lines aligned by getDiff. Returns false if
+// there are no two runs to compare.
+function pf_compare(fname) {
+    var runids = pf_get_runids();
+    var profile1 = $('#profile1').profile();
+    var profile2 = $('#profile2').profile();
+    if (runids.length != 2 || !profile1 || !profile2 ||
+        profile1.runid != runids[0] || profile2.runid != runids[1])
+        return false;
+    $.ajax(g_urls.getDiff, {
+        dataType: "json",
+        data: {'runids': runids.join(), 'testid': profile1.testid,
+               'top': 0, 'f': fname},
+        success: function(data) {
+            var code = [[], []];
+            $.each(data.code, function(idx, line) {
+                code[0].push([line[4] || {}, line[0], line[2] || '']);
+                code[1].push([line[5] || {}, line[1], line[3] || '']);
+            });
+            for (var side = 1; side <= 2; ++side) {
+                var box = $('#fn' + side + '_box').val(fname);
+                var fn_percentage = box.functionTypeahead()
+                    .getFunctionPercentage(fname) / 100.0;
+                var ctr_value = $('#stats').statsBar()
+                    .getCounterValue(pf_get_counter())[side - 1];
+                $('#profile' + side).profile().preload(fname, code[side - 1]);
+                $('#profile' + side).profile('go', fname,
+                                             pf_get_counter(),
+                                             pf_get_display_type(),
+                                             pf_get_counter_display_type(),
+                                             fn_percentage * ctr_value);
+            }
+        },
+        error: function(xhr, textStatus, errorThrown) {
+            pf_flash_error('accessing URL ' + g_urls.getDiff +
+                           '; ' + errorThrown);
+        }
+    });
+    return true;
+}
+
+// pf_uncompare - Show the function of profile 'side' again without the lines
+// aligned to the other run, once that run is no longer selected.
+function pf_uncompare(side) {
+    var box = $('#fn' + side + '_box');
+    var profile = $('#profile' + side).profile();
+    if (!box.val() || !profile)
+        return;
+    profile.function_name = null;
+    box.functionTypeahead().update(box.val());
+}
+
+// pf_get_runid - The id of the run selected in box 1 or 2, if any.
+function pf_get_runid(box) {
+    return $('#run' + box + '_box').runTypeahead().getSelectedRunId();
+}
+
+// pf_get_runids - The ids of the selected runs.
+function pf_get_runids() {
+    var ids = [];
+    for (var box = 1; box <= 2; ++box) {
+        var id = pf_get_runid(box);
+        if (id)
+            ids.push(id);
+    }
+    return ids;
+}
+
 // pf_get_counter - Poor encapsulation of the g_counter object.
 function pf_get_counter() {
     return g_counter;
@@ -293,6 +293,34 @@ def convert_revision(dotted, cache=None):
     return val
 
 
+# The maximal length of an order sort key, the size of the SortKey column.
+ORDER_SORT_KEY_SIZE = 512
+
+
+def order_sort_key(values, max_size=None):
+    """Turn the field values of an order into a string which sorts like the
+    order itself, so the database can sort and compare orders.
+
+    Every field is converted like convert_revision and every number is
+    written as its digits prefixed by their count, so longer numbers sort
+    later; "000" terminates each field, so a prefix sorts first:
+    ["12.3"] -> "002120013000"
+
+    :param values: the order field values, in the order of the fields.
+    :param max_size: truncate the key to this many characters. Truncated keys
+        still sort like the orders, but orders which only differ after
+        max_size characters get the same key.
+    :return: a string of digits.
+    """
+    parts = []
+    for value in values:
+        for number in convert_revision(value or ''):
+            digits = str(number)
+            parts.append('%03d%s' % (len(digits), digits))
+        parts.append('000')
+    return ''.join(parts)[:max_size]
+
+
 class PrecomputedCR():
     """Make a thing that looks like a comprison result, that is derived
     from a field change."""
@@ -1,3 +1,5 @@
+import StringIO
+import csv
 import datetime
 import json
 import os
@@ -16,6 +18,7 @@ from flask import make_response
 from flask import redirect
 from flask import render_template
 from flask import request, url_for
+from flask import stream_with_context
 from flask_wtf import Form
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
@@ -37,6 +40,7 @@ import lnt.util.stats
 from lnt.external.stats import stats as ext_stats
 from lnt.server.reporting.analysis import ComparisonResult, calc_geomean
 from lnt.server.ui import util
+from lnt.server.ui.caching import cached_view
 from lnt.server.ui.decorators import frontend, db_route, v4_route
 from lnt.server.ui.globals import db_url_for, v4_url_for
 from lnt.server.ui.util import FLASH_DANGER, FLASH_SUCCESS, FLASH_INFO
@@ -104,16 +108,23 @@ def index():
 # Database Actions
 def _do_submit():
     assert request.method == 'POST'
-    input_file = request.files.get('file')
-    input_data = request.form.get('input_data')
-    if 'select_machine' not in request.form and \
-            'update_machine' in request.form:
+    if request.mimetype == 'application/json':
+        # Raw submissions, as sent by 'lnt submit', pass the options in the
+        # query string.
+        values = request.args
+        input_file = None
+        input_data = request.get_data()
+    else:
+        values = request.form
+        input_file = request.files.get('file')
+        input_data = request.form.get('input_data')
+    if 'select_machine' not in values and 'update_machine' in values:
         # Compatibility with old clients
-        update_machine = int(request.form.get('update_machine', 0)) != 0
+        update_machine = int(values.get('update_machine', 0)) != 0
         select_machine = 'update' if update_machine else 'match'
     else:
-        select_machine = request.form.get('select_machine', 'match')
-    merge_run = request.form.get('merge', None)
+        select_machine = values.get('select_machine', 'match')
+    merge_run = values.get('merge', None)
 
     if input_file and not input_file.content_length:
         input_file = None
@@ -214,6 +225,7 @@ def v4_overview():
 
 
 @v4_route("/recent_activity")
+@cached_view
 def v4_recent_activity():
     session = request.session
     ts = request.get_testsuite()
@@ -291,6 +303,7 @@ def v4_machine_compare(machine_id):
 
 
 @v4_route("/machine/<int:id>")
+@cached_view
 def v4_machine(id):
 
     # Compute the list of associated runs, grouped by order.
@@ -476,6 +489,7 @@ Unable to find a run for this ID. Please use the native v4 URL interface
 
 
 @v4_route("/<int:id>")
+@cached_view
 def v4_run(id):
     info = V4RequestInfo(id)
 
@@ -616,14 +630,16 @@ def v4_order(id):
     if order is None:
         abort(404)
 
-    previous_order = None
-    if order.previous_order_id:
-        previous_order = session.query(ts.Order) \
-            .filter(ts.Order.id == order.previous_order_id).one()
-    next_order = None
-    if order.next_order_id:
-        next_order = session.query(ts.Order) \
-            .filter(ts.Order.id == order.next_order_id).one()
+    # Load both neighbours in the total ordering at once.
+    neighbour_ids = [order_id for order_id in (order.previous_order_id,
+                                               order.next_order_id)
+                     if order_id]
+    neighbours = {}
+    if neighbour_ids:
+        neighbours = dict((o.id, o) for o in session.query(ts.Order)
+                          .filter(ts.Order.id.in_(neighbour_ids)))
+    previous_order = neighbours.get(order.previous_order_id)
+    next_order = neighbours.get(order.next_order_id)
 
     runs = session.query(ts.Run) \
         .filter(ts.Run.order_id == id) \
@@ -651,16 +667,51 @@ def v4_set_baseline(id):
     return redirect(get_redirect_target())
 
 
+ALL_ORDERS_PAGE_SIZE = 1000
+
+
 @v4_route("/all_orders")
+@cached_view
 def v4_all_orders():
-    # Get the testsuite.
+    """List the orders, newest first, a page at a time.
+
+    request.args.limit is the page size, request.args.before and
+    request.args.after the order after or before the page and
+    request.args.prefix limits the list to orders with a field value starting
+    with it.
+    """
     session = request.session
     ts = request.get_testsuite()
 
-    # Get the orders and sort them totally.
-    orders = sorted(session.query(ts.Order).all())
-
-    return render_template("v4_all_orders.html", orders=orders, **ts_data(ts))
+    limit = request.args.get('limit', ALL_ORDERS_PAGE_SIZE, type=int)
+    if limit <= 0:
+        limit = -1
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+    prefix = request.args.get('prefix', '')
+    orders, more = ts.get_order_rows(session, limit, before=before,
+                                     after=after, prefix=prefix)
+
+    # Link the newer and older pages next to this one.
+    page_args = {}
+    if limit != ALL_ORDERS_PAGE_SIZE:
+        page_args['limit'] = request.args.get('limit')
+    if prefix:
+        page_args['prefix'] = prefix
+    newest_page_url = newer_page_url = older_page_url = None
+    if after is not None or before is not None:
+        newest_page_url = v4_url_for('.v4_all_orders', **page_args)
+    if orders and (after is not None and more or before is not None):
+        newer_page_url = v4_url_for('.v4_all_orders', after=orders[0][0],
+                                    **page_args)
+    if orders and (after is None and more or after is not None):
+        older_page_url = v4_url_for('.v4_all_orders', before=orders[-1][0],
+                                    **page_args)
+
+    return render_template("v4_all_orders.html", orders=orders, prefix=prefix,
+                           newest_page_url=newest_page_url,
+                           newer_page_url=newer_page_url,
+                           older_page_url=older_page_url, **ts_data(ts))
 
 
 @v4_route("/<int:id>/graph")
@@ -743,6 +794,7 @@ def v4_graph_for_sample(sample_id, field_name):
 
 
 @v4_route("/graph")
+@cached_view
 def v4_graph():
 
     session = request.session
@@ -1282,6 +1334,7 @@ def determine_x_value(point_label, fallback, revision_cache):
 
 
 @v4_route("/global_status")
+@cached_view
 def v4_global_status():
     session = request.session
     ts = request.get_testsuite()
@@ -1425,6 +1478,7 @@ def v4_daily_report_overview():
 
 
 @v4_route("/daily_report/<int:year>/<int:month>/<int:day>")
+@cached_view
 def v4_daily_report(year, month, day):
     num_days_str = request.args.get('num_days')
     if num_days_str is not None:
@@ -1544,14 +1598,12 @@ def v4_summary_report():
 You must define a summary report configuration first.""")
 
     with open(config_path) as f:
-        config = flask.json.load(f)
+        config_data = f.read()
 
-    # Create the report object.
-    report = lnt.server.reporting.summaryreport.SummaryReport(
-        request.get_db(), config['orders'], config['machine_names'],
-        config['machine_patterns'])
-    # Build the report.
-    report.build(session)
+    # Build the report, or reuse the one built for the same configuration
+    # and runs.
+    report = lnt.server.reporting.summaryreport.get_report(
+        session, request.get_db(), config_data)
 
     if bool(request.args.get('json')):
         json_obj = dict()
@@ -1675,6 +1727,7 @@ def baseline():
 
 
 @v4_route("/matrix", methods=['GET', 'POST'])
+@cached_view
 def v4_matrix():
     """A table view for Run sample data, because *some* people really
     like to be able to see results textually.
@@ -1746,79 +1799,74 @@ def v4_matrix():
     # It is nice for the columns to be sorted by name.
     data_parameters.sort(key=lambda x: x.test.name),
 
-    # Now lets get the data.
-    all_orders = set()
-    order_to_id = {}
-    for req in data_parameters:
-        q = session.query(req.field.column, ts.Order.llvm_project_revision,
-                          ts.Order.id) \
-            .join(ts.Run) \
-            .join(ts.Order) \
-            .filter(ts.Run.machine_id == req.machine.id) \
-            .filter(ts.Sample.test == req.test) \
-            .filter(req.field.column.isnot(None)) \
-            .order_by(ts.Order.llvm_project_revision.desc())
-
-        limit = request.args.get('limit', post_limit)
-        if limit or post_limit:
-            limit = int(limit)
-            if limit != -1:
-                q = q.limit(limit)
-
-        req.samples = defaultdict(list)
-
-        for s in q.all():
-            req.samples[s[1]].append(s[0])
-            all_orders.add(s[1])
-            order_to_id[s[1]] = s[2]
-    if not all_orders:
+    limit = int(request.args.get('limit', post_limit))
+    if limit == 0:
+        limit = -1
+
+    download_format = request.args.get('format')
+    if download_format is not None:
+        if download_format not in ('csv', 'json'):
+            abort(400, "Unknown format: {}".format(download_format))
+        stream = stream_with_context(_matrix_download(
+            session, ts, data_parameters, download_format))
+        mimetype = {'csv': 'text/csv', 'json': 'application/json'}
+        response = flask.Response(stream,
+                                  mimetype=mimetype[download_format])
+        response.headers['Content-Disposition'] = \
+            'attachment; filename=matrix.{}'.format(download_format)
+        return response
+
+    # Find the orders of this page, newest first.
+    before = request.args.get('before')
+    page_orders = _matrix_orders(session, ts, data_parameters, before, limit)
+    if limit != -1 and len(page_orders) > limit:
+        next_before = page_orders[limit - 1][1]
+        page_orders = page_orders[:limit]
+    else:
+        next_before = None
+    if not page_orders:
         abort(404, "No data found.")
-    # Now grab the baseline data.
+
+    # The newest order is the baseline if the user has none, on every page.
+    if before is None:
+        backup_baseline = page_orders[0]
+    else:
+        backup_baseline = _matrix_orders(session, ts, data_parameters,
+                                         limit=1)[0]
     user_baseline = baseline()
-    backup_baseline = next(iter(all_orders))
     if user_baseline:
-        all_orders.add(user_baseline.order.llvm_project_revision)
-        baseline_rev = user_baseline.order.llvm_project_revision
+        baseline_order = (user_baseline.order.id,
+                          user_baseline.order.llvm_project_revision)
         baseline_name = user_baseline.name
     else:
-        baseline_rev = backup_baseline
-        baseline_name = backup_baseline
-
-    for req in data_parameters:
-        q_baseline = session.query(req.field.column,
-                                   ts.Order.llvm_project_revision,
-                                   ts.Order.id) \
-                       .join(ts.Run) \
-                       .join(ts.Order) \
-                       .filter(ts.Run.machine_id == req.machine.id) \
-                       .filter(ts.Sample.test == req.test) \
-                       .filter(req.field.column.isnot(None)) \
-                       .filter(ts.Order.llvm_project_revision == baseline_rev)
-        baseline_data = q_baseline.all()
-        if baseline_data:
-            for s in baseline_data:
-                req.samples[s[1]].append(s[0])
-                all_orders.add(s[1])
-                order_to_id[s[1]] = s[2]
-        else:
-            # Well, there is a baseline, but we did not find data for it...
-            # So lets revert back to the first run.
-            msg = "Did not find data for {}. Showing {}."
-            flash(msg.format(user_baseline, backup_baseline), FLASH_DANGER)
-            all_orders.remove(baseline_rev)
-            baseline_rev = backup_baseline
-            baseline_name = backup_baseline
-
-    all_orders = list(all_orders)
-    all_orders.sort(reverse=True)
+        baseline_order = backup_baseline
+        baseline_name = backup_baseline[1]
+
+    # Now lets get the data, for all series with a single query.
+    order_ids = set(o[0] for o in page_orders)
+    order_ids.add(baseline_order[0])
+    order_ids.add(backup_baseline[0])
+    order_to_id, order_to_date = _matrix_load_samples(
+        session, ts, data_parameters, order_ids)
+
+    baseline_rev = baseline_order[1]
+    if user_baseline and \
+            not all(req.samples.get(baseline_rev) for req in data_parameters):
+        # Well, there is a baseline, but we did not find data for it...
+        # So lets revert back to the first run.
+        msg = "Did not find data for {}. Showing {}."
+        flash(msg.format(user_baseline, backup_baseline[1]), FLASH_DANGER)
+        baseline_rev = baseline_name = backup_baseline[1]
+
+    all_orders = [rev for _, rev in page_orders]
     all_orders.insert(0, baseline_rev)
     # Now calculate Changes between each run.
 
     for req in data_parameters:
         req.change = {}
+        prev_samples = req.samples.get(baseline_rev, None)
         for order in all_orders:
             cur_samples = req.samples[order]
-            prev_samples = req.samples.get(baseline_rev, None)
             cr = ComparisonResult(mean,
                                   False, False,
                                   cur_samples,
@@ -1830,15 +1878,9 @@ def v4_matrix():
 
     # Calculate Geomean for each order.
     order_to_geomean = {}
-    curr_geomean = None
+    prev_geomean = _matrix_geomean(data_parameters, baseline_rev)
     for order in all_orders:
-        curr_samples = []
-        prev_samples = []
-        for req in data_parameters:
-            curr_samples.extend(req.samples[order])
-            prev_samples.extend(req.samples[baseline_rev])
-        prev_geomean = calc_geomean(prev_samples)
-        curr_geomean = calc_geomean(curr_samples)
+        curr_geomean = _matrix_geomean(data_parameters, order)
         if prev_geomean:
             cr = ComparisonResult(mean,
                                   False, False,
@@ -1854,13 +1896,18 @@ def v4_matrix():
                 order_to_geomean[order] = PrecomputedCR(curr_geomean,
                                                         curr_geomean,
                                                         False)
-    # Calculate the date of each order.
-    runs = session.query(ts.Run.start_time, ts.Order.llvm_project_revision) \
-                  .join(ts.Order) \
-                  .filter(ts.Order.llvm_project_revision.in_(all_orders)) \
-                  .all()
 
-    order_to_date = dict([(x[1], x[0]) for x in runs])
+    # Links to the other pages and downloads keep the matrix parameters.
+    url_args = dict(request.args.items())
+    url_args['limit'] = str(limit)
+    url_args.pop('before', None)
+    first_page_url = v4_url_for('.v4_matrix', **url_args) \
+        if before is not None else None
+    next_page_url = v4_url_for('.v4_matrix', before=next_before,
+                               **url_args) if next_before else None
+    url_args.pop('limit')
+    download_urls = [(f, v4_url_for('.v4_matrix', format=f, **url_args))
+                     for f in ('csv', 'json')]
 
     class FakeOptions(object):
         show_small_diff = False
@@ -1886,9 +1933,140 @@ def v4_matrix():
                            machine_name_common=machine_name_common,
                            machine_id_common=machine_id_common,
                            order_to_date=order_to_date,
+                           first_page_url=first_page_url,
+                           next_page_url=next_page_url,
+                           download_urls=download_urls,
                            **ts_data(ts))
 
 
+# Number of orders loaded at once when downloading the matrix.
+MATRIX_DOWNLOAD_CHUNK_SIZE = 500
+
+
+def _matrix_series_filter(ts, data_parameters):
+    """Select the samples of the requested machine and test pairs."""
+    pairs = sorted(set((req.machine.id, req.test.id)
+                       for req in data_parameters))
+    return sqlalchemy.or_(*[sqlalchemy.and_(ts.Run.machine_id == machine_id,
+                                            ts.Sample.test_id == test_id)
+                            for machine_id, test_id in pairs])
+
+
+def _matrix_orders(session, ts, data_parameters, before=None, limit=-1):
+    """Return the (id, revision) of the orders with data for the requested
+    series, by descending revision, starting after the revision before.
+    Returns up to limit + 1 orders, so callers can tell if there are more.
+    """
+    fields = set(req.field for req in data_parameters)
+    q = session.query(ts.Order.id, ts.Order.llvm_project_revision) \
+        .select_from(ts.Sample) \
+        .join(ts.Run) \
+        .join(ts.Order) \
+        .filter(_matrix_series_filter(ts, data_parameters)) \
+        .filter(sqlalchemy.or_(*[f.column.isnot(None) for f in fields])) \
+        .distinct() \
+        .order_by(ts.Order.llvm_project_revision.desc())
+    if before is not None:
+        q = q.filter(ts.Order.llvm_project_revision < before)
+    if limit != -1:
+        q = q.limit(limit + 1)
+    return q.all()
+
+
+def _matrix_load_samples(session, ts, data_parameters, order_ids):
+    """Load the samples of all requested series at the given orders into
+    req.samples, keyed by revision. Returns the order ids and dates by
+    revision."""
+    fields = []
+    for req in data_parameters:
+        if req.field not in fields:
+            fields.append(req.field)
+        req.samples = defaultdict(list)
+    series = defaultdict(list)
+    for req in data_parameters:
+        series[(req.machine.id, req.test.id)].append(
+            (req, fields.index(req.field)))
+
+    q = session.query(ts.Run.machine_id, ts.Sample.test_id, ts.Order.id,
+                      ts.Order.llvm_project_revision, ts.Run.start_time,
+                      *[f.column for f in fields]) \
+        .select_from(ts.Sample) \
+        .join(ts.Run) \
+        .join(ts.Order) \
+        .filter(_matrix_series_filter(ts, data_parameters)) \
+        .filter(ts.Order.id.in_(order_ids))
+
+    order_to_id = {}
+    order_to_date = {}
+    for row in q:
+        machine_id, test_id, order_id, rev, start_time = row[:5]
+        for req, index in series[(machine_id, test_id)]:
+            value = row[5 + index]
+            if value is not None:
+                req.samples[rev].append(value)
+        order_to_id[rev] = order_id
+        if rev not in order_to_date or order_to_date[rev] < start_time:
+            order_to_date[rev] = start_time
+    return order_to_id, order_to_date
+
+
+def _matrix_geomean(data_parameters, order):
+    samples = []
+    for req in data_parameters:
+        samples.extend(req.samples.get(order, ()))
+    return calc_geomean(samples)
+
+
+def _matrix_download(session, ts, data_parameters, download_format):
+    """Generate the matrix as CSV or JSON, chunk by chunk of orders."""
+    header = ['Order', 'Date']
+    header.extend('{}/{}/{}'.format(req.machine.name, req.test.name,
+                                    req.field.name)
+                  for req in data_parameters)
+    header.append('Geomean')
+
+    def format_row(row):
+        if download_format == 'csv':
+            out = StringIO.StringIO()
+            csv.writer(out).writerow([
+                x.encode('utf-8') if isinstance(x, unicode) else
+                ('' if x is None else x) for x in row])
+            return out.getvalue()
+        return json.dumps(row)
+
+    if download_format == 'csv':
+        yield format_row(header)
+    else:
+        yield '{"columns": %s, "rows": [' % json.dumps(header)
+
+    before = None
+    separator = '\n'
+    while True:
+        orders = _matrix_orders(session, ts, data_parameters, before,
+                                MATRIX_DOWNLOAD_CHUNK_SIZE)
+        chunk = orders[:MATRIX_DOWNLOAD_CHUNK_SIZE]
+        if not chunk:
+            break
+        _, order_to_date = _matrix_load_samples(
+            session, ts, data_parameters, [o[0] for o in chunk])
+        for _, rev in chunk:
+            row = [rev, order_to_date[rev].isoformat()]
+            row.extend(mean(req.samples[rev]) if req.samples[rev] else None
+                       for req in data_parameters)
+            row.append(_matrix_geomean(data_parameters, rev))
+            if download_format == 'csv':
+                yield format_row(row)
+            else:
+                yield separator + format_row(row)
+                separator = ',\n'
+        if len(orders) <= MATRIX_DOWNLOAD_CHUNK_SIZE:
+            break
+        before = chunk[-1][1]
+
+    if download_format == 'json':
+        yield '\n]}\n'
+
+
 @frontend.route("/explode")
 def explode():
     """This route is going to exception. Used for testing 500 page."""
@@ -6,6 +6,7 @@ objects for the runs they wish to submit, and using Report.render to
 convert them to JSON data suitable for submitting to the server.
 """
 
+import collections
 import datetime
 import re
 from lnt.util import logger
@@ -572,65 +573,83 @@ def upgrade_1_to_2(data, ts_name):
         result_run[newname] = value
     result['run'] = result_run
 
-    # Merge tests
-    result_tests = list()
-    result_tests_dict = dict()
-    Tests = data['Tests']
-    for test in Tests:
-        test_Name = test['Name']
+    result['tests'] = _merge_tests_1_to_2(data['Tests'], ts_name, upgrade)
+    return result
+
 
-        # Old testnames always started with 'tag.', split that part.
+def _split_test_name_1(test_Name, ts_name, upgrade):
+    """Split a version 1 test name like 'nts.foo.exec' into the test name
+    and the version 2 metric name."""
+    # Old testnames always started with 'tag.', split that part.
+    tag_dot = '%s.' % ts_name
+    if not test_Name.startswith(tag_dot):
+        raise ValueError("Tests/%s: test name does not start with '%s'" %
+                         (test_Name, tag_dot))
+    name_metric = test_Name[len(tag_dot):]
+
+    # Look for the longest known '.metric' suffix.
+    pos = name_metric.find('.')
+    while pos != -1:
+        metric = upgrade.metric_rename.get(name_metric[pos:])
+        if metric is not None:
+            return name_metric[:pos], metric
+        pos = name_metric.find('.', pos + 1)
+
+    # Fallback logic for unknown metrics: Assume they are '.xxxx'
+    name, dot, metric = name_metric.rpartition('.')
+    if dot != '.':
+        raise ValueError("Tests/%s: name does not end in .metric" %
+                         test_Name)
+    logger.warning("Found unknown metric '%s'" % metric)
+    upgrade.metric_rename['.'+metric] = metric
+    return name, metric
+
+
+def _merge_tests_1_to_2(tests, ts_name, upgrade):
+    """Merge the version 1 test records, one per test and metric, into a
+    list of version 2 records with one entry per metric.
+
+    Each source record is released once it has been merged, so a large
+    report is never held in memory twice."""
+    # Group the record indices by test, keeping the order of first
+    # appearance.
+    groups = collections.OrderedDict()
+    for index, test in enumerate(tests):
+        test_Name = test['Name']
         if len(test['Info']) != 0:
             # The Info record didn't work with the v4 database anyway...
             raise ValueError("Tests/%s: cannot convert non-empty Info record" %
                              test_Name)
-        tag_dot = '%s.' % ts_name
-        if not test_Name.startswith(tag_dot):
-            raise ValueError("Tests/%s: test name does not start with '%s'" %
-                             (test_Name, tag_dot))
-        name_metric = test_Name[len(tag_dot):]
-
-        found_metric = False
-        for oldname, newname in upgrade.metric_rename.items():
-            assert(oldname.startswith('.'))
-            if name_metric.endswith(oldname):
-                name = name_metric[:-len(oldname)]
-                metric = newname
-                found_metric = True
-                break
-        if not found_metric:
-            # Fallback logic for unknown metrics: Assume they are '.xxxx'
-            name, dot, metric = name_metric.rpartition('.')
-            if dot != '.':
-                raise ValueError("Tests/%s: name does not end in .metric" %
-                                 test_Name)
-            logger.warning("Found unknown metric '%s'" % metric)
-            upgrade.metric_rename['.'+metric] = metric
-
-        result_test = result_tests_dict.get(name)
-        if result_test is None:
-            result_test = {'name': name}
-            result_tests_dict[name] = result_test
-            result_tests.append(result_test)
-
-        data = test['Data']
-        if metric not in result_test:
-            # Do not construct a list for the very common case of just a
-            # single datum.
-            if len(data) == 1:
-                data = data[0]
-            result_test[metric] = data
-        elif len(data) > 0:
-            # Transform the test data into a list
-            if not isinstance(result_test[metric], list):
-                result_test[metric] = [result_test[metric]]
-            result_test[metric] += data
-
-    result['tests'] = result_tests
+        name, _ = _split_test_name_1(test_Name, ts_name, upgrade)
+        groups.setdefault(name, []).append(index)
+
+    result = []
+    for name, entries in groups.items():
+        result_test = {'name': name}
+        for index in entries:
+            # Unknown metrics have been added to the rename table in the
+            # first pass, so this does not warn again.
+            _, metric = _split_test_name_1(tests[index]['Name'], ts_name,
+                                           upgrade)
+            data = tests[index]['Data']
+            tests[index] = None
+            if metric not in result_test:
+                # Do not construct a list for the very common case of
+                # just a single datum.
+                if len(data) == 1:
+                    data = data[0]
+                result_test[metric] = data
+            elif len(data) > 0:
+                # Transform the test data into a list
+                if not isinstance(result_test[metric], list):
+                    result_test[metric] = [result_test[metric]]
+                result_test[metric] += data
+        result.append(result_test)
     return result
 
 
 def upgrade_and_normalize_report(data, ts_name):
+    """Upgrade the report data to the current format version."""
     # Get the report version. V2 has it at the top level, older version
     # in Run.Info.
     format_version = _get_format_version(data)
@@ -0,0 +1,122 @@
+"""
+Differences between two profiles.
+
+Functions are matched by name. The instructions of a function are matched by
+address when both profiles have the same addresses for it, and by their text
+otherwise (when the code moved, or changed). The counters of functions are
+percentages of the whole profile, so their deltas are differences of
+percentages.
+
+The profiles can be Profile objects, or any objects offering the same
+getTopLevelCounters, getFunctions and getCodeForFunction methods.
+"""
+import difflib
+
+DEFAULT_TOP = 50
+
+
+def _deltas(counters1, counters2):
+    return dict((k, counters2.get(k, 0) - counters1.get(k, 0))
+                for k in set(counters1) | set(counters2))
+
+
+def _change(deltas, counter):
+    if counter is not None:
+        return abs(deltas.get(counter, 0))
+    return max([abs(d) for d in deltas.values()] or [0])
+
+
+def diff_profiles(p1, p2, counter=None, top=DEFAULT_TOP):
+    """Return the differences between the profiles p1 and p2, as a dict:
+
+    * 'counters': {name: [value1, value2, delta]} for the top level counters,
+      with None for a counter missing in one of the profiles.
+    * 'num_functions': the number of functions in either profile.
+    * 'functions': the `top` functions which changed most, by the absolute
+      delta of `counter`, or by their largest absolute delta if counter is
+      None. Every function is a dict with its 'name', the 'counters' and
+      'length' in both profiles (None if it is missing in one) and the
+      counter 'deltas'.
+    """
+    tlc1 = p1.getTopLevelCounters()
+    tlc2 = p2.getTopLevelCounters()
+    counters = {}
+    for k in set(tlc1) | set(tlc2):
+        v1 = tlc1.get(k)
+        v2 = tlc2.get(k)
+        delta = v2 - v1 if v1 is not None and v2 is not None else None
+        counters[k] = [v1, v2, delta]
+
+    functions1 = p1.getFunctions()
+    functions2 = p2.getFunctions()
+    names = set(functions1) | set(functions2)
+    changes = []
+    for name in names:
+        f1 = functions1.get(name)
+        f2 = functions2.get(name)
+        deltas = _deltas(f1['counters'] if f1 else {},
+                         f2['counters'] if f2 else {})
+        changes.append((-_change(deltas, counter), name, f1, f2, deltas))
+    changes.sort(key=lambda c: c[:2])
+
+    functions = []
+    for _, name, f1, f2, deltas in changes[:top]:
+        functions.append({
+            'name': name,
+            'counters': [f1['counters'] if f1 else None,
+                         f2['counters'] if f2 else None],
+            'length': [f1['length'] if f1 else None,
+                       f2['length'] if f2 else None],
+            'deltas': deltas,
+        })
+    return {'counters': counters,
+            'num_functions': len(names),
+            'functions': functions}
+
+
+def _align_by_text(code1, code2):
+    texts1 = [text for _, _, text in code1]
+    texts2 = [text for _, _, text in code2]
+    matcher = difflib.SequenceMatcher(None, texts1, texts2, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                yield code1[i], code2[j]
+        else:
+            for i in range(i1, i2):
+                yield code1[i], None
+            for j in range(j1, j2):
+                yield None, code2[j]
+
+
+def _align_by_address(code1, code2):
+    by_address2 = dict((line[1], line) for line in code2)
+    for line in code1:
+        yield line, by_address2[line[1]]
+
+
+def diff_function(p1, p2, fname):
+    """Return the instructions of function fname in the profiles p1 and p2,
+    aligned. Every instruction is a list [address1, address2, text1, text2,
+    counters1, counters2, deltas]; the fields of the profile missing the
+    instruction are None."""
+    functions1 = p1.getFunctions()
+    functions2 = p2.getFunctions()
+    code1 = list(p1.getCodeForFunction(fname)) if fname in functions1 else []
+    code2 = list(p2.getCodeForFunction(fname)) if fname in functions2 else []
+
+    addresses1 = [address for _, address, _ in code1]
+    addresses2 = [address for _, address, _ in code2]
+    if addresses1 and sorted(addresses1) == sorted(addresses2) and \
+            len(set(addresses1)) == len(addresses1):
+        pairs = _align_by_address(code1, code2)
+    else:
+        pairs = _align_by_text(code1, code2)
+
+    rows = []
+    for line1, line2 in pairs:
+        counters1, address1, text1 = line1 or (None, None, None)
+        counters2, address2, text2 = line2 or (None, None, None)
+        rows.append([address1, address2, text1, text2, counters1, counters2,
+                     _deltas(counters1 or {}, counters2 or {})])
+    return rows
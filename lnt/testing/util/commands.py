@@ -77,6 +77,36 @@ def capture(args, include_stderr=False):
     return capture_with_result(args, include_stderr)[0]
 
 
+def capture_all(commands):
+    """capture_all(commands) - Run the given commands concurrently and return
+    the list of their standard outputs, in order. Each command is a tuple of
+    the arguments to capture().
+
+    Meant for independent probes of the host or a compiler, which spend most
+    of their time starting up."""
+    import threading
+
+    outputs = [None] * len(commands)
+    errors = []
+
+    def run(i, args):
+        try:
+            outputs[i] = capture(*args)
+        except BaseException as e:
+            # Includes the SystemExit raised by fatal().
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i, args))
+               for i, args in enumerate(commands)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return outputs
+
+
 def which(command, paths=None):
     """which(command, [paths]) - Look up the given command in the paths string
     (or the PATH environment variable, if unspecified)."""
@@ -2,7 +2,8 @@ import hashlib
 import os
 import re
 
-from lnt.testing.util.commands import logger, capture, fatal
+from lnt.testing.util.commands import logger, capture, capture_all, fatal
+from lnt.testing.util.fingerprint import cached, file_key
 
 
 def ishexhash(string):
@@ -21,33 +22,62 @@ def get_cc_info(path, cc_flags=[]):
     """get_cc_info(path) -> { ... }
 
     Extract various information on the given compiler and return a dictionary
-    of the results."""
+    of the results.
 
-    cc = path
+    The results are cached on disk until the compiler (or its cc1 binary) is
+    modified, see lnt.testing.util.fingerprint."""
+
+    def compute():
+        info, cc1_binary = _get_cc_info(path, cc_flags)
+        cc1_key = None
+        if cc1_binary is not None:
+            cc1_key = file_key(cc1_binary)
+        return {'info': info, 'cc1': cc1_binary, 'cc1_key': cc1_key}
+
+    def is_valid(entry):
+        return entry['cc1'] is None or file_key(entry['cc1']) == \
+            entry['cc1_key']
+
+    key = file_key(path)
+    if key is not None:
+        key = [key, list(cc_flags)]
+    return cached('cc_info', key, compute, is_valid)['info']
 
-    # Interrogate the compiler.
-    cc_version = capture([cc, '-v', '-E'] + cc_flags +
-                         ['-x', 'c', '/dev/null', '-###'],
-                         include_stderr=True).strip()
 
-    # Determine the assembler version, as found by the compiler.
-    cc_as_version = capture([cc, "-c", '-Wa,-v', '-o', '/dev/null'] +
-                            cc_flags + ['-x', 'assembler', '/dev/null'],
-                            include_stderr=True).strip()
+def _get_cc_info(path, cc_flags):
+    """Probe the compiler at path, return the information dictionary and the
+    path of its cc1 binary, if found."""
+
+    cc = path
+
+    # Interrogate the compiler. The probes are independent, run them
+    # concurrently.
+    probes = [
+        # The version and the cc1 command line.
+        ([cc, '-v', '-E'] + cc_flags + ['-x', 'c', '/dev/null', '-###'],
+         True),
+        # The assembler version, as found by the compiler.
+        ([cc, "-c", '-Wa,-v', '-o', '/dev/null'] + cc_flags +
+         ['-x', 'assembler', '/dev/null'], True),
+        # The linker version, as found by the compiler.
+        ([cc, "-Wl,-v", "-dynamiclib"], True),
+        # The default target .ll (or assembly, for non-LLVM compilers).
+        ([cc, '-S', '-flto', '-o', '-'] + cc_flags + ['-x', 'c', '/dev/null'],
+         True),
+        # The compiler's response to -dumpmachine as the target.
+        ([cc, '-dumpmachine'], False),
+    ]
+    (cc_version, cc_as_version, cc_ld_version, cc_target_assembly,
+     cc_dumpmachine) = capture_all(probes)
+    cc_version = cc_version.strip()
+    cc_as_version = cc_as_version.strip()
+    cc_ld_version = cc_ld_version.strip()
+    cc_target_assembly = cc_target_assembly.strip()
 
     if "clang: error: unsupported argument '-v'" in cc_as_version:
         cc_as_version = "Clang built in."
 
-    # Determine the linker version, as found by the compiler.
-    cc_ld_version = capture(([cc, "-Wl,-v", "-dynamiclib"]),
-                            include_stderr=True).strip()
-    # Extract the default target .ll (or assembly, for non-LLVM compilers).
-    cc_target_assembly = capture([cc, '-S', '-flto', '-o', '-'] + cc_flags +
-                                 ['-x', 'c', '/dev/null'],
-                                 include_stderr=True).strip()
-
-    # Extract the compiler's response to -dumpmachine as the target.
-    cc_target = cc_dumpmachine = capture([cc, '-dumpmachine']).strip()
+    cc_target = cc_dumpmachine = cc_dumpmachine.strip()
 
     # Default the target to the response from dumpmachine.
     cc_target = cc_dumpmachine
@@ -237,7 +267,7 @@ def get_cc_info(path, cc_flags=[]):
     # Infer the run order from the other things we have computed.
     info['inferred_run_order'] = get_inferred_run_order(info)
 
-    return info
+    return info, cc1_binary
 
 
 def get_inferred_run_order(info):
@@ -0,0 +1,118 @@
+"""
+Persistent on-disk cache for compiler and machine fingerprints.
+
+Probing the compiler under test and the host machine spawns a good number of
+processes for every 'lnt runtest', although the results only change when the
+compiler binary is replaced or the machine reboots. The probes are therefore
+cached in small JSON files, keyed by the path, modification time and size of
+the compiler binary, or by the boot ID of the machine.
+
+The cache lives in $LNT_CACHE_DIR, or in lnt/fingerprints under
+$XDG_CACHE_HOME (~/.cache by default). Setting LNT_CACHE_DIR to the empty
+string disables it.
+"""
+import errno
+import hashlib
+import json
+import os
+import tempfile
+
+from lnt.testing.util.commands import capture, which
+from lnt.util import logger
+
+# Bump this when the format of the cached probes changes.
+CACHE_VERSION = 1
+
+
+def get_cache_dir():
+    """Return the directory of the fingerprint cache, or None if caching is
+    disabled."""
+    path = os.environ.get('LNT_CACHE_DIR')
+    if path is None:
+        base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        path = os.path.join(base, 'lnt', 'fingerprints')
+    return path or None
+
+
+def file_key(path):
+    """Return a cache key for the file at path, which changes whenever the
+    file is replaced or modified, or None if it does not exist."""
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [path, st.st_mtime, st.st_size]
+
+
+def boot_id():
+    """Return an identifier of the current boot of the machine, or None if it
+    cannot be determined."""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except IOError:
+        pass
+    if which('sysctl') is None:
+        return None
+    for name in ('kern.bootsessionuuid', 'kern.boottime'):
+        value = capture(['sysctl', '-n', name]).strip()
+        if value:
+            return value
+    return None
+
+
+def _to_str(value):
+    # json gives us unicode strings, while the probes produce str ones.
+    if isinstance(value, unicode):
+        return str(value)
+    if isinstance(value, list):
+        return [_to_str(v) for v in value]
+    if isinstance(value, dict):
+        return dict((_to_str(k), _to_str(v)) for k, v in value.items())
+    return value
+
+
+def cached(kind, key, compute, is_valid=None):
+    """cached(kind, key, compute, [is_valid]) -> value
+
+    Return compute(), cached on disk under the name kind and key, which has
+    to be JSON serializable. A key of None, or any key when caching is
+    disabled, computes the value without caching it. Cached values for which
+    is_valid(value) returns false are recomputed. Unreadable or unwritable
+    cache files are ignored.
+    """
+    cache_dir = get_cache_dir()
+    if key is None or cache_dir is None:
+        return compute()
+
+    key = json.loads(json.dumps([CACHE_VERSION, kind, key]))
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True)).hexdigest()
+    path = os.path.join(cache_dir, '%s-%s.json' % (kind, digest))
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        value = _to_str(entry['value'])
+        if entry.get('key') == key and (is_valid is None or is_valid(value)):
+            logger.info('using cached %s from %s' % (kind, path))
+            return value
+    except (IOError, ValueError, KeyError):
+        pass
+
+    value = compute()
+    try:
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # Write to a temporary file first, concurrent runs may race for the
+        # same entry.
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=kind)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'key': key, 'value': value}, f, sort_keys=True)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        logger.warning('unable to cache %s in %r: %s' % (kind, cache_dir, e))
+    return value
@@ -5,7 +5,8 @@ results.
 
 import re
 
-from lnt.testing.util.commands import capture, fatal
+from lnt.testing.util.commands import capture, capture_all, fatal
+from lnt.testing.util.fingerprint import boot_id, cached
 
 # All the things we care to probe about the system, and whether to track with
 # the machine or run. This is a list of (sysctl, kind) where kind is one of:
@@ -157,6 +158,19 @@ def _get_mac_addresses():
             current_ifc, = re.match(r'([A-Za-z0-9]*): .*', ln).groups()
 
 
+def _probe_sysctls(names):
+    outputs = capture_all([(['sysctl', '-n', name], True) for name in names])
+    return dict(zip(names, (output.strip() for output in outputs)))
+
+
+def _get_boot_information(sysctl_names):
+    """Probe everything which does not change until the machine reboots."""
+    return {
+        'sysctl': _probe_sysctls(sysctl_names),
+        'mac_addrs': list(_get_mac_addresses()),
+    }
+
+
 def get_machine_information(use_machine_dependent_info=False):
     machine_info = {}
     run_info = {}
@@ -166,11 +180,25 @@ def get_machine_information(use_machine_dependent_info=False):
         'machine': machine_info,
         'run': run_info,
     }
+    # Only the run keys need to be probed again after the first run since
+    # boot.
+    boot_names = [name for name, kind in sysctl_info_table if kind != 'run']
+
+    def is_valid(boot_info):
+        return all(name in boot_info['sysctl'] for name in boot_names)
+
+    boot = boot_id()
+    boot_info = cached('machine_info', boot and [boot, boot_names],
+                       lambda: _get_boot_information(boot_names), is_valid)
+    run_values = _probe_sysctls([name for name, kind in sysctl_info_table
+                                 if kind == 'run'])
     for name, target in sysctl_info_table:
-        info_targets[target][name] = capture(['sysctl', '-n', name],
-                                             include_stderr=True).strip()
+        if target == 'run':
+            info_targets[target][name] = run_values[name]
+        else:
+            info_targets[target][name] = boot_info['sysctl'][name]
 
-    for ifc, addr in _get_mac_addresses():
+    for ifc, addr in boot_info['mac_addrs']:
         # Ignore virtual machine mac addresses.
         if ifc.startswith('vmnet'):
             continue
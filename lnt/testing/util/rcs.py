@@ -4,6 +4,38 @@ from lnt.util import logger
 from lnt.testing.util import commands
 
 _git_svn_id_re = re.compile("^    git-svn-id: [^@]*@([0-9]+) .*$")
+_git_hash_re = re.compile("^[0-9a-f]{40}$")
+
+
+def _read_git_head(path):
+    """Return the hash of the HEAD commit of the git checkout at path, read
+    directly from the repository to avoid starting git, or None if it cannot
+    be determined that way."""
+    git_dir = os.path.join(path, ".git")
+    # Worktrees and submodules use a .git file, leave them to git.
+    if not os.path.isdir(git_dir):
+        return None
+    try:
+        with open(os.path.join(git_dir, "HEAD")) as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head if _git_hash_re.match(head) else None
+
+        ref = head[len("ref: "):]
+        ref_path = os.path.join(git_dir, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path) as f:
+                commit = f.read().strip()
+            return commit if _git_hash_re.match(commit) else None
+        with open(os.path.join(git_dir, "packed-refs")) as f:
+            for ln in f:
+                fields = ln.split()
+                if len(fields) == 2 and fields[1] == ref and \
+                        _git_hash_re.match(fields[0]):
+                    return fields[0]
+    except IOError:
+        pass
+    return None
 
 
 def get_source_version(path):
@@ -29,6 +61,9 @@ def get_source_version(path):
             return
         return m.group(1)
     elif os.path.exists(os.path.join(path, ".git")):
+        commit = _read_git_head(path)
+        if commit is not None:
+            return commit
         return commands.capture(['/bin/sh', '-c',
                                  ('cd "%s" && '
                                   'git log -1 --pretty=format:%%H') % path]
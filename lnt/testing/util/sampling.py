@@ -0,0 +1,116 @@
+"""
+Adaptive sampling: collect samples until the confidence interval is tight.
+
+Instead of a fixed number of repetitions, the test runners keep collecting
+samples of a test until the width of the confidence interval of its median,
+relative to the median, drops below a target, or until a time or sample
+budget runs out. Stable tests stop after a few samples while noisy tests get
+enough samples for the server to tell a change from noise.
+"""
+from __future__ import division
+import math
+
+from lnt.util import stats
+
+# Reasons for stopping to sample.
+CONVERGED = 'converged'
+TIME_BUDGET = 'time_budget'
+MAX_SAMPLES = 'max_samples'
+
+# The server ignores changes smaller than 1% (see MIN_PERCENTAGE_CHANGE in
+# lnt.server.reporting.analysis), so there is no point in a tighter interval.
+DEFAULT_TARGET = 0.01
+
+# Scale factor making the median absolute deviation a consistent estimator of
+# the standard deviation for normally distributed samples.
+MAD_TO_STDDEV = 1.4826
+
+
+class AdaptiveSampler(object):
+    """Decides when enough samples of a test have been collected.
+
+    target: the maximal width of the confidence interval relative to the
+        median.
+    min_samples, max_samples: bounds on the number of samples.
+    time_budget: seconds after which to stop sampling, or None.
+    confidence_interval: the z-value of the interval, 2.576 (99%) is the
+        value ComparisonResult uses for its significance check.
+    """
+
+    def __init__(self, target=DEFAULT_TARGET, min_samples=3,
+                 max_samples=100, time_budget=None,
+                 confidence_interval=2.576):
+        if min_samples < 2:
+            raise ValueError("adaptive sampling needs at least two samples")
+        if max_samples < min_samples:
+            raise ValueError("maximal number of samples is smaller than the "
+                             "minimal one")
+        self.target = target
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.time_budget = time_budget
+        self.confidence_interval = confidence_interval
+
+    def relative_ci_width(self, samples):
+        """Return the width of the confidence interval of the median of
+        samples, relative to the median.
+
+        The spread is estimated from the median absolute deviation, which
+        unlike the standard deviation is not thrown off by a few outliers.
+        """
+        if len(samples) < 2:
+            return float('inf')
+        med = stats.median(samples)
+        sigma = MAD_TO_STDDEV * stats.median_absolute_deviation(samples, med)
+        width = 2 * self.confidence_interval * sigma / math.sqrt(len(samples))
+        if med == 0:
+            return 0.0 if width == 0 else float('inf')
+        return width / abs(med)
+
+    def stop_reason(self, sample_lists, elapsed):
+        """Return why sampling should stop, or None if more samples should be
+        collected.
+
+        sample_lists: the samples collected so far, one list per test (or
+        metric) which has to converge.
+        elapsed: seconds spent sampling so far.
+        """
+        sample_lists = [s for s in sample_lists if s]
+        if not sample_lists:
+            return None
+        num_samples = min(len(s) for s in sample_lists)
+        if num_samples < self.min_samples:
+            return None
+        if all(self.relative_ci_width(s) <= self.target
+               for s in sample_lists):
+            return CONVERGED
+        if num_samples >= self.max_samples:
+            return MAX_SAMPLES
+        if self.time_budget is not None and elapsed >= self.time_budget:
+            return TIME_BUDGET
+        return None
+
+
+def exec_time_samples(reports):
+    """Return the execution time samples of each test in the reports of the
+    iterations run so far, to pass to AdaptiveSampler.stop_reason()."""
+    samples = {}
+    for report in reports:
+        for test in report.tests:
+            if test.name.endswith('.exec'):
+                samples.setdefault(test.name, []).extend(test.data)
+    return samples.values()
+
+
+def from_options(opts, min_samples):
+    """Create an AdaptiveSampler from the command line options added by
+    lnt.lnttool.common.sampling_options, or return None if adaptive sampling
+    is disabled. min_samples is the number of samples the runner would take
+    without adaptive sampling."""
+    if opts.adaptive_sampling is None:
+        return None
+    min_samples = max(2, min_samples or 0)
+    return AdaptiveSampler(target=opts.adaptive_sampling,
+                           min_samples=min_samples,
+                           max_samples=max(min_samples, opts.max_multisample),
+                           time_budget=opts.sampling_time_budget)
@@ -3,6 +3,7 @@ from __future__ import print_function
 import errno
 import hashlib
 import json
+import multiprocessing
 import os
 import platform
 import pprint
@@ -11,6 +12,8 @@ import shlex
 import shutil
 import subprocess
 import sys
+import threading
+import time
 import logging
 from datetime import datetime
 import collections
@@ -22,10 +25,11 @@ import lnt.testing.util.compilers
 from lnt.testing.util import commands, machineinfo
 from lnt.testing.util.commands import fatal, resolve_command_path
 from lnt.testing.util.misc import timestamp
+from lnt.testing.util import sampling
 from lnt.tests import builtintest
 from lnt.util import stats
 from lnt.util import logger
-from lnt.lnttool.common import submit_options
+from lnt.lnttool.common import submit_options, sampling_options
 
 
 # For each test, compile with all these combinations of flags.
@@ -40,6 +44,10 @@ DEFAULT_FLAGS_TO_TEST = [('-O0',),
 
 opts = None
 
+# Per thread state of the test scheduler, holds the CPU the thread's tests are
+# pinned to.
+_scheduler_state = threading.local()
+
 
 def args_to_quoted_string(args):
     def quote_arg(arg):
@@ -63,6 +71,9 @@ def runN(args, N, cwd, preprocess_cmd=None, env=None, sample_mem=False,
     cmd = [opts.runn, '-a']
     if sample_mem:
         cmd = ['sudo'] + cmd + ['-m']
+    cpu = getattr(_scheduler_state, 'cpu', None)
+    if cpu is not None:
+        cmd = [opts.taskset, '-c', str(cpu)] + cmd
     if preprocess_cmd is not None:
         cmd.extend(('-p', preprocess_cmd))
     if stdout is not None:
@@ -115,11 +126,13 @@ def get_output_path(*names):
 def get_runN_test_data(name, variables, cmd, ignore_stderr=False,
                        sample_mem=False, only_mem=False,
                        stdout=None, stderr=None, preprocess_cmd=None,
-                       env=None):
+                       env=None, sampler=None):
     if only_mem and not sample_mem:
         raise Exception("only_mem doesn't make sense without sample_mem")
 
-    data = runN(cmd, variables.get('run_count'), cwd='/tmp',
+    start_time = time.time()
+    run_count = variables.get('run_count')
+    data = runN(cmd, run_count, cwd='/tmp',
                 ignore_stderr=ignore_stderr, sample_mem=sample_mem,
                 stdout=stdout, stderr=stderr, preprocess_cmd=preprocess_cmd,
                 env=env)
@@ -127,6 +140,24 @@ def get_runN_test_data(name, variables, cmd, ignore_stderr=False,
         if data.get('version') != 0:
             raise ValueError('unknown runN data format')
         data_samples = data.get('samples')
+
+        # Take more samples until the wall time is stable enough.
+        while sampler is not None:
+            reason = sampler.stop_reason([[s[3] for s in data_samples]],
+                                         time.time() - start_time)
+            if reason is not None:
+                g_log.info('%s: stopped sampling after %d samples (%s)' %
+                           (name, len(data_samples), reason))
+                g_sampling_stop_reasons[name] = reason
+                break
+            count = min(run_count, sampler.max_samples - len(data_samples))
+            more_data = runN(cmd, count, cwd='/tmp',
+                             ignore_stderr=ignore_stderr, env=env,
+                             preprocess_cmd=preprocess_cmd)
+            if more_data is None:
+                g_sampling_stop_reasons[name] = 'failed'
+                break
+            data_samples = data_samples + more_data.get('samples')
     else:
         # Print stdout/stderr log if available
         if stdout is not None and os.path.exists(stdout):
@@ -197,8 +228,11 @@ def test_cc_command(base_name, run_info, variables, input, output, flags,
             yield res
 
     commands.rm_f(output)
+    num_samples = variables.get('run_count')
     for res in get_runN_test_data(name, variables, cmd + ['-o', output],
-                                  ignore_stderr=ignore_stderr):
+                                  ignore_stderr=ignore_stderr,
+                                  sampler=g_sampler):
+        num_samples = len(res[2]) or num_samples
         yield res
 
     # If the command has output, track its size.
@@ -215,7 +249,7 @@ def test_cc_command(base_name, run_info, variables, input, output, flags,
             # reported for other variables. So we just report the size N times.
             #
             # FIXME: We should resolve this, eventually.
-            for i in range(variables.get('run_count')):
+            for i in range(num_samples):
                 samples.append(stat.st_size)
         except OSError as e:
             if e.errno != errno.ENOENT:
@@ -583,7 +617,12 @@ def test_build(base_name, run_info, variables, project, build_config, num_jobs,
 
 
 def curry(fn, **kw_args):
-    return lambda *args: fn(*args, **kw_args)
+    def curried(*args):
+        return fn(*args, **kw_args)
+    # Keep the arguments around for the test scheduler.
+    curried.fn = fn
+    curried.kw_args = kw_args
+    return curried
 
 
 def get_single_file_tests(flags_to_test, test_suite_externals,
@@ -671,8 +710,100 @@ def get_tests(test_suite_externals, test_suite_externals_subdir, flags_to_test,
         yield item
 
 
+def get_test_phases(tests):
+    """Split the tests into phases which run one after another.
+
+    Each phase is a list of jobs, a job being a list of indices into tests.
+    The tests of a job run serially, the jobs of a phase may run concurrently.
+    Only single-file tests run concurrently: tests writing the same output
+    file share a job, and the PCH generation for a set of flags runs in a
+    phase before the compiles using it. Full builds get a phase of their own,
+    they are parallel by themselves."""
+    phases = []
+    phase_key = None
+    for index, (_, test_fn) in enumerate(tests):
+        if getattr(test_fn, 'fn', None) is not test_compile:
+            phases.append(collections.OrderedDict([(index, [index])]))
+            phase_key = None
+            continue
+
+        kw_args = test_fn.kw_args
+        key = (tuple(kw_args['flags']), kw_args['stage'] == PCH_GEN)
+        if key != phase_key:
+            phases.append(collections.OrderedDict())
+            phase_key = key
+        phases[-1].setdefault(kw_args['output'], []).append(index)
+    return [list(jobs.values()) for jobs in phases]
+
+
+def get_test_cpus(quiet_cores):
+    """Return the CPUs to pin tests to, keeping the first quiet_cores CPUs
+    free for the system."""
+    return list(range(quiet_cores, multiprocessing.cpu_count()))
+
+
+def run_tests(tests, run_info, variables, threads=1, cpus=None):
+    """Run the tests and return the list of (success, name, samples) results
+    of each, in the order of tests.
+
+    With more than one thread independent single-file tests run
+    concurrently, each thread pinned to one of the given cpus (if any)."""
+    results = [None] * len(tests)
+
+    def run_job(job):
+        for index in job:
+            basename, test_fn = tests[index]
+            results[index] = list(test_fn(basename, run_info, variables))
+
+    if cpus:
+        threads = min(threads, len(cpus))
+    for jobs in get_test_phases(tests):
+        if threads <= 1 or len(jobs) == 1:
+            for job in jobs:
+                run_job(job)
+            continue
+
+        pending = list(reversed(jobs))
+        free_cpus = list(cpus or [])
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            with lock:
+                _scheduler_state.cpu = free_cpus.pop() if free_cpus else None
+            try:
+                while not errors:
+                    with lock:
+                        if not pending:
+                            return
+                        job = pending.pop()
+                    run_job(job)
+            except BaseException as e:
+                # Includes the SystemExit raised by fatal().
+                errors.append(e)
+            finally:
+                with lock:
+                    if _scheduler_state.cpu is not None:
+                        free_cpus.append(_scheduler_state.cpu)
+                    _scheduler_state.cpu = None
+
+        workers = [threading.Thread(target=worker)
+                   for _ in range(min(threads, len(jobs)))]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if errors:
+            raise errors[0]
+    return results
+
+
 g_output_dir = None
 g_log = None
+# The AdaptiveSampler for single-file tests, if adaptive sampling is enabled,
+# and the reasons it stopped sampling each test.
+g_sampler = None
+g_sampling_stop_reasons = {}
 usage_info = """
 Script for testing compile time performance.
 
@@ -938,9 +1069,31 @@ class CompileTest(builtintest.BuiltinTest):
         g_log.info('using CC: %r' % opts.cc)
         g_log.info('using CXX: %r' % opts.cxx)
         no_errors = True
-        for basename, test_fn in tests_to_run:
-            for success, name, samples in test_fn(basename, run_info,
-                                                  variables):
+
+        cpus = None
+        if opts.threads > 1:
+            cpus = get_test_cpus(opts.quiet_cores)
+            if not cpus:
+                self._fatal("no cores left to run tests on, reduce "
+                            "--quiet-cores")
+            opts.taskset = commands.which('taskset')
+            if opts.taskset is None:
+                g_log.warning('taskset not found, not pinning tests to cores')
+                cpus = None
+            else:
+                g_log.info('pinning single-file tests to cores %s' %
+                           ', '.join(str(cpu) for cpu in cpus))
+
+        global g_sampler
+        g_sampler = sampling.from_options(opts, opts.run_count)
+        g_sampling_stop_reasons.clear()
+
+        # Collect the samples in the order of the tests, independent of the
+        # order they finished in.
+        results = run_tests(tests_to_run, run_info, variables, opts.threads,
+                            cpus)
+        for test_results in results:
+            for success, name, samples in test_results:
                 g_log.info('collected samples: %r' % name)
                 num_samples = len(samples)
                 if num_samples:
@@ -960,6 +1113,12 @@ class CompileTest(builtintest.BuiltinTest):
                     testsamples.append(lnt.testing.TestSamples(
                         test_name, samples))
         run_info['no_errors'] = no_errors
+        if g_sampler is not None:
+            # The v1 report format does not allow test info records, so
+            # record why sampling stopped for each test with the run.
+            run_info['sampling_stop_reasons'] = json.dumps(
+                dict(('%s.%s' % (tag, name), reason) for name, reason in
+                     g_sampling_stop_reasons.items()), sort_keys=True)
         end_time = datetime.utcnow()
 
         g_log.info('run complete')
@@ -1039,6 +1198,13 @@ class CompileTest(builtintest.BuiltinTest):
 @click.option("--min-sample-time", "min_sample_time",
               help="Ensure all tests run for at least N seconds",
               metavar="N", type=float, default=.5)
+@click.option("-j", "--threads", "threads",
+              help="Number of single-file tests to run concurrently",
+              type=int, default=1, metavar="N")
+@click.option("--quiet-cores", "quiet_cores",
+              help=("Number of cores (starting at core 0) kept free of tests "
+                    "when running with multiple threads"),
+              type=int, default=1, metavar="N")
 @click.option("--save-temps", "save_temps",
               help="Save temporary build output files", is_flag=True)
 @click.option("--show-tests", "show_tests",
@@ -1075,6 +1241,7 @@ class CompileTest(builtintest.BuiltinTest):
                     "(or local instance)"),
               type=click.UNPROCESSED, default=None)
 @submit_options
+@sampling_options
 @click.option("--output", "output", metavar="PATH",
               help="write raw report data to PATH (or stdout if '-')")
 @click.option("-v", "--verbose", "verbose",
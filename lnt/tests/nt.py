@@ -9,9 +9,9 @@ import shutil
 import subprocess
 import sys
 import glob
+import multiprocessing.pool
 import time
 import traceback
-import urllib2
 import shlex
 import pipes
 import resource
@@ -29,11 +29,12 @@ from lnt.testing.util.commands import resolve_command_path
 from lnt.testing.util.rcs import get_source_version
 
 from lnt.testing.util.misc import timestamp
+from lnt.testing.util import sampling
 
 from lnt.server.reporting.analysis import UNCHANGED_PASS, UNCHANGED_FAIL
 from lnt.server.reporting.analysis import REGRESSED, IMPROVED
 from lnt.util import logger
-from lnt.lnttool.common import submit_options
+from lnt.lnttool.common import submit_options, sampling_options
 from . import builtintest
 
 
@@ -1187,40 +1188,46 @@ def _construct_report_path(basedir, only_test, test_style, file_type="csv"):
     return report_path
 
 
-def rerun_test(config, name, num_times):
-    """Take the test at name, and rerun it num_times with the previous settings
-    stored in config.
+def rerun_tests(config, names, num_times, merge_samples):
+    """Take the tests with the given names, and rerun them num_times with the
+    previous settings stored in config.
 
+    The tests are rerun in rounds. Each round reruns all tests at once, see
+    _execute_tests_again, and passes the fresh samples to
+    merge_samples(samples, last_round) as soon as the round finished.
     """
     # Extend the old log file.
     logfile = open(config.test_log_path(None), 'a')
 
-    # Grab the real test name instead of the LNT benchmark URL.
-    real_name = TEST_TO_NAME["nts." + name]
+    # Group the tests by the directory of their Makefile.
+    tests_by_path = {}
+    for name in names:
+        # Grab the real test name instead of the LNT benchmark URL.
+        real_name = TEST_TO_NAME["nts." + name]
 
-    relative_test_path = os.path.dirname(real_name)
-    test_name = os.path.basename(real_name)
+        relative_test_path = os.path.dirname(real_name)
+        test_full_path = os.path.join(
+            config.report_dir, relative_test_path)
 
-    test_full_path = os.path.join(
-        config.report_dir, relative_test_path)
+        assert os.path.exists(test_full_path), \
+            "Previous test directory not there?" + test_full_path
+        tests_by_path.setdefault(relative_test_path, []).append(
+            os.path.basename(real_name))
 
-    assert os.path.exists(test_full_path), \
-        "Previous test directory not there?" + test_full_path
-
-    results = []
     no_errors = True
-    for _ in xrange(0, num_times):
-        test_results, t_no_errors = _execute_test_again(
-            config, test_name, test_full_path, relative_test_path, logfile)
+    for i in xrange(0, num_times):
+        logger.info("Rerun round {}/{}".format(i + 1, num_times))
+        results, t_no_errors = _execute_tests_again(config, tests_by_path,
+                                                    logfile)
         no_errors &= t_no_errors
-        results.extend(test_results)
 
-    # Check we got an exec and status from each run.
-    assert len(results) >= num_times, \
-        "Did not get all the runs?" + str(results)
+        # Check we got an exec and status from each run.
+        assert len(results) >= len(names), \
+            "Did not get all the runs?" + str(results)
+        merge_samples(results, i + 1 == num_times)
 
     logfile.close()
-    return results, no_errors
+    return no_errors
 
 
 def _prepare_testsuite_for_rerun(test_name, test_full_path, config):
@@ -1242,65 +1249,90 @@ def _prepare_testsuite_for_rerun(test_name, test_full_path, config):
         os.remove(path)
 
 
-def _execute_test_again(config, test_name, test_path, test_relative_path,
-                        logfile):
-    """(Re)Execute the benchmark of interest. """
+def _execute_tests_again(config, tests_by_path, logfile):
+    """(Re)Execute the benchmarks of interest.
 
-    _prepare_testsuite_for_rerun(test_name, test_path, config)
+    tests_by_path maps the relative path of a test directory to the names of
+    the tests to rerun in it. All tests of a directory are remade by a single
+    make invocation, and the directories are remade in parallel, sharing the
+    --threads jobs between them.
+    """
+    for test_relative_path, test_names in tests_by_path.items():
+        test_full_path = os.path.join(config.report_dir, test_relative_path)
+        for test_name in test_names:
+            _prepare_testsuite_for_rerun(test_name, test_full_path, config)
 
     # Grab old make invocation.
     mk_vars, _ = config.compute_run_make_variables()
-    to_exec = ['make', '-k']
-    to_exec.extend('%s=%s' % (k, v) for k, v in mk_vars.items())
+    jobs = max(1, config.threads // len(tests_by_path))
 
-    # We need to run the benchmark's makefile, not the global one.
-    if config.only_test is not None:
-        to_exec.extend(['-C', config.only_test])
-    else:
-        if test_relative_path:
+    def remake(test_relative_path):
+        to_exec = ['make', '-k', '-j', str(jobs)]
+        to_exec.extend('%s=%s' % (k, v) for k, v in mk_vars.items())
+
+        # We need to run the benchmark's makefile, not the global one.
+        if config.only_test is not None:
+            to_exec.extend(['-C', config.only_test])
+        elif test_relative_path:
             to_exec.extend(['-C', test_relative_path])
-            config.rerun_test = test_relative_path
-    # The target for the specific benchmark.
-    # Make target.
-    benchmark_report_target = "Output/" + test_name + \
-        "." + config.test_style + ".report.txt"
-    # Actual file system location of the target.
-    benchmark_report_path = os.path.join(config.build_dir(None),
-                                         test_path,
-                                         benchmark_report_target)
-    to_exec.append(benchmark_report_target)
-
-    returncode = execute_command(logfile,
-                                 config.build_dir(None), to_exec,
-                                 config.report_dir)
-    assert returncode == 0, "Remake command failed."
-    assert os.path.exists(benchmark_report_path), "Missing " \
-        "generated report: " + benchmark_report_path
+        # The targets for the specific benchmarks.
+        to_exec.extend("Output/" + test_name + "." + config.test_style +
+                       ".report.txt"
+                       for test_name in tests_by_path[test_relative_path])
+
+        return execute_command(logfile, config.build_dir(None), to_exec,
+                               config.report_dir)
+
+    paths = sorted(tests_by_path)
+    pool = multiprocessing.pool.ThreadPool(max(1, min(config.threads,
+                                                      len(paths))))
+    try:
+        returncodes = pool.map(remake, paths)
+    finally:
+        pool.close()
+        pool.join()
+    assert all(rc == 0 for rc in returncodes), "Remake command failed."
 
     # Now we need to pull out the results into the CSV format LNT can read.
     schema = os.path.join(config.test_suite_root,
                           "TEST." + config.test_style + ".report")
-    result_path = os.path.join(config.build_dir(None),
-                               test_path, "Output",
-                               test_name + "." + config.test_style +
-                               ".report.csv")
-
-    gen_report_template = "{gen} -csv {schema} < {input} > {output}"
-    gen_cmd = gen_report_template.format(gen=config.generate_report_script,
-                                         schema=schema,
-                                         input=benchmark_report_path,
-                                         output=result_path)
-    bash_gen_cmd = ["/bin/bash", "-c", gen_cmd]
-
-    assert not os.path.exists(result_path), "Results should not exist yet." + \
-        result_path
-    returncode = execute_command(logfile, config.build_dir(None), bash_gen_cmd,
-                                 config.report_dir)
-    assert returncode == 0, "command failed"
-    assert os.path.exists(result_path), "Missing results file."
-
-    results, no_errors = load_nt_report_file(result_path, config)
-    assert len(results) > 0
+    results = []
+    no_errors = True
+    for test_relative_path in paths:
+        test_path = os.path.join(config.report_dir, test_relative_path)
+        if config.only_test is None and test_relative_path:
+            config.rerun_test = test_relative_path
+        for test_name in tests_by_path[test_relative_path]:
+            # Actual file system location of the target.
+            benchmark_report_path = os.path.join(
+                config.build_dir(None), test_path, "Output",
+                test_name + "." + config.test_style + ".report.txt")
+            assert os.path.exists(benchmark_report_path), "Missing " \
+                "generated report: " + benchmark_report_path
+
+            result_path = os.path.join(config.build_dir(None),
+                                       test_path, "Output",
+                                       test_name + "." + config.test_style +
+                                       ".report.csv")
+
+            gen_report_template = "{gen} -csv {schema} < {input} > {output}"
+            gen_cmd = gen_report_template.format(
+                gen=config.generate_report_script, schema=schema,
+                input=benchmark_report_path, output=result_path)
+            bash_gen_cmd = ["/bin/bash", "-c", gen_cmd]
+
+            assert not os.path.exists(result_path), \
+                "Results should not exist yet." + result_path
+            returncode = execute_command(logfile, config.build_dir(None),
+                                         bash_gen_cmd, config.report_dir)
+            assert returncode == 0, "command failed"
+            assert os.path.exists(result_path), "Missing results file."
+
+            test_results, t_no_errors = load_nt_report_file(result_path,
+                                                            config)
+            assert len(test_results) > 0
+            results.extend(test_results)
+            no_errors &= t_no_errors
     return results, no_errors
 
 
@@ -1388,9 +1420,13 @@ class PastRunData(object):
                                repr(self.execution_time))
 
 
-def _process_reruns(config, server_reply, local_results):
+def _process_reruns(config, server_reply, local_results, submit=None):
     """Rerun each benchmark which the server reported "changed", N more
     times.
+
+    The fresh samples of each round of reruns are merged into local_results
+    as they arrive, and submit(), if given, is called for every round but the
+    last so the server sees them before all reruns finished.
     """
     try:
         server_results = server_reply['test_results'][0]['results']
@@ -1483,21 +1519,30 @@ def _process_reruns(config, server_reply, local_results):
                                     collated_results.values()))
     rerunable_benches.sort(key=lambda x: x.name)
     # Now lets do the reruns.
-    rerun_results = []
     summary = "Rerunning {} of {} benchmarks."
     logger.info(summary.format(len(rerunable_benches),
                                len(collated_results)))
+    if not rerunable_benches:
+        return
 
     for i, bench in enumerate(rerunable_benches):
         logger.info("Rerunning: {} [{}/{}]".format(bench.name,
                                                    i + 1,
                                                    len(rerunable_benches)))
 
-        fresh_samples, t_no_errors = rerun_test(config,
-                                                bench.name, NUMBER_OF_RERUNS)
-        rerun_results.extend(fresh_samples)
+    def merge_samples(fresh_samples, last_round):
+        local_results.update_report(fresh_samples)
 
-    return rerun_results
+        # persist report with new samples.
+        lnt_report_path = config.report_path(None)
+        with open(lnt_report_path, 'w') as lnt_report_file:
+            print(local_results.render(), file=lnt_report_file)
+
+        if submit is not None and not last_round:
+            submit()
+
+    rerun_tests(config, [bench.name for bench in rerunable_benches],
+                NUMBER_OF_RERUNS, merge_samples)
 
 
 usage_info = """
@@ -1703,16 +1748,31 @@ class NTTest(builtintest.BuiltinTest):
 
         # Multisample, if requested.
         merge_run = None
-        if opts.multisample is not None:
+        sampler = sampling.from_options(opts, opts.multisample)
+        if opts.multisample is not None or sampler is not None:
             # Collect the sample reports.
             reports = []
+            start_time = time.time()
 
-            for i in range(opts.multisample):
+            num_iterations = opts.multisample
+            if sampler is not None:
+                num_iterations = sampler.max_samples
+            for i in range(num_iterations):
                 print("%s: (multisample) running iteration %d" %\
                         (timestamp(), i), file=sys.stderr)
                 report = run_test(opts.label, i, config)
                 reports.append(report)
 
+                if sampler is not None:
+                    reason = sampler.stop_reason(
+                        sampling.exec_time_samples(reports),
+                        time.time() - start_time)
+                    if reason is not None:
+                        print("%s: (multisample) stopped sampling after %d "
+                              "iterations (%s)" % (timestamp(), i + 1, reason),
+                              file=sys.stderr)
+                        break
+
             # Create the merged report.
             #
             # FIXME: Do a more robust job of merging the reports?
@@ -1721,6 +1781,9 @@ class NTTest(builtintest.BuiltinTest):
             machine = reports[0].machine
             run = reports[0].run
             run.end_time = reports[-1].run.end_time
+            if sampler is not None:
+                run.info['sampling_stop_reason'] = (reason or
+                                                    sampling.MAX_SAMPLES)
             test_samples = sum([r.tests
                                 for r in reports], [])
 
@@ -1736,16 +1799,11 @@ class NTTest(builtintest.BuiltinTest):
             if opts.rerun:
                 self.log("Performing any needed reruns.")
                 server_report = self.submit_helper(config)
-                new_samples = _process_reruns(config, server_report,
-                                              test_results)
-                test_results.update_report(new_samples)
-
-                # persist report with new samples.
-                lnt_report_path = config.report_path(None)
-
-                lnt_report_file = open(lnt_report_path, 'w')
-                print(test_results.render(), file=lnt_report_file)
-                lnt_report_file.close()
+                submit = None
+                if config.submit_url:
+                    def submit():
+                        self.submit_helper(config, 'replace')
+                _process_reruns(config, server_report, test_results, submit)
                 merge_run = 'replace'
 
             if config.output is not None:
@@ -1772,12 +1830,9 @@ class NTTest(builtintest.BuiltinTest):
             from lnt.util import ServerUtil
             for server in config.submit_url:
                 self.log("submitting result to %r" % (server,))
-                try:
-                    result = ServerUtil.submitFile(server, report_path, False,
-                                                   merge_run=merge_run)
-                except (urllib2.HTTPError, urllib2.URLError) as e:
-                    logger.warning("submitting to {} failed with {}"
-                                   .format(server, e))
+                # Failed submissions are reported by submitFile.
+                result = ServerUtil.submitFile(server, report_path, False,
+                                               merge_run=merge_run)
         else:
             # Simulate a submission to retrieve the results report.
             # Construct a temporary database and import the result.
@@ -2042,6 +2097,7 @@ def _tools_check():
               multiple=True, type=click.Choice(KNOWN_SAMPLE_KEYS),
               default=['hash'])
 @submit_options
+@sampling_options
 def cli_action(*args, **kwargs):
     _tools_check()
     nt = NTTest()
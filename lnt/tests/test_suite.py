@@ -13,21 +13,28 @@ import glob
 import re
 import multiprocessing
 import getpass
+import threading
+import Queue
+import signal
+import time
 
 import datetime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import jinja2
 import click
 
-from lnt.lnttool.common import submit_options
+from lnt.lnttool.common import submit_options, sampling_options
 from lnt.util import logger
+import lnt.util.ServerUtil as ServerUtil
 import lnt.testing
 import lnt.testing.profile
 import lnt.testing.util.compilers
 from lnt.testing.util.misc import timestamp
+from lnt.testing.util import sampling
 from lnt.testing.util.commands import fatal
 from lnt.testing.util.commands import mkdir_p
 from lnt.testing.util.commands import resolve_command_path, isexecfile
+from lnt.testing.util.commands import which
 
 from lnt.tests.builtintest import BuiltinTest
 
@@ -94,28 +101,167 @@ Program;CC;CC_Time;CC_Hash;Exec;Exec_Time;Score
 """
 
 
-def _importProfile(name_filename):
+# Seconds after which importing a single profile is abandoned.
+PROFILE_IMPORT_TIMEOUT = 300
+
+
+class _ProfileImportTimeout(Exception):
+    pass
+
+
+def _raise_profile_import_timeout(signum, frame):
+    raise _ProfileImportTimeout()
+
+
+def _importProfile(name_filename_timeout):
     """_importProfile imports a single profile. It must be at the top level
     (and not within TestSuiteTest) so that multiprocessing can import it
     correctly."""
-    name, filename = name_filename
+    name, filename, timeout = name_filename_timeout
 
     if not os.path.exists(filename):
         logger.warning('Profile %s does not exist' % filename)
         return None
 
-    pf = lnt.testing.profile.profile.Profile.fromFile(filename)
-    if not pf:
+    # The import runs in the main thread of a pool worker, so an alarm can
+    # interrupt it.
+    use_alarm = timeout and hasattr(signal, 'SIGALRM')
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_profile_import_timeout)
+        signal.alarm(timeout)
+    try:
+        pf = lnt.testing.profile.profile.Profile.fromFile(filename)
+        if not pf:
+            return None
+
+        pf.upgrade()
+        profilefile = pf.render()
+    except _ProfileImportTimeout:
+        logger.warning('Importing profile %s took more than %s seconds, '
+                       'skipping it' % (filename, timeout))
         return None
-
-    pf.upgrade()
-    profilefile = pf.render()
+    finally:
+        if use_alarm:
+            signal.alarm(0)
     return lnt.testing.TestSamples(name + '.profile',
                                    [profilefile],
                                    {},
                                    str)
 
 
+class _ProfileImporter(object):
+    """Imports profiles in a pool of worker processes, starting as soon as
+    they are added, while the tests are still running."""
+
+    def __init__(self, timeout=PROFILE_IMPORT_TIMEOUT):
+        self.timeout = timeout
+        self._pool = None
+        self._results = OrderedDict()
+
+    def __len__(self):
+        return len(self._results)
+
+    def add(self, name, filename):
+        if name in self._results:
+            return
+        if self._pool is None:
+            # Log this before any worker can report a problem.
+            logger.info('Importing profiles with %d processes...' %
+                        multiprocessing.cpu_count())
+            self._pool = multiprocessing.Pool()
+        self._results[name] = self._pool.apply_async(
+            _importProfile, ((name, filename, self.timeout),))
+
+    def samples(self):
+        """Wait for the imports to finish and return the samples of the
+        imported profiles."""
+        if self._pool is None:
+            return []
+        self._pool.close()
+        samples = []
+        for name, result in self._results.items():
+            # The workers enforce the timeout, this only guards against
+            # workers which cannot be interrupted.
+            try:
+                sample = result.get(self.timeout + 60)
+            except multiprocessing.TimeoutError:
+                logger.warning('Profile of %s had not completed importing, '
+                               'skipping it' % name)
+                continue
+            if sample is not None:
+                samples.append(sample)
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+        return samples
+
+
+def _parse_lit_metric_value(value):
+    # lit prints metric values in JSON, but with a limited precision.
+    try:
+        value = json.loads(value)
+    except ValueError:
+        return value
+    if isinstance(value, unicode):
+        return str(value)
+    return value
+
+
+class _LitOutputParser(object):
+    """Follows the output of 'lit -v' to learn about the results of the tests
+    as soon as they complete.
+
+    lit prints a status line for each completed test, followed by the output
+    of failing tests and a block with the metrics of the test, if any. Metric
+    values are printed with a limited precision, so the JSON output of lit
+    remains the authoritative result.
+    """
+    _status_re = re.compile(r'^([A-Z]+): (.*) \(\d+ of \d+\)$')
+    _output_re = re.compile(r"^\*{20} TEST '.*' FAILED \*{20}$")
+    _metrics_re = re.compile(r"^\*{10} TEST '(.*)' RESULTS \*{10}$")
+
+    def __init__(self, on_metrics=None):
+        self.tests = OrderedDict()
+        self.on_metrics = on_metrics
+        # The (path, cmake_vars) to write partial reports for, see
+        # TestSuiteTest._run_lit.
+        self.partial_report = None
+        self.last_partial_report = None
+        self._in_output = False
+        self._metrics_test = None
+
+    def feed(self, line):
+        line = line.rstrip('\r\n')
+        if self._in_output:
+            self._in_output = line != '*' * 20
+            return
+        if self._metrics_test is not None:
+            if line == '*' * 10:
+                test = self._metrics_test
+                self._metrics_test = None
+                if self.on_metrics is not None:
+                    self.on_metrics(test)
+                return
+            key, sep, value = line.partition(': ')
+            if sep:
+                test = self._metrics_test
+                test['metrics'][key] = _parse_lit_metric_value(value.strip())
+            return
+
+        m = self._status_re.match(line)
+        if m:
+            code, name = m.groups()
+            self.tests[name] = {'name': name, 'code': code}
+            return
+        if self._output_re.match(line):
+            self._in_output = True
+            return
+        m = self._metrics_re.match(line)
+        if m and m.group(1) in self.tests:
+            self._metrics_test = self.tests[m.group(1)]
+            self._metrics_test['metrics'] = {}
+
+
 def _lit_json_to_template(json_reports, template_engine):
     # For now, only show first runs report.
     json_report = json_reports[0]
@@ -182,6 +328,9 @@ class TestSuiteTest(BuiltinTest):
         self.compiled = False
         self.trained = False
         self.remote_run = False
+        # The profiles of the current lit run, see _lit.
+        self._profiles = None
+        self._cc_info = {}
 
     def run_test(self, opts):
 
@@ -328,9 +477,16 @@ class TestSuiteTest(BuiltinTest):
         # Now do the actual run.
         reports = []
         json_reports = []
-        for i in range(max(opts.exec_multisample, opts.compile_multisample)):
+        start_time = time.time()
+        # With adaptive sampling the number of execution samples is the
+        # minimum, iterations continue until the execution times converge.
+        sampler = sampling.from_options(opts, opts.exec_multisample)
+        num_iterations = max(opts.exec_multisample, opts.compile_multisample)
+        if sampler is not None:
+            num_iterations = max(num_iterations, sampler.max_samples)
+        for i in range(num_iterations):
             c = i < opts.compile_multisample
-            e = i < opts.exec_multisample
+            e = i < opts.exec_multisample or sampler is not None
             # only gather perf profiles on a single run.
             p = i == 0 and opts.use_perf in ('profile', 'all')
             run_report, json_data = self.run(cmake_vars, compile=c, test=e,
@@ -338,7 +494,19 @@ class TestSuiteTest(BuiltinTest):
             reports.append(run_report)
             json_reports.append(json_data)
 
+            if sampler is not None and i + 1 >= opts.compile_multisample:
+                reason = sampler.stop_reason(
+                    sampling.exec_time_samples(reports),
+                    time.time() - start_time)
+                if reason is not None:
+                    logger.info("Stopped sampling after %d iterations (%s)" %
+                                (i + 1, reason))
+                    break
+
         report = self._create_merged_report(reports)
+        if sampler is not None:
+            report.run.info['sampling_stop_reason'] = (reason or
+                                                       sampling.MAX_SAMPLES)
 
         # Write the report out so it can be read by the submission tool.
         report_path = os.path.join(self._base_path, 'report.json')
@@ -386,12 +554,20 @@ class TestSuiteTest(BuiltinTest):
 
         if self.compiled and compile:
             self._clean(self._base_path)
-        if not self.compiled or compile or self.opts.pgo:
+        build = not self.compiled or compile or self.opts.pgo
+        if build and self._can_pipeline(test, profile):
+            data, stats = self._build_and_lit(self._base_path, test, profile,
+                                              cmake_vars)
+            self.compiled = True
+            report = self._parse_lit_output(self._base_path, data, cmake_vars)
+            report.run.info.update(stats)
+            return report, data
+        if build:
             self._make(self._base_path)
             self._install_benchmark(self._base_path)
             self.compiled = True
 
-        data = self._lit(self._base_path, test, profile)
+        data = self._lit(self._base_path, test, profile, cmake_vars)
         return self._parse_lit_output(self._base_path, data, cmake_vars), data
 
     def _create_merged_report(self, reports):
@@ -582,12 +758,212 @@ class TestSuiteTest(BuiltinTest):
             # experimental compiler.
             pass
 
+    def _can_pipeline(self, test, profile):
+        """Can the benchmarks be run while others are still being built?"""
+        if not self.opts.pipeline or not test:
+            return False
+        if self.remote_run:
+            logger.warning('Not pipelining the build and the tests of a '
+                           'remote run')
+            return False
+        if multiprocessing.cpu_count() <= self._lit_threads(profile):
+            logger.warning('Not pipelining the build and the tests, there '
+                           'are no cores left for building')
+            return False
+        return True
+
+    def _split_cores(self, test_threads):
+        """Split the cores between building and testing, so that the build
+        never disturbs the measurements. Returns the number of build jobs and
+        the command prefixes pinning the build and the tests to their
+        cores."""
+        ncpus = multiprocessing.cpu_count()
+        build_threads = self._build_threads()
+        if build_threads + test_threads > ncpus:
+            build_threads = ncpus - test_threads
+            logger.warning('Reducing the number of build threads to %d to '
+                           'keep them off the %d testing cores' %
+                           (build_threads, test_threads))
+
+        taskset = which('taskset')
+        if taskset is None:
+            logger.warning('taskset not found, not pinning the build and the '
+                           'tests to separate cores')
+            return build_threads, [], []
+        test_cpus = range(ncpus - test_threads, ncpus)
+        build_cpus = range(ncpus - test_threads)
+        return (build_threads,
+                [taskset, '-c', ','.join(str(c) for c in build_cpus)],
+                [taskset, '-c', ','.join(str(c) for c in test_cpus)])
+
+    def _find_lit_tests(self, path):
+        """Return the lit tests below path by the name of their target."""
+        tests = defaultdict(list)
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = [d for d in dirnames if d != 'CMakeFiles']
+            for filename in sorted(filenames):
+                if filename.endswith('.test'):
+                    tests[filename[:-5]].append(
+                        os.path.join(dirpath, filename))
+        return tests
+
+    def _build_and_lit(self, path, test, profile, cmake_vars):
+        """Build the benchmarks and run each of them as soon as it is built.
+
+        make builds everything as in _make, and each 'Built target' line it
+        prints makes the tests of that target ready. lit runs the ready tests
+        in batches, on cores not used by the build. Returns the combined JSON
+        output of lit and the timing of the build and the tests."""
+        subdir = path
+        target = 'all'
+        if self.opts.only_test:
+            components = [path] + [self.opts.only_test[0]]
+            if self.opts.only_test[1]:
+                target = self.opts.only_test[1]
+            subdir = os.path.join(*components)
+
+        test_threads = self._lit_threads(profile)
+        build_threads, build_prefix, test_prefix = \
+            self._split_cores(test_threads)
+        pending = self._find_lit_tests(subdir)
+        ready = Queue.Queue()
+        parser = self._lit_output_parser(path, cmake_vars)
+        results = []
+        test_intervals = []
+        errors = []
+
+        def run_tests():
+            done = False
+            while not done:
+                batch = [ready.get()]
+                while not ready.empty():
+                    batch.append(ready.get())
+                if None in batch:
+                    done = True
+                    batch.remove(None)
+                if not batch:
+                    continue
+                start = time.time()
+                data = self._run_lit(path, batch, test, profile, parser,
+                                     test_threads, test_prefix)
+                test_intervals.append((start, time.time()))
+                results.append(data)
+
+        def tester():
+            try:
+                run_tests()
+            except BaseException as e:
+                # Includes the SystemExit raised by fatal().
+                errors.append(e)
+
+        tester_thread = threading.Thread(target=tester)
+        tester_thread.start()
+
+        logger.info('Building and testing...')
+        args = [self.opts.make, '-k', '-j', str(build_threads), target]
+        if not self.opts.succinct:
+            args = args[:-1] + ["VERBOSE=1", target]
+        args = build_prefix + args
+        logger.info('Execute: %s' % ' '.join(args))
+        logger.info('          (In %s)' % subdir)
+        build_start = time.time()
+        queued = set()
+        p = subprocess.Popen(args, stdout=subprocess.PIPE, cwd=subdir)
+        for line in iter(p.stdout.readline, ''):
+            sys.stdout.write(line)
+            m = re.search(r'Built target (\S+)', line)
+            if m:
+                for test_path in pending.pop(m.group(1), []):
+                    queued.add(test_path)
+                    ready.put(test_path)
+        p.stdout.close()
+        # make is expected to exit with code 1 if there was any build
+        # failure, lit reports those tests as failed.
+        p.wait()
+        build_end = time.time()
+
+        # Run whatever is left, including the tests of targets which failed
+        # to build and tests generated by the build itself.
+        for _, test_paths in sorted(self._find_lit_tests(subdir).items()):
+            for test_path in test_paths:
+                if test_path not in queued:
+                    ready.put(test_path)
+        ready.put(None)
+        tester_thread.join()
+        if errors:
+            raise errors[0]
+
+        data = dict(results[-1]) if results else {}
+        data['tests'] = [t for r in results for t in r['tests']]
+
+        test_time = sum(end - start for start, end in test_intervals)
+        overlap = sum(max(0, min(end, build_end) - max(start, build_start))
+                      for start, end in test_intervals)
+        logger.info('Built for %.1fs, tested for %.1fs, %.1fs of which '
+                    'overlapped the build' %
+                    (build_end - build_start, test_time, overlap))
+        stats = {
+            'pipeline_build_time': '%.3f' % (build_end - build_start),
+            'pipeline_test_time': '%.3f' % test_time,
+            'pipeline_overlap_time': '%.3f' % overlap,
+        }
+        return data, stats
+
     def _install_benchmark(self, path):
         if self.remote_run:
             make_cmd = self.opts.make
             self._check_call([make_cmd, 'rsync'], cwd=path)
 
-    def _lit(self, path, test, profile):
+    def _lit(self, path, test, profile, cmake_vars=None):
+        """Run lit and return its JSON output.
+
+        The output of lit is followed while the tests run, to import the
+        profiles of the tests in the background as soon as they completed,
+        and, when cmake_vars are given, to write partial reports if
+        requested with --partial-report-interval."""
+        subdir = path
+        if self.opts.only_test:
+            components = [path] + [self.opts.only_test[0]]
+            subdir = os.path.join(*components)
+
+        parser = self._lit_output_parser(path, cmake_vars)
+        logger.info('Testing...')
+        return self._run_lit(path, [subdir], test, profile, parser)
+
+    def _lit_threads(self, profile):
+        nr_threads = self._test_threads()
+        if profile and nr_threads != 1:
+            logger.warning('Gathering profiles with perf requires -j 1 ' +
+                           'as perf record cannot be run multiple times ' +
+                           'simultaneously. Overriding -j %s to -j 1' %
+                           nr_threads)
+            nr_threads = 1
+        return nr_threads
+
+    def _lit_output_parser(self, path, cmake_vars):
+        """Return a _LitOutputParser which imports the profiles of the tests
+        as they complete and writes partial reports, see _lit."""
+        self._profiles = _ProfileImporter()
+
+        def on_metrics(test_data):
+            profile = test_data['metrics'].get('profile')
+            if profile is not None:
+                self._profiles.add(self._get_lnt_test_name(test_data['name']),
+                                   profile)
+
+        parser = _LitOutputParser(on_metrics)
+        if cmake_vars is not None and \
+                self.opts.partial_report_interval is not None:
+            parser.partial_report = (path, cmake_vars)
+            parser.last_partial_report = time.time()
+        return parser
+
+    def _run_lit(self, path, lit_paths, test, profile, parser,
+                 nr_threads=None, prefix=[]):
+        """Run lit on the given tests or directories and return its JSON
+        output, while feeding its output to parser.
+
+        prefix is prepended to the lit command, e.g. to pin it to cores."""
         lit_cmd = self.opts.lit
 
         output_json_path = tempfile.NamedTemporaryFile(prefix='output',
@@ -596,46 +972,78 @@ class TestSuiteTest(BuiltinTest):
                                                        delete=False)
         output_json_path.close()
 
-        subdir = path
-        if self.opts.only_test:
-            components = [path] + [self.opts.only_test[0]]
-            subdir = os.path.join(*components)
-
         extra_args = []
         if not test:
             extra_args = ['--no-execute']
 
-        nr_threads = self._test_threads()
+        if nr_threads is None:
+            nr_threads = self._lit_threads(profile)
         if profile:
-            if nr_threads != 1:
-                logger.warning('Gathering profiles with perf requires -j 1 ' +
-                               'as perf record cannot be run multiple times ' +
-                               'simultaneously. Overriding -j %s to -j 1' %
-                               nr_threads)
-                nr_threads = 1
             extra_args += ['--param', 'profile=perf']
             if self.opts.perf_events:
                 extra_args += ['--param',
                                'perf_profile_events=%s' %
                                self.opts.perf_events]
 
-        logger.info('Testing...')
-        try:
-            self._check_call([lit_cmd,
-                              '-v',
-                              '-j', str(nr_threads),
-                              subdir,
-                              '-o', output_json_path.name] + extra_args)
-        except subprocess.CalledProcessError:
-            # LIT is expected to exit with code 1 if there were test
-            # failures!
-            pass
+        args = [lit_cmd,
+                '-v',
+                '-j', str(nr_threads)] + lit_paths + \
+            ['-o', output_json_path.name] + extra_args
+        args = prefix + args
+        logger.info('Execute: %s' % ' '.join(args))
+        env = dict(os.environ)
+        env['PYTHONUNBUFFERED'] = '1'
+        p = subprocess.Popen(args, stdout=subprocess.PIPE, env=env)
+        for line in iter(p.stdout.readline, ''):
+            sys.stdout.write(line)
+            parser.feed(line)
+            if parser.partial_report is not None and \
+                    time.time() - parser.last_partial_report >= \
+                    self.opts.partial_report_interval:
+                partial_path, cmake_vars = parser.partial_report
+                self._write_partial_report(partial_path,
+                                           parser.tests.values(), cmake_vars)
+                parser.last_partial_report = time.time()
+        p.stdout.close()
+        # LIT is expected to exit with code 1 if there were test failures!
+        p.wait()
         try:
             return json.loads(open(output_json_path.name).read())
         except ValueError as e:
             fatal("Running test-suite did not create valid json report "
                   "in {}: {}".format(output_json_path.name, e.message))
 
+    def _write_partial_report(self, path, tests, cmake_vars):
+        """Write a report of the tests completed so far, and submit it if a
+        server was given."""
+        report = self._parse_lit_output(path, {'tests': tests}, cmake_vars,
+                                        partial=True)
+        report_path = os.path.join(self._base_path, 'report.partial.json')
+        with open(report_path, 'w') as fd:
+            fd.write(report.render())
+        logger.info('Wrote partial report of %d tests to %s' %
+                    (len(tests), report_path))
+
+        # The final report replaces the partial one, which only works with
+        # the replace merge strategy.
+        if self.opts.submit_url and self.opts.merge == 'replace':
+            self.log("submitting partial result to %r" %
+                     (self.opts.submit_url,))
+            ServerUtil.submitFile(self.opts.submit_url, report_path, False,
+                                  select_machine=self.opts.select_machine,
+                                  merge_run='replace')
+
+    def _get_lnt_test_name(self, raw_name):
+        split_name = raw_name.split(' :: ', 1)
+        if len(split_name) > 1:
+            name = split_name[1]
+        else:
+            name = split_name[0]
+
+        if name.endswith('.test'):
+            name = name[:-5]
+        return 'nts.' + name
+
     def _is_pass_code(self, code):
         return code in ('PASS', 'XPASS', 'XFAIL')
 
@@ -693,10 +1101,14 @@ class TestSuiteTest(BuiltinTest):
             cflags += " --target=" + cmake_vars["CMAKE_C_COMPILER_TARGET"]
         target_flags = shlex.split(cflags)
 
-        return lnt.testing.util.compilers.get_cc_info(
-            cmake_vars["CMAKE_C_COMPILER"], target_flags)
+        key = (cmake_vars["CMAKE_C_COMPILER"], tuple(target_flags))
+        if key not in self._cc_info:
+            self._cc_info[key] = lnt.testing.util.compilers.get_cc_info(
+                cmake_vars["CMAKE_C_COMPILER"], target_flags)
+        return dict(self._cc_info[key])
 
-    def _parse_lit_output(self, path, data, cmake_vars, only_test=False):
+    def _parse_lit_output(self, path, data, cmake_vars, only_test=False,
+                          partial=False):
         LIT_METRIC_TO_LNT = {
             'compile_time': 'compile',
             'exec_time': 'exec',
@@ -727,27 +1139,20 @@ class TestSuiteTest(BuiltinTest):
         if only_test:
             ignore.append('compile')
 
-        profiles_to_import = []
+        profiles = self._profiles
+        if profiles is None:
+            profiles = _ProfileImporter()
         no_errors = True
 
         for test_data in data['tests']:
             code = test_data['code']
             raw_name = test_data['name']
-
-            split_name = raw_name.split(' :: ', 1)
-            if len(split_name) > 1:
-                name = split_name[1]
-            else:
-                name = split_name[0]
-
-            if name.endswith('.test'):
-                name = name[:-5]
-            name = 'nts.' + name
+            name = self._get_lnt_test_name(raw_name)
 
             # If --single-result is given, exit based on
             # --single-result-predicate
             is_pass = self._is_pass_code(code)
-            if self.opts.single_result and \
+            if self.opts.single_result and not partial and \
                raw_name == self.opts.single_result + '.test':
                 env = {'status': is_pass}
                 if 'metrics' in test_data:
@@ -761,7 +1166,8 @@ class TestSuiteTest(BuiltinTest):
             if 'metrics' in test_data:
                 for k, v in sorted(test_data['metrics'].items()):
                     if k == 'profile':
-                        profiles_to_import.append((name, v))
+                        if not partial:
+                            profiles.add(name, v)
                         continue
 
                     if k not in LIT_METRIC_TO_LNT or \
@@ -794,24 +1200,14 @@ class TestSuiteTest(BuiltinTest):
                                             [lnt_code], test_info))
                 no_errors = False
 
-        # Now import the profiles in parallel.
-        if profiles_to_import:
-            logger.info('Importing %d profiles with %d threads...' %
-                        (len(profiles_to_import), multiprocessing.cpu_count()))
-            TIMEOUT = 800
-            try:
-                pool = multiprocessing.Pool()
-                waiter = pool.map_async(_importProfile, profiles_to_import)
-                samples = waiter.get(TIMEOUT)
-                test_samples.extend([sample
-                                     for sample in samples
-                                     if sample is not None])
-            except multiprocessing.TimeoutError:
-                logger.warning('Profiles had not completed importing after ' +
-                               '%s seconds.' % TIMEOUT)
-                logger.info('Aborting profile import and continuing')
+        # Now wait for the profiles, which were imported in parallel while
+        # the tests ran.
+        if len(profiles) and not partial:
+            logger.info('Waiting for %d profile imports...' % len(profiles))
+            test_samples.extend(profiles.samples())
+            self._profiles = None
 
-        if self.opts.single_result:
+        if self.opts.single_result and not partial:
             # If we got this far, the result we were looking for didn't exist.
             raise RuntimeError("Result %s did not exist!" %
                                self.opts.single_result)
@@ -1141,7 +1537,16 @@ class TestSuiteTest(BuiltinTest):
 @click.option("--use-lit", "lit", metavar="PATH", type=click.UNPROCESSED,
               default="llvm-lit",
               help="Path to the LIT test runner [llvm-lit]")
+@click.option("--pipeline", "pipeline", is_flag=True,
+              help="Run the benchmarks as soon as they are built, while the "
+                   "others are still building. The build is kept off the "
+                   "cores used for testing")
+@click.option("--partial-report-interval", "partial_report_interval",
+              type=float, default=None, metavar="SECONDS",
+              help="While lit runs, write a report of the tests completed so "
+                   "far every SECONDS, and submit it if --submit is given")
 @submit_options
+@sampling_options
 def cli_action(*args, **kwargs):
     test_suite = TestSuiteTest()
 
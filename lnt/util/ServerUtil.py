@@ -2,19 +2,173 @@
 Utility for submitting files to a web server over HTTP.
 """
 from __future__ import print_function
+import base64
+import re
 import sys
 import urllib
-import urllib2
+import urlparse
+import httplib
+import socket
+import threading
+import time
+import zlib
 import contextlib
 import json
+from multiprocessing.pool import ThreadPool
 
 import lnt.server.instance
+from lnt.server.db import profilestore
+from lnt.util import logger
 
 # FIXME: I used to maintain this file in such a way that it could be used
 # separate from LNT to do submission. This could be useful for adapting an
 # older system to report to LNT, for example. It might be nice to factor the
 # simplified submit code into a separate utility.
 
+# Number of times a request is retried after a connection error or a
+# response indicating the server is temporarily unavailable, and the delay
+# before the first retry in seconds, which doubles with every retry. Requests
+# which may have had an effect on the server are only retried if they are
+# idempotent, see _request().
+SUBMIT_RETRIES = 3
+SUBMIT_RETRY_DELAY = 2.0
+RETRY_STATUSES = (502, 503, 504)
+
+# Socket timeout for submissions, in seconds. Importing a large report can
+# keep the server busy for a while.
+SUBMIT_TIMEOUT = 600
+
+
+def _get_proxy(scheme, netloc):
+    """Return the split url of the proxy to use for the server at netloc, as
+    configured by the http_proxy, https_proxy and no_proxy environment
+    variables, or None."""
+    host = urllib.splitport(netloc)[0]
+    proxy = urllib.getproxies().get(scheme)
+    if not proxy or urllib.proxy_bypass(host):
+        return None
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+    return urlparse.urlsplit(proxy)
+
+
+def _proxy_headers(proxy):
+    if proxy.username is None:
+        return {}
+    credentials = '%s:%s' % (urllib.unquote(proxy.username),
+                             urllib.unquote(proxy.password or ''))
+    return {'Proxy-Authorization': 'Basic ' + base64.b64encode(credentials)}
+
+
+class _ConnectionPool(object):
+    """Keeps idle keep-alive connections around for reuse, per server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def get(self, scheme, netloc, proxy=None, reuse=True):
+        if reuse:
+            with self.lock:
+                connections = self.idle.get((scheme, netloc))
+                if connections:
+                    return connections.pop(), True
+        if proxy is None:
+            host = netloc
+        else:
+            # Strip the credentials.
+            host = proxy.netloc.rsplit('@', 1)[-1]
+        if scheme == 'https':
+            conn = httplib.HTTPSConnection(host, timeout=SUBMIT_TIMEOUT)
+            if proxy is not None:
+                # Tunnel to the server through the proxy.
+                conn.set_tunnel(netloc, headers=_proxy_headers(proxy))
+        else:
+            conn = httplib.HTTPConnection(host, timeout=SUBMIT_TIMEOUT)
+        return conn, False
+
+    def put(self, scheme, netloc, conn):
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(conn)
+
+    def close(self):
+        with self.lock:
+            for connections in self.idle.values():
+                for conn in connections:
+                    conn.close()
+            self.idle = {}
+
+
+_connection_pool = _ConnectionPool()
+
+
+def _request(method, url, body=None, headers={}, idempotent=None):
+    """_request(method, url, [body], [headers], [idempotent]) -> (status, data)
+
+    Send a request to url over a pooled connection, through the proxy set in
+    the environment, if any. Connection errors and the statuses in
+    RETRY_STATUSES are retried with an exponential backoff; a connection
+    error which persists after the retries is raised.
+
+    Requests which are not idempotent, by default all but GET, HEAD and PUT
+    requests, may have been handled by the server when the connection fails
+    or the server reports an error, so they are only retried if the
+    connection could not be established."""
+    if idempotent is None:
+        idempotent = method in ('GET', 'HEAD', 'PUT')
+    if isinstance(url, unicode):
+        # httplib cannot mix an unicode request line with a binary body.
+        url = url.encode('utf-8')
+    parts = urlparse.urlsplit(url)
+    path = urlparse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+    proxy = _get_proxy(parts.scheme, parts.netloc)
+    if proxy is not None and parts.scheme == 'http':
+        # The proxy expects the full url.
+        path = urlparse.urlunsplit(parts[:4] + ('',))
+        headers = dict(headers, **_proxy_headers(proxy))
+    delay = SUBMIT_RETRY_DELAY
+    attempt = 0
+    while True:
+        # The server may close an idle connection while the request is sent,
+        # so only idempotent requests reuse connections.
+        conn, reused = _connection_pool.get(parts.scheme, parts.netloc, proxy,
+                                            reuse=idempotent)
+        connected = False
+        try:
+            if conn.sock is None:
+                conn.connect()
+            connected = True
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (socket.error, httplib.HTTPException) as e:
+            conn.close()
+            if isinstance(e, socket.gaierror) or \
+                    (connected and not idempotent):
+                raise
+            if reused:
+                # The server closed the idle connection, this is not worth a
+                # retry.
+                continue
+            if attempt >= SUBMIT_RETRIES:
+                raise
+            logger.warning("submitting to %s failed: %s, retrying in %gs" %
+                           (url, e, delay))
+        else:
+            if response.will_close:
+                conn.close()
+            else:
+                _connection_pool.put(parts.scheme, parts.netloc, conn)
+            if response.status not in RETRY_STATUSES or not idempotent or \
+                    attempt >= SUBMIT_RETRIES:
+                return response.status, data
+            logger.warning("submitting to %s failed: HTTP %d %s, "
+                           "retrying in %gs" %
+                           (url, response.status, response.reason, delay))
+        attempt += 1
+        time.sleep(delay)
+        delay *= 2
+
 
 def _show_json_error(reply):
     try:
@@ -28,42 +182,172 @@ def _show_json_error(reply):
         sys.stderr.write(message + '\n')
 
 
+def _gzip(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _profile_values(data):
+    """Yield a (container, key) pair for every profile embedded in the report
+    data."""
+    if data.get('format_version') == '2':
+        for test in data.get('tests', []):
+            value = test.get('profile')
+            if isinstance(value, list):
+                for i in range(len(value)):
+                    yield value, i
+            elif value is not None:
+                yield test, 'profile'
+    else:
+        for test in data.get('Tests', []):
+            if test.get('Name', '').endswith('.profile'):
+                for i in range(len(test.get('Data', []))):
+                    yield test['Data'], i
+
+
+# The servers found to not accept profile uploads.
+_inline_profile_servers = set()
+
+
+def _upload_profiles(url, data):
+    """Upload the profiles embedded in the report data to the server at url
+    and replace them with references to the uploads, see
+    lnt.server.db.profilestore. Profiles the server has already are not
+    uploaded again. Returns false if the server does not accept uploads, the
+    profiles have to stay embedded then."""
+    parts = urlparse.urlsplit(url)
+    # Profiles are stored per instance, the blobs live next to the default
+    # database.
+    root = re.sub(r'(db_[^/]+/)?(v4/[^/]+/)?submitRun$', '', parts.path)
+    if root == parts.path or parts.netloc in _inline_profile_servers:
+        return False
+    blob_url = urlparse.urlunsplit((parts.scheme, parts.netloc,
+                                    root + 'profile/blobs/', '', ''))
+
+    references = {}
+    replacements = []
+    for container, key in _profile_values(data):
+        value = container[key]
+        if profilestore.is_reference(value):
+            continue
+        replacements.append((container, key))
+        if value in references:
+            continue
+        blob = base64.b64decode(value)
+        digest = profilestore.digest(blob)
+        references[value] = profilestore.REFERENCE_PREFIX + digest
+
+        status, _ = _request('HEAD', blob_url + digest)
+        if status == 200:
+            continue
+        status, reply = _request('PUT', blob_url + digest, _gzip(blob), {
+            'Accept': 'application/json',
+            'Content-Type': 'application/octet-stream',
+            'Content-Encoding': 'gzip'})
+        if status != 201:
+            logger.info("%s does not accept profile uploads (HTTP %d), "
+                        "embedding the profiles in the report" %
+                        (url, status))
+            _inline_profile_servers.add(parts.netloc)
+            return False
+
+    for container, key in replacements:
+        container[key] = references[container[key]]
+    return True
+
+
+def _encode_submission(data, select_machine, merge_run, legacy):
+    """Return the url query, body and headers for submitting data."""
+    params = {}
+    if select_machine is not None:
+        params['select_machine'] = select_machine
+    if merge_run is not None:
+        params['merge'] = merge_run
+    headers = {'Accept': 'application/json'}
+    if legacy:
+        # Servers predating raw JSON submissions only accept form data.
+        params['input_data'] = data
+        params['commit'] = "1"  # compatibility with old servers.
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        return '', urllib.urlencode(params), headers
+
+    body = _gzip(data)
+    headers['Content-Type'] = 'application/json'
+    headers['Content-Encoding'] = 'gzip'
+    return urllib.urlencode(params), body, headers
+
+
+# The servers found to only accept form encoded submissions.
+_legacy_servers = set()
+
+
 def submitFileToServer(url, file, select_machine=None, merge_run=None):
     with open(file, 'rb') as f:
-        values = {
-            'input_data': f.read(),
-            'commit': "1",  # compatibility with old servers.
-        }
-        if select_machine is not None:
-            values['select_machine'] = select_machine
-        if merge_run is not None:
-            values['merge'] = merge_run
-    headers = {'Accept': 'application/json'}
-    data = urllib.urlencode(values)
-    try:
-        response = urllib2.urlopen(urllib2.Request(url, data, headers=headers))
-    except urllib2.HTTPError as e:
-        _show_json_error(e.read())
-        return
-    except urllib2.URLError as e:
-        sys.stderr.write("error: could not resolve '%s': %s\n" %
-                         (url, e))
-        return
-    result_data = response.read()
+        data = f.read()
 
-    # The result is expected to be a JSON object.
-    try:
-        return json.loads(result_data)
-    except Exception:
-        import traceback
-        print("Unable to load result, not a valid JSON object.")
-        print()
-        print("Traceback:")
-        traceback.print_exc()
-        print()
-        print("Result:")
-        print("error:", result_data)
-        return
+    server = urlparse.urlsplit(url).netloc
+    profiles_uploaded = False
+    for legacy in (False, True):
+        if not legacy and server in _legacy_servers:
+            continue
+        if not legacy and 'profile' in data:
+            try:
+                report = json.loads(data)
+            except ValueError:
+                # Let the server report the error.
+                report = None
+            try:
+                if isinstance(report, dict) and \
+                        _upload_profiles(url, report):
+                    profiles_uploaded = True
+                    inline_data = data
+                    data = json.dumps(report)
+            except (socket.error, httplib.HTTPException) as e:
+                sys.stderr.write("error: could not resolve '%s': %s\n" %
+                                 (url, e))
+                return
+        elif legacy and profiles_uploaded:
+            # Servers not accepting raw JSON do not know about uploaded
+            # profiles either.
+            data = inline_data
+        query, body, headers = _encode_submission(data, select_machine,
+                                                  merge_run, legacy)
+        submit_url = url
+        if query:
+            submit_url += ('&' if '?' in url else '?') + query
+        try:
+            # Resubmitting a run replacing the existing one has no further
+            # effect, other submissions must not be repeated.
+            status, result_data = _request('POST', submit_url, body, headers,
+                                           idempotent=(merge_run == 'replace'))
+        except (socket.error, httplib.HTTPException) as e:
+            sys.stderr.write("error: could not resolve '%s': %s\n" %
+                             (url, e))
+            return
+        if status >= 400:
+            _show_json_error(result_data)
+            return
+        try:
+            return json.loads(result_data)
+        except ValueError:
+            # Old servers reply to raw JSON submissions with the HTML of the
+            # submission page, fall back to form encoding.
+            if not legacy:
+                logger.info("%s does not accept raw JSON submissions, "
+                            "falling back to form encoding" % (url,))
+                _legacy_servers.add(server)
+                continue
+
+            # The result is expected to be a JSON object.
+            import traceback
+            print("Unable to load result, not a valid JSON object.")
+            print()
+            print("Traceback:")
+            traceback.print_exc()
+            print()
+            print("Result:")
+            print("error:", result_data)
+            return
 
 
 def submitFileToInstance(path, file, select_machine=None, merge_run=None):
@@ -82,7 +366,7 @@ def submitFileToInstance(path, file, select_machine=None, merge_run=None):
 
 
 def submitFile(url, file, verbose, select_machine=None, merge_run=None):
-    # If this is a real url, submit it using urllib.
+    # If this is a real url, submit it over HTTP.
     if '://' in url:
         result = submitFileToServer(url, file, select_machine, merge_run)
     else:
@@ -90,11 +374,22 @@ def submitFile(url, file, verbose, select_machine=None, merge_run=None):
     return result
 
 
-def submitFiles(url, files, verbose, select_machine=None, merge_run=None):
-    results = []
-    for file in files:
-        result = submitFile(url, file, verbose, select_machine=select_machine,
-                            merge_run=merge_run)
-        if result:
-            results.append(result)
-    return results
+def submitFiles(url, files, verbose, select_machine=None, merge_run=None,
+                jobs=1):
+    """Submit files to url and return the results of the successful
+    submissions. Up to jobs files are submitted concurrently to a server, local
+    instances are always written to one file at a time."""
+    def submit(file):
+        return submitFile(url, file, verbose, select_machine=select_machine,
+                          merge_run=merge_run)
+
+    if jobs > 1 and len(files) > 1 and '://' in url:
+        pool = ThreadPool(min(jobs, len(files)))
+        try:
+            results = pool.map(submit, files)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [submit(file) for file in files]
+    return [result for result in results if result]
@@ -0,0 +1,35 @@
+# Check that the input format is sniffed from the first bytes of the input.
+#
+# RUN: python %s %S/Inputs
+#
+# Input that looks like neither format is rejected.
+# RUN: not lnt convert --to=json < %S/Inputs/test.nightlytest 2>&1 | \
+# RUN:     FileCheck --check-prefix=CHECK-UNKNOWN %s
+# CHECK-UNKNOWN: unable to guess input format
+
+import os
+import sys
+from StringIO import StringIO
+
+from lnt.formats import guess_format, sniff_format, json, plist
+
+inputs = sys.argv[1]
+
+assert sniff_format(os.path.join(inputs, 'test.json')) is json
+assert sniff_format(os.path.join(inputs, 'test.plist')) is plist
+assert sniff_format(os.path.join(inputs, 'test.nightlytest')) is None
+assert guess_format(os.path.join(inputs, 'test.json')) is json
+assert guess_format(os.path.join(inputs, 'test.plist')) is plist
+
+# Leading whitespace and a byte order mark are skipped.
+assert sniff_format(StringIO('\xef\xbb\xbf\n  { "a" : 1 }')) is json
+assert sniff_format(StringIO('<plist version="1.0"><dict/></plist>')) is plist
+assert sniff_format(StringIO('bplist00')) is plist
+assert sniff_format(StringIO('')) is None
+assert sniff_format(StringIO('a => 1')) is None
+
+# File objects are rewound, so the input can be read afterwards.
+f = StringIO('{ "a" : 1 }')
+f.read()
+assert sniff_format(f) is json
+assert f.read() == '{ "a" : 1 }'
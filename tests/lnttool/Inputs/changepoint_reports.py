@@ -0,0 +1,29 @@
+# Write reports for revisions 100 to 115 of a machine, where the execution
+# time of test 'foo' steps up by 5% at revision 108. The step is below the
+# minimum absolute change noticed when the runs are submitted.
+import json
+import os
+import sys
+
+noise = [0.0, 0.001, 0.0005, 0.0015, 0.0, 0.001, 0.002, 0.0005]
+
+for i in range(16):
+    revision = 100 + i
+    foo = (0.1 if revision < 108 else 0.105) + noise[i % len(noise)]
+    bar = 2.0 + noise[(i + 3) % len(noise)]
+    report = {
+        'format_version': '2',
+        'machine': {'name': 'changepoint-machine'},
+        'run': {
+            'llvm_project_revision': str(revision),
+            'start_time': '2017-01-%02d 10:00:00' % (i + 1),
+            'end_time': '2017-01-%02d 10:00:00' % (i + 1),
+        },
+        'tests': [
+            {'name': 'foo', 'execution_time': [foo]},
+            {'name': 'bar', 'execution_time': [bar]},
+        ],
+    }
+    path = os.path.join(sys.argv[1], 'report%02d.json' % i)
+    with open(path, 'w') as f:
+        json.dump(report, f)
@@ -0,0 +1,16 @@
+# Helper for submit_profile.shtest: check the uploaded profile was imported.
+import sys
+
+import lnt.server.instance
+from lnt.testing.profile.profilev1impl import ProfileV1
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+config = instance.config
+db = config.get_database('default')
+session = db.make_session()
+ts = db.testsuite['nts']
+profiles = session.query(ts.Profile).all()
+assert len(profiles) == 2
+for p in profiles:
+    assert 'cycles=' in p.counters, p.counters
+    assert isinstance(p.load(config.profileDir).impl, ProfileV1)
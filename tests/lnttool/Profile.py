@@ -14,3 +14,8 @@
 # RUN: rm -rf %t/non_existing_output.lnt
 # RUN: lnt profile upgrade %S/Inputs/test.lntprof %t/non_existing_output.lnt
 # RUN: cat %t/non_existing_output.lnt
+
+# RUN: lnt profile diff --sortkeys --function fn1 %S/Inputs/test.lntprof %t/non_existing_output.lnt | FileCheck --check-prefix=CHECK-DIFF %s
+# CHECK-DIFF: {"code": [[1048576, 1048576, "add r0, r0, r0", "add r0, r0, r0", {}, {"branch-misses": 0.0, "cycles": 0.0}, {"branch-misses": 0.0, "cycles": 0.0}],
+# CHECK-DIFF-SAME: "counters": {"branch-misses": [200.0, 200, 0.0], "cycles": [12345.0, 12345, 0.0]}
+# CHECK-DIFF-SAME: "functions": [{"counters": [{"branch-misses": 10.0, "cycles": 45.0}, {"branch-misses": 10.0, "cycles": 45.0}], "deltas": {"branch-misses": 0.0, "cycles": 0.0}, "length": [2, 2], "name": "fn1"}], "num_functions": 1}
@@ -11,12 +11,23 @@
 # RUN:     --delete-run 1 --show-sql >& %t.out
 # RUN: FileCheck --check-prefix CHECK-RUNRM %s < %t.out
 
-# CHECK-RUNRM: DELETE FROM "NT_Sample" WHERE "NT_Sample"."ID" = ?
-# CHECK-RUNRM-NEXT: ((1,), (2,))
-# CHECK-RUNRM: DELETE FROM "NT_Run" WHERE "NT_Run"."ID" = ?
+# CHECK-RUNRM: DELETE FROM "NT_Sample" WHERE "NT_Sample"."RunID" IN (?)
+# CHECK-RUNRM-NEXT: (1,)
+# CHECK-RUNRM: DELETE FROM "NT_Run" WHERE "NT_Run"."ID" IN (?)
+# CHECK-RUNRM-NEXT: (1,)
+# CHECK-RUNRM: COMMIT
+# CHECK-RUNRM: DELETE FROM "NT_Order" WHERE "NT_Order"."ID" IN (?)
 # CHECK-RUNRM-NEXT: (1,)
 # CHECK-RUNRM: COMMIT
 
+# Check that the batch size has to be positive.
+#
+# RUN: not lnt updatedb %t.install --testsuite nts \
+# RUN:     --delete-run 1 --batch-size 0 2>&1 \
+# RUN:     | FileCheck --check-prefix CHECK-BATCHSIZE %s
+
+# CHECK-BATCHSIZE: Invalid value for "--batch-size"
+
 # Check that we remove runs when we remove a machine.
 #
 # RUN: rm -rf %t.install
@@ -27,10 +38,33 @@
 # RUN:     --delete-machine "LNT SAMPLE MACHINE" --show-sql >& %t.out
 # RUN: FileCheck --check-prefix CHECK-MACHINERM %s < %t.out
 
-# CHECK-MACHINERM: DELETE FROM "NT_Sample" WHERE "NT_Sample"."ID" = ?
-# CHECK-MACHINERM-NEXT: ((1,), (2,))
-# CHECK-MACHINERM: DELETE FROM "NT_Run" WHERE "NT_Run"."ID" = ?
+# CHECK-MACHINERM: DELETE FROM "NT_Sample" WHERE "NT_Sample"."RunID" IN (?)
+# CHECK-MACHINERM-NEXT: (1,)
+# CHECK-MACHINERM: DELETE FROM "NT_Run" WHERE "NT_Run"."ID" IN (?)
 # CHECK-MACHINERM-NEXT: (1,)
 # CHECK-MACHINERM: DELETE FROM "NT_Machine" WHERE "NT_Machine"."ID" = ?
 # CHECK-MACHINERM-NEXT: (1,)
 # CHECK-MACHINERM: COMMIT
+
+# Check that profiles and their files are removed together with the run.
+#
+# RUN: rm -rf %t.install
+# RUN: lnt create %t.install
+# RUN: lnt import %t.install %{shared_inputs}/profile-report.json \
+# RUN:     --show-sample-count
+# RUN: ls %t.install/data/profiles | FileCheck --check-prefix CHECK-PROFILE %s
+# RUN: lnt updatedb %t.install --testsuite nts \
+# RUN:     --delete-run 1 --show-sql >& %t.out
+# RUN: FileCheck --check-prefix CHECK-PROFILERM %s < %t.out
+# RUN: python %s %t.install
+
+# CHECK-PROFILE: .lntprof
+# CHECK-PROFILERM: DELETE FROM "NT_Sample" WHERE "NT_Sample"."RunID" IN (?)
+# CHECK-PROFILERM: DELETE FROM "NT_Profile" WHERE "NT_Profile"."ID" IN (?)
+# CHECK-PROFILERM: DELETE FROM "NT_Run" WHERE "NT_Run"."ID" IN (?)
+# CHECK-PROFILERM: COMMIT
+
+import glob
+import sys
+
+assert not glob.glob('%s/data/profiles/*.lntprof' % sys.argv[1])
@@ -0,0 +1,47 @@
+# Check upgrading a version 1 report, where test and metric names are joined
+# with dots and the longest known metric suffix wins.
+#
+# RUN: lnt checkformat %S/Inputs/upgrade_v1_report.json 2>&1 | \
+# RUN:     FileCheck %s
+# CHECK: Import succeeded.
+# CHECK: Added Machines: 1
+# CHECK: Added Runs    : 1
+# CHECK: Added Tests   : 2
+#
+# RUN: python %s %S/Inputs/upgrade_v1_report.json
+
+import json
+import sys
+
+import lnt.testing
+
+with open(sys.argv[1]) as f:
+    data = json.load(f)
+data = lnt.testing.upgrade_and_normalize_report(data, 'nts')
+
+assert data['format_version'] == '2'
+assert data['machine'] == {'name': 'upgrade-machine',
+                           'hostname': 'localhost'}, data['machine']
+assert data['run']['llvm_project_revision'] == '42', data['run']
+
+expected = [{
+    'name': 'foo',
+    'compile_time': 1.5,
+    'compile_status': 0,
+    'execution_time': [2.0, 3.0],
+}, {
+    'name': 'bar.exec',
+    'execution_time': [4.0, 5.0],
+}]
+assert data['tests'] == expected, data['tests']
+# The upgraded tests are a list, which can be iterated more than once.
+assert list(data['tests']) == expected
+
+# Metrics without an upgrade rule keep the part after the last dot.
+report = {
+    'Machine': {'Name': 'm', 'Info': {}},
+    'Run': {'Info': {'__report_version__': '1'}},
+    'Tests': [{'Name': 'custom.foo.bar.frobs', 'Info': {}, 'Data': [7]}],
+}
+data = lnt.testing.upgrade_and_normalize_report(report, 'custom')
+assert data['tests'] == [{'name': 'foo.bar', 'frobs': 7}], data['tests']
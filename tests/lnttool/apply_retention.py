@@ -0,0 +1,42 @@
+# Check that the retention policies are applied.
+#
+# RUN: rm -rf %t.install
+# RUN: lnt create %t.install
+# RUN: lnt import %t.install %S/Inputs/retention_report0.json
+# RUN: lnt import %t.install %S/Inputs/retention_report1.json
+# RUN: lnt import %t.install %S/Inputs/retention_report2.json
+# RUN: echo "retention = {'nts': {'thin_runs_after': 30," \
+# RUN:      "'aggregate_samples_after': 30}}" >> %t.install/lnt.cfg
+# RUN: lnt apply-retention %t.install > %t.out
+# RUN: FileCheck %s < %t.out
+# RUN: python %s %t.install
+
+# CHECK: nts: aggregated samples 4
+# CHECK: nts: deleted runs 1
+
+import sys
+
+import lnt.server.instance
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+db = instance.get_database('default')
+ts = db.testsuite['nts']
+session = db.make_session()
+
+# Only the latest run of the first week survives.
+runs = session.query(ts.Run).order_by(ts.Run.id).all()
+assert [r.order.llvm_project_revision for r in runs] == ['101', '102']
+
+for run in runs:
+    assert run.parameters['aggregated_sample_counts'] == {'foo': 5}
+    samples = session.query(ts.Sample).join(ts.Test) \
+        .filter(ts.Sample.run_id == run.id) \
+        .filter(ts.Test.name == 'foo') \
+        .order_by(ts.Sample.id).all()
+    assert [s.execution_time for s in samples] == [1.0, 3.0, 10.0]
+    assert [s.hash for s in samples] == ['x', 'x', 'x']
+    # Tests with few samples are left alone.
+    samples = session.query(ts.Sample).join(ts.Test) \
+        .filter(ts.Sample.run_id == run.id) \
+        .filter(ts.Test.name == 'bar').all()
+    assert sorted(s.execution_time for s in samples) == [5.0, 6.0]
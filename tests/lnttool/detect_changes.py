@@ -0,0 +1,52 @@
+# Check that change-points are detected in the history, by the command and by
+# the post submission rule.
+#
+# RUN: rm -rf %t.install %t.rule.install %t.reports
+# RUN: mkdir -p %t.reports
+# RUN: python %S/Inputs/changepoint_reports.py %t.reports
+# RUN: lnt create %t.install
+# RUN: lnt import %t.install %t.reports/*.json
+# RUN: python %s %t.install none
+# RUN: lnt detect-changes %t.install -j 2 > %t.out
+# RUN: FileCheck %s < %t.out
+# RUN: python %s %t.install found
+# RUN: lnt detect-changes %t.install --machine changepoint-machine > %t.out
+# RUN: FileCheck --check-prefix=AGAIN %s < %t.out
+# RUN: python %s %t.install found
+#
+# RUN: lnt create %t.rule.install
+# RUN: echo "changepoint_detection = {'nts': {'window': 10}}" \
+# RUN:     >> %t.rule.install/lnt.cfg
+# RUN: lnt import %t.rule.install %t.reports/*.json
+# RUN: python %s %t.rule.install found
+
+# CHECK: nts: new field changes 1
+# AGAIN: nts: new field changes 0
+
+import sys
+
+import lnt.server.instance
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+db = instance.get_database('default')
+ts = db.testsuite['nts']
+session = db.make_session()
+
+changes = session.query(ts.FieldChange).all()
+if sys.argv[2] == 'none':
+    # The change is too small for the comparison with the previous runs.
+    assert changes == [], changes
+else:
+    assert len(changes) == 1, changes
+    fc = changes[0]
+    assert fc.test.name == 'foo'
+    assert fc.field.name == 'execution_time'
+    assert fc.start_order.llvm_project_revision == '107'
+    assert fc.end_order.llvm_project_revision == '108'
+    assert fc.run.order.llvm_project_revision == '108'
+    # The values are the medians of the orders known at detection time.
+    assert 0.1 < fc.old_value < 0.102, fc.old_value
+    assert 0.105 < fc.new_value < 0.107, fc.new_value
+    regressions = session.query(ts.RegressionIndicator) \
+        .filter(ts.RegressionIndicator.field_change_id == fc.id).all()
+    assert len(regressions) == 1
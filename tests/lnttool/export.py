@@ -0,0 +1,63 @@
+# Check the columnar export of samples.
+# REQUIRES: pyarrow
+#
+# RUN: rm -rf %t.install %t.watermark
+# RUN: lnt create %t.install
+# RUN: lnt import %t.install %S/Inputs/retention_report0.json
+# RUN: lnt import %t.install %S/Inputs/retention_report1.json
+# RUN: lnt export %t.install %t.first.parquet \
+# RUN:     --watermark-file %t.watermark > %t.out
+# RUN: lnt import %t.install %S/Inputs/retention_report2.json
+# RUN: lnt export %t.install %t.second.arrow --format arrow \
+# RUN:     --watermark-file %t.watermark >> %t.out
+# RUN: lnt export %t.install %t.order.parquet \
+# RUN:     --min-order 101 --max-order 101 >> %t.out
+# RUN: lnt export %t.install %t.date.parquet --machine retention-machine \
+# RUN:     --start-date 2009-11-18 --end-date 2009-11-25 >> %t.out
+# RUN: FileCheck %s < %t.out
+# RUN: python %s %t.install %t
+
+# CHECK: Exported 14 samples, watermark 14
+# CHECK: Exported 7 samples, watermark 21
+# CHECK: Exported 7 samples, watermark 14
+# CHECK: Exported 7 samples, watermark 14
+
+import sys
+
+import pyarrow
+import pyarrow.parquet
+
+import lnt.server.ui.app
+
+instance_path, prefix = sys.argv[1:]
+
+table = pyarrow.parquet.read_table(prefix + '.first.parquet')
+assert table.num_rows == 14
+data = table.to_pydict()
+assert data['sample_id'] == list(range(1, 15))
+assert set(data['llvm_project_revision']) == set(['100', '101'])
+assert set(data['machine']) == set(['retention-machine'])
+assert sorted(v for t, v in zip(data['test'], data['execution_time'])
+              if t == 'bar') == [5.0, 5.0, 6.0, 6.0]
+
+with open(prefix + '.second.arrow', 'rb') as f:
+    table = pyarrow.ipc.open_stream(f.read()).read_all()
+data = table.to_pydict()
+assert data['sample_id'] == list(range(15, 22))
+assert set(data['llvm_project_revision']) == set(['102'])
+
+table = pyarrow.parquet.read_table(prefix + '.order.parquet')
+assert set(table.to_pydict()['llvm_project_revision']) == set(['101'])
+
+# The REST API streams the same data.
+app = lnt.server.ui.app.App.create_standalone(instance_path)
+app.testing = True
+client = app.test_client()
+response = client.get('api/db_default/v4/nts/export?after_sample_id=7'
+                      '&max_order=101')
+assert response.status_code == 200
+table = pyarrow.ipc.open_stream(response.data).read_all()
+assert table.to_pydict()['sample_id'] == list(range(8, 15))
+
+response = client.get('api/db_default/v4/nts/export?start_date=bogus')
+assert response.status_code == 400
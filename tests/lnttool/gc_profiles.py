@@ -0,0 +1,90 @@
+# Check the profile catalogue and the removal of profiles over the quota.
+#
+# RUN: rm -rf %t.install
+# RUN: lnt create %t.install
+# RUN: lnt import %t.install %{shared_inputs}/profile-report.json
+# RUN: python %s %t.install catalogue
+# RUN: lnt gc-profiles --max-size-mb 1 --blob-min-age 0 %t.install \
+# RUN:     | FileCheck --check-prefix=CHECK-KEEP %s
+# RUN: lnt gc-profiles --max-size-mb 0 --dry-run %t.install \
+# RUN:     | FileCheck --check-prefix=CHECK-DRY %s
+# RUN: lnt gc-profiles --max-size-mb 0 %t.install \
+# RUN:     | FileCheck --check-prefix=CHECK-GC %s
+# RUN: python %s %t.install removed
+
+# CHECK-KEEP: profiles: removed 0 (0 kB)
+# CHECK-KEEP: uploaded profiles: removed 1
+# CHECK-DRY: profiles: removed 1
+# CHECK-DRY-NOT: uploaded profiles
+# CHECK-GC: profiles: removed 1
+# CHECK-GC: uploaded profiles: removed 0
+
+import datetime
+import os
+import sys
+
+import lnt.server.instance
+from lnt.server.db import profilecatalog, profilestore
+from lnt.server.db.rules import rule_update_profile_stats
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+db = instance.get_database('default')
+ts = db.testsuite['nts']
+session = db.make_session()
+profile_dir = db.config.profileDir
+catalog = profilecatalog.catalog_table
+
+if sys.argv[2] == 'catalogue':
+    profile = session.query(ts.Profile).one()
+    path = os.path.join(profile_dir, profile.filename)
+    size = os.path.getsize(path)
+    rows = session.execute(catalog.select()).fetchall()
+    assert [(r.Filename, r.TestSuite, r.Size) for r in rows] == \
+        [(profile.filename, 'nts', size)], rows
+    assert profilecatalog.get_total_size(session) == size
+
+    # The usage history gets at most one entry per interval.
+    history = profilecatalog.get_usage_history(session)
+    assert len(history) == 1 and history[0][1] == size, history
+    rule_update_profile_stats.update_profile_stats(session, ts, None)
+    assert profilecatalog.get_usage_history(session) == history
+
+    # Profiles imported before the catalogue existed are measured later.
+    session.execute(catalog.update().values(Size=None))
+    assert profilecatalog.get_total_size(session) == 0
+    assert profilecatalog.measure(session, profile_dir) == 1
+    assert profilecatalog.get_total_size(session) == size
+
+    # Views update the access times.
+    long_ago = datetime.datetime(2000, 1, 1)
+    session.execute(catalog.update().values(AccessedTime=long_ago))
+    profilecatalog.touch(session, [profile.filename])
+    session.commit()
+    accessed = session.execute(catalog.select()).fetchone().AccessedTime
+    assert accessed > long_ago
+
+    # Uploaded profiles are removed once no profile file links to them.
+    data = open(path, 'rb').read()
+    digest = profilestore.digest(data)
+    profilestore.store_blob(profile_dir, digest, data)
+    assert profilestore.has_blob(profile_dir, digest)
+    # The counters are written last, a blob without them is incomplete.
+    counters_path = os.path.splitext(
+        profilestore.blob_path(profile_dir, digest))[0] + '.json'
+    os.rename(counters_path, counters_path + '.bak')
+    assert not profilestore.has_blob(profile_dir, digest)
+    os.rename(counters_path + '.bak', counters_path)
+    assert profilestore.remove_unused_blobs(profile_dir, 3600) == (0, 0)
+    linked, _ = profilestore.link_blob(
+        profile_dir, profilestore.REFERENCE_PREFIX + digest)
+    assert profilestore.remove_unused_blobs(profile_dir, 0) == (0, 0)
+    os.remove(os.path.join(profile_dir, linked))
+    # Left for gc-profiles.
+
+elif sys.argv[2] == 'removed':
+    assert session.query(ts.Profile).count() == 0
+    assert session.query(ts.Sample) \
+        .filter(ts.Sample.profile_id.isnot(None)).count() == 0
+    assert session.execute(catalog.select()).fetchall() == []
+    assert [f for f in os.listdir(profile_dir)
+            if f.endswith('.lntprof')] == []
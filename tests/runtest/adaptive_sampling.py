@@ -0,0 +1,24 @@
+# Testing adaptive sampling in the 'lnt runtest nt' module.
+#
+# RUN: lnt runtest nt \
+# RUN:   --sandbox %t.SANDBOX \
+# RUN:   --test-suite %S/Inputs/test-suite \
+# RUN:   --cc %{shared_inputs}/FakeCompilers/clang-r154331 \
+# RUN:   --no-timestamp --multisample 2 --adaptive-sampling 0.01 \
+# RUN:   --max-multisample 4 --output %t.report > %t.log 2> %t.err
+#
+# RUN: FileCheck --check-prefix CHECK-STDOUT < %t.log %s
+# RUN: FileCheck --check-prefix CHECK-STDERR < %t.err %s
+# RUN: FileCheck --check-prefix CHECK-REPORT < %t.SANDBOX/build/report.json %s
+#
+# CHECK-STDOUT: Import succeeded.
+# CHECK-STDOUT: Added Runs    : 1
+#
+# The fake test suite reports the same times in every iteration, so sampling
+# stops at the minimal number of iterations.
+# CHECK-STDERR: (multisample) running iteration 0
+# CHECK-STDERR: (multisample) running iteration 1
+# CHECK-STDERR-NOT: (multisample) running iteration 2
+# CHECK-STDERR: (multisample) stopped sampling after 2 iterations (converged)
+#
+# CHECK-REPORT: "sampling_stop_reason": "converged"
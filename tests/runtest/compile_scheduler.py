@@ -0,0 +1,123 @@
+# Check the scheduling of the tests of the 'lnt runtest compile' module.
+#
+# RUN: lnt runtest compile --help | FileCheck --check-prefix CHECK-HELP %s
+# RUN: rm -rf %t.dir && mkdir -p %t.dir
+# RUN: python %s %t.dir
+#
+# CHECK-HELP: -j, --threads N
+# CHECK-HELP: --quiet-cores N
+
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from lnt.tests import compile
+
+logging.basicConfig(level=logging.INFO)
+compile.g_log = logging.getLogger('compile_scheduler')
+
+output_dir = sys.argv[1]
+
+
+def single_file(output, flags=('-O0',), stage='syntax'):
+    return (output, compile.curry(compile.test_compile, input='input.c',
+                                  output=output, pch_input=None,
+                                  flags=list(flags), stage=stage))
+
+
+def full_build(name):
+    return (name, compile.curry(compile.test_build, project={'name': name},
+                                build_config='Debug', num_jobs=2,
+                                codesize_util=None))
+
+
+# Phases: PCH generation before the compiles using it, a phase per set of
+# flags, tests writing the same output in one job and full builds alone.
+tests = [single_file('a.pch', stage=compile.PCH_GEN),
+         single_file('a.o'),
+         single_file('b.o'),
+         single_file('a.o', stage='irgen_only'),
+         full_build('build/sqlite'),
+         single_file('a.o', flags=('-O3',)),
+         single_file('b.o', flags=('-O3',))]
+phases = compile.get_test_phases(tests)
+assert phases == [[[0]], [[1, 3], [2]], [[4]], [[5], [6]]], phases
+
+# The curried functions keep their arguments for the scheduler.
+assert tests[1][1].fn is compile.test_compile
+assert tests[1][1].kw_args['output'] == 'a.o'
+
+cpu_count = multiprocessing.cpu_count()
+assert compile.get_test_cpus(0) == list(range(cpu_count))
+assert compile.get_test_cpus(1) == list(range(1, cpu_count))
+assert compile.get_test_cpus(cpu_count) == []
+
+# Run fake tests, recording the CPU each runs on and how many run at once.
+lock = threading.Lock()
+running = [0]
+max_running = [0]
+test_cpus = {}
+
+
+def fake_test(name, run_info, variables, **kw_args):
+    with lock:
+        running[0] += 1
+        max_running[0] = max(max_running[0], running[0])
+        test_cpus[name] = getattr(compile._scheduler_state, 'cpu', None)
+    time.sleep(0.1)
+    with lock:
+        running[0] -= 1
+    yield (True, name, [kw_args['value']])
+
+
+fake_tests = [('test%d' % i,
+               compile.curry(fake_test, output='%d.o' % i, flags=['-O0'],
+                             stage='syntax', value=i))
+              for i in range(4)]
+compile.test_compile = fake_test
+assert len(compile.get_test_phases(fake_tests)) == 1
+
+# Serially, no test is pinned.
+results = compile.run_tests(fake_tests, {}, {})
+assert results == [[(True, 'test%d' % i, [i])] for i in range(4)], results
+assert max_running[0] == 1
+assert set(test_cpus.values()) == {None}
+
+# Concurrently, each thread is pinned to a CPU of its own and the results
+# stay in the order of the tests.
+max_running[0] = 0
+results = compile.run_tests(fake_tests, {}, {}, threads=2, cpus=[5, 7])
+assert results == [[(True, 'test%d' % i, [i])] for i in range(4)], results
+assert max_running[0] == 2, max_running
+assert set(test_cpus.values()) == {5, 7}, test_cpus
+
+# There are no more threads than CPUs, a single thread is not pinned.
+max_running[0] = 0
+compile.run_tests(fake_tests, {}, {}, threads=4, cpus=[3])
+assert max_running[0] == 1, max_running
+assert set(test_cpus.values()) == {None}, test_cpus
+
+# The commands of a pinned test run under taskset.
+fake_tool = os.path.join(output_dir, 'fake-tool')
+with open(fake_tool, 'w') as f:
+    f.write('#!/bin/sh\necho "{\'version\': 0, \'args\': \'$*\'}"\n')
+os.chmod(fake_tool, 0o755)
+
+
+class Options(object):
+    runn = fake_tool
+    taskset = fake_tool
+    min_sample_time = 0.1
+    verbose = False
+
+
+compile.opts = Options()
+data = compile.runN(['cc', 'a.c'], 1, cwd=output_dir)
+assert data['args'].startswith('-a '), data
+compile._scheduler_state.cpu = 3
+data = compile.runN(['cc', 'a.c'], 1, cwd=output_dir)
+assert data['args'].startswith('-c 3 %s -a ' % fake_tool), data
+assert data['args'].endswith(' 1 cc a.c'), data
@@ -63,5 +63,8 @@
 # CHCCK-SDTERR2: Rerunning: ms_struct-bitfield [1/3]
 # CHCCK-SDTERR2: Rerunning: ms_struct_pack_layout-1 [2/3]
 # CHCCK-SDTERR2: Rerunning: vla [3/3]
+# CHECK-STDERR2: Rerun round 1/4
+# CHECK-STDERR2: submitting result to
+# CHECK-STDERR2: Rerun round 4/4
 
 # CHECK-STDERR2: submitting result to
@@ -0,0 +1,61 @@
+# Check the change-point detection of lnt.server.db.changepoints.
+#
+# RUN: python %s
+import random
+import unittest
+
+from lnt.server.db import changepoints
+
+
+class ChangePointTest(unittest.TestCase):
+    def test_steps(self):
+        random.seed(0)
+        values = [random.gauss(1.0, 0.01) for _ in range(50)] + \
+            [random.gauss(1.1, 0.01) for _ in range(50)] + \
+            [random.gauss(1.05, 0.01) for _ in range(60)]
+        result = changepoints.detect(values)
+        self.assertEqual([cp.index for cp in result], [50, 100])
+        self.assertAlmostEqual(result[0].old_value, 1.0, places=2)
+        self.assertAlmostEqual(result[0].new_value, 1.1, places=2)
+        self.assertAlmostEqual(result[1].new_value, 1.05, places=2)
+
+    def test_noise(self):
+        random.seed(1)
+        values = [random.gauss(1.0, 0.01) for _ in range(300)]
+        self.assertEqual(changepoints.detect(values), [])
+
+    def test_outliers(self):
+        # Single outliers do not make a segment.
+        values = [1.0] * 20
+        values[5] = values[12] = 3.0
+        self.assertEqual(changepoints.detect(values), [])
+
+    def test_without_noise(self):
+        result = changepoints.detect([2.0] * 10 + [1.0] * 10)
+        self.assertEqual(result, [changepoints.ChangePoint(10, 2.0, 1.0)])
+
+    def test_small_changes(self):
+        # Changes below MIN_PERCENTAGE_CHANGE are ignored.
+        values = [1.0] * 10 + [1.005] * 10
+        self.assertEqual(changepoints.segment(values), [10])
+        self.assertEqual(changepoints.detect(values), [])
+
+    def test_short(self):
+        self.assertEqual(changepoints.segment([1.0, 1.0, 2.0, 2.0, 2.0]), [])
+
+    def test_parallel(self):
+        random.seed(2)
+        series = [changepoints.Series(
+            1, i, 1, range(40),
+            [random.gauss(1.0, 0.01) for _ in range(20)] +
+            [random.gauss(1.0 + i * 0.1, 0.01) for _ in range(20)])
+            for i in range(6)]
+        serial = sorted(changepoints.detect_all(series))
+        parallel = sorted(changepoints.detect_all(series, jobs=2))
+        self.assertEqual(serial, parallel)
+        self.assertEqual([cps[0].index if cps else None
+                          for s, cps in serial], [None] + [20] * 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# Check the neighbour lookups of the machine timeline.
+#
+# RUN: python %s
+
+import datetime
+
+from lnt.server.config import Config
+from lnt.server.db import v4db
+
+db = v4db.V4DB("sqlite:///:memory:", Config.dummy_instance())
+session = db.make_session()
+ts = db.testsuite['nts']
+
+machine = ts.Machine("test-machine")
+other = ts.Machine("other-machine")
+orders = {}
+for rev in ['3', '10', '1', '2', '7']:
+    orders[rev] = ts.Order(llvm_project_revision=rev)
+    session.add(orders[rev])
+
+
+def add_run(machine, rev, day):
+    start_time = datetime.datetime(2017, 1, day)
+    run = ts.Run(None, machine, orders[rev], start_time, start_time)
+    session.add(run)
+    return run
+
+
+runs = {}
+for day, rev in enumerate(['10', '1', '3', '7'], 1):
+    runs[rev] = add_run(machine, rev, day)
+# A second, later run of the same order.
+runs['3b'] = add_run(machine, '3', 10)
+add_run(other, '2', 1)
+session.commit()
+
+timeline = ts.get_machine_timeline(session, machine.id)
+assert [o.llvm_project_revision for o in timeline.orders] == \
+    ['1', '3', '7', '10']
+assert ts.get_machine_timeline(session, machine.id) is timeline
+
+prev_runs = ts.get_previous_runs_on_machine(session, runs['7'], 3)
+assert sorted(r.id for r in prev_runs) == \
+    sorted([runs['3'].id, runs['3b'].id, runs['1'].id])
+assert prev_runs[-1] == runs['1']
+next_runs = ts.get_next_runs_on_machine(session, runs['1'], 3)
+assert [r.order.llvm_project_revision for r in next_runs] == ['3', '3', '7']
+assert ts.get_next_runs_on_machine(session, runs['10'], 3) == []
+
+# The closest run is the latest run of the first order not before the
+# requested one.
+assert machine.get_closest_previously_reported_run(
+    session, ts.Order(llvm_project_revision='2')) == runs['3b']
+assert machine.get_closest_previously_reported_run(
+    session, ts.Order(llvm_project_revision='11')) is None
+
+# Writing to the database drops the timelines.
+add_run(machine, '2', 11)
+session.flush()
+timeline = ts.get_machine_timeline(session, machine.id)
+assert [o.llvm_project_revision for o in timeline.orders] == \
+    ['1', '2', '3', '7', '10']
@@ -0,0 +1,110 @@
+# Check that the order sort keys sort like the orders and that new orders are
+# linked into the total ordering by them.
+#
+# RUN: python %s
+
+import random
+
+from lnt.server.config import Config
+from lnt.server.db import v4db
+from lnt.server.db.export import ExportFilter
+from lnt.server.db.migrations import upgrade_17_to_18
+from lnt.server.ui.util import convert_revision, order_sort_key
+
+random.seed(0)
+revisions = ['1', '2', '10', '1.2', '1.10', '1.2.0', '007', 'r9', 'r10',
+             '9abc', '', '3.4-5'] + \
+    ['.'.join(str(random.randint(0, 2000)) for _ in range(random.randint(1, 3)))
+     for _ in range(200)]
+by_key = sorted(revisions, key=lambda r: order_sort_key([r]))
+assert [convert_revision(r) for r in by_key] == \
+    sorted(convert_revision(r) for r in revisions)
+# Keys can be truncated, they still sort like the orders.
+assert len(order_sort_key(['1.' * 128])) == 515
+assert order_sort_key(['1.' * 128], 512) == order_sort_key(['1.' * 128])[:512]
+assert order_sort_key(['2'], 512) == order_sort_key(['2'])
+# Later fields only decide between equal earlier fields.
+assert order_sort_key(['1', '20']) < order_sort_key(['1.0', '3'])
+assert order_sort_key(['1', '3']) < order_sort_key(['1', '20'])
+
+db = v4db.V4DB("sqlite:///:memory:", Config.dummy_instance())
+session = db.make_session()
+ts = db.testsuite['nts']
+
+for rev in ['3', '10', '1', '2', '7', '2.1', '02']:
+    ts._getOrCreateOrder(session, {'llvm_project_revision': rev})
+session.commit()
+
+orders = session.query(ts.Order).all()
+assert all(o.sort_key == order_sort_key([o.llvm_project_revision])
+           for o in orders)
+by_id = dict((o.id, o) for o in orders)
+first = [o for o in orders if o.previous_order_id is None]
+assert len(first) == 1
+order = first[0]
+linked = []
+while order is not None:
+    linked.append(order.llvm_project_revision)
+    order = by_id.get(order.next_order_id)
+# '02' equals '2' and was added later, so it comes after it.
+assert linked == ['1', '2', '02', '2.1', '3', '7', '10'], linked
+
+rows, more = ts.get_order_rows(session, 3)
+assert [r[3] for r in rows] == ['10', '7', '3'] and more
+rows, more = ts.get_order_rows(session, 3, before=rows[-1][0])
+assert [r[3] for r in rows] == ['2.1', '02', '2'] and more
+rows, more = ts.get_order_rows(session, 2, after=rows[0][0])
+assert [r[3] for r in rows] == ['7', '3'] and more
+rows, more = ts.get_order_rows(session, prefix='2')
+assert [r[3] for r in rows] == ['2.1', '2'] and not more
+
+
+# The export filters orders by their sort keys.
+def exported_orders(**kw_args):
+    query = ExportFilter(**kw_args).apply(session, ts, session.query(ts.Order))
+    return sorted(o.llvm_project_revision for o in query)
+
+
+assert exported_orders(min_order='2', max_order='3') == \
+    ['02', '2', '2.1', '3']
+assert exported_orders(max_order='2') == ['02', '1', '2']
+assert exported_orders(min_order='2.1') == ['10', '2.1', '3', '7']
+assert exported_orders(min_order='3', max_order='2') == []
+
+# Orders compare by their sort keys, also before they are flushed, and
+# changing a field changes how the order compares.
+a = ts.Order(llvm_project_revision='1.10')
+b = ts.Order(llvm_project_revision='1.9')
+assert b < a and a > b and a != b and not a == b
+by_rev = dict((o.llvm_project_revision, o) for o in orders)
+assert sorted([a, b] + orders)[:4] == [by_rev['1'], b, a, by_rev['2']]
+b.llvm_project_revision = '1.11'
+assert a < b
+assert ts.Order(llvm_project_revision='2.01') == by_rev['2.1']
+assert a != None and not a == None
+
+# Orders with keys longer than the SortKey column are stored with a truncated
+# key and still compare by their full key.
+long_revs = ['1.' * 128 + '2', '1.' * 128 + '1']
+for rev in long_revs:
+    ts._getOrCreateOrder(session, {'llvm_project_revision': rev})
+session.commit()
+
+
+def long_orders():
+    session.expire_all()
+    return session.query(ts.Order) \
+        .filter(ts.Order.llvm_project_revision.in_(long_revs)).all()
+
+
+assert [len(o.sort_key) for o in long_orders()] == [512, 512]
+assert [o.llvm_project_revision for o in sorted(long_orders())] == \
+    long_revs[::-1]
+
+# The schema upgrade which adds the sort keys accepts them as well.
+session.execute(ts.Order.__table__.update().values(SortKey=None))
+session.commit()
+upgrade_17_to_18.upgrade(db.engine)
+assert [len(o.sort_key) for o in long_orders()] == [512, 512]
+assert all(o.sort_key == order_sort_key([o.llvm_project_revision])
+           for o in orders)
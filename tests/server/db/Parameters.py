@@ -0,0 +1,84 @@
+# Check the machine and run parameters, fields with an indexed column and
+# selecting machines and runs by parameter.
+#
+# RUN: rm -rf %t.install
+# RUN: lnt create %t.install
+# RUN: ln -sf %{src_root}/docs/my_suite.yaml %t.install/schemas/my_suite.yaml
+# RUN: lnt import %t.install -s my_suite %S/Inputs/customschema-report.json
+# RUN: python %s %t.install parameters
+# RUN: rm -f %t.install/schemas/my_suite.yaml
+# RUN: ln -sf %S/Inputs/schema-example-indexed.yaml \
+# RUN:     %t.install/schemas/my_suite.yaml
+# RUN: python %s %t.install indexed
+
+import sys
+
+import sqlalchemy
+
+import lnt.server.instance
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+db = instance.get_database('default')
+ts = db.testsuite['my_suite']
+session = db.make_session()
+machine = session.query(ts.Machine).one()
+run = session.query(ts.Run).one()
+
+
+def machines_with(name, value):
+    return session.query(ts.Machine) \
+        .filter(ts.match_parameter(ts.Machine, name, value)).all()
+
+
+def runs_with(name, value):
+    return session.query(ts.Run) \
+        .filter(ts.match_parameter(ts.Run, name, value)).all()
+
+
+if sys.argv[2] == 'parameters':
+    assert machine.parameters == {'hostname': 'mymachine.local'}
+
+    # The result may be modified without changing the machine.
+    parameters = machine.parameters
+    parameters['hostname'] = 'other.local'
+    assert machine.get_parameter('hostname') == 'mymachine.local'
+    machine.parameters = parameters
+    assert machine.get_parameter('hostname') == 'other.local'
+
+    machine.parameters = {'hostname': 'mymachine.local'}
+    run.parameters = {'build': 'Release_x86', 'mode': '50%'}
+    session.commit()
+    assert run.parameters == {'build': 'Release_x86', 'mode': '50%'}
+    assert run.get_parameter('missing', 'default') == 'default'
+
+    assert machines_with('hostname', 'mymachine.local') == [machine]
+    assert machines_with('hostname', 'MYMACHINE.local') == []
+    assert machines_with('hostname', 'mymachine') == []
+    assert machines_with('os', None) == [machine]
+    assert machines_with('os', 'Darwin') == []
+    assert runs_with('build', 'Release_x86') == [run]
+    assert runs_with('build', 'Release-x86') == []
+    assert runs_with('mode', '50%') == [run]
+    assert runs_with('mode', '5%') == []
+
+elif sys.argv[2] == 'indexed':
+    # The values of the new fields were moved out of the parameters.
+    assert machine.hostname == 'mymachine.local'
+    assert machine.os is None
+    assert machine.parameters == {}
+    assert machine.get_parameter('os') is None
+    assert run.build == 'Release_x86'
+    assert run.parameters == {'mode': '50%'}
+    assert run.get_parameter('build') == 'Release_x86'
+
+    assert machines_with('hostname', 'mymachine.local') == [machine]
+    assert runs_with('build', 'Release_x86') == [run]
+    assert runs_with('mode', '50%') == [run]
+
+    inspector = sqlalchemy.inspect(db.engine)
+    indexes = [index['name']
+               for index in inspector.get_indexes('my_suite_Machine')]
+    assert 'ix_my_suite_Machine_os' in indexes, indexes
+    assert 'ix_my_suite_Machine_hostname' in indexes, indexes
+    indexes = [index['name'] for index in inspector.get_indexes('my_suite_Run')]
+    assert 'ix_my_suite_Run_build' in indexes, indexes
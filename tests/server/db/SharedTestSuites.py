@@ -0,0 +1,62 @@
+# Check that test suite databases are shared between instances of the same
+# database, but not between in-memory databases.
+#
+# RUN: rm -rf %t.install
+# RUN: lnt create %t.install
+# RUN: python %s %t.install
+
+import os
+import sys
+import lnt.server.instance
+from lnt.server.config import Config
+from lnt.server.db import v4db
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+config = instance.config
+
+db1 = config.get_database('default')
+db2 = config.get_database('default')
+for name in db1.testsuite:
+    assert db1.testsuite[name].Sample is db2.testsuite[name].Sample
+    # Every instance has its own database, retention policy and caches.
+    assert db1.testsuite[name] is not db2.testsuite[name]
+    assert db1.testsuite[name].v4db is db1
+    assert db2.testsuite[name].v4db is db2
+    assert db1.testsuite[name].retention_policy is not \
+        db2.testsuite[name].retention_policy
+    assert db1.testsuite[name].machine_to_latest_order_cache is not \
+        db2.testsuite[name].machine_to_latest_order_cache
+
+# A different configuration does not share the test suites.
+other_config = lnt.server.instance.Instance.frompath(sys.argv[1]).config
+db_other = other_config.get_database('default')
+assert db_other.testsuite['nts'].Sample is not db1.testsuite['nts'].Sample
+assert db_other.testsuite['nts'].v4db.config is other_config
+
+v4db.clear_testsuite_registry()
+db3 = config.get_database('default')
+assert db3.testsuite['nts'].Sample is not db1.testsuite['nts'].Sample
+
+# The shared test suite still works for the first instance.
+session = db1.make_session()
+ts = db1.testsuite['nts']
+assert session.query(ts.Run).count() == 0
+session.close()
+
+# Recreating the database at the same path forgets the shared test suites.
+db1.close()
+db2.close()
+db3.close()
+db_other.close()
+db_path = db1.path[len('sqlite:///'):]
+os.remove(db_path)
+db4 = config.get_database('default')
+assert db4.testsuite['nts'].Sample is not db3.testsuite['nts'].Sample
+session = db4.make_session()
+ts = db4.testsuite['nts']
+assert session.query(ts.Run).count() == 0
+session.close()
+
+mem1 = v4db.V4DB("sqlite:///:memory:", Config.dummy_instance())
+mem2 = v4db.V4DB("sqlite:///:memory:", Config.dummy_instance())
+assert mem1.testsuite['nts'] is not mem2.testsuite['nts']
@@ -0,0 +1,89 @@
+# Check the Mann-Whitney U test and the ranking helpers.
+#
+# RUN: python %s
+import itertools
+import random
+import unittest
+
+from lnt.util import stats
+
+
+def brute_force_pvalue(a, b):
+    """Two-sided exact p-value, by enumerating all splits of the values."""
+    values = a + b
+    n, m = len(a), len(b)
+
+    def u_of(first):
+        return sum(1 for i in first for j in range(n + m)
+                   if j not in first and values[i] > values[j])
+
+    observed = u_of(range(n))
+    observed = min(observed, n * m - observed)
+    us = [u_of(c) for c in itertools.combinations(range(n + m), n)]
+    below = sum(1 for u in us if u <= observed)
+    return min(1.0, 2.0 * below / len(us))
+
+
+class MannWhitneyUTest(unittest.TestCase):
+    def test_rankdata(self):
+        ranks, tie_term = stats.rankdata([3.0, 1.0, 2.0, 2.0, 5.0])
+        self.assertEqual(ranks, [4.0, 1.0, 2.5, 2.5, 5.0])
+        self.assertEqual(tie_term, 6)
+
+    def test_exact(self):
+        random.seed(0)
+        for n, m in [(2, 3), (4, 4), (3, 7), (6, 5)]:
+            a = [random.random() for _ in range(n)]
+            b = [random.random() + 0.3 for _ in range(m)]
+            self.assertAlmostEqual(stats.mannwhitneyu_pvalue(a, b),
+                                   brute_force_pvalue(a, b))
+
+    def test_separated(self):
+        a = [1, 2, 3, 4, 5]
+        b = [6, 7, 8, 9, 10]
+        self.assertAlmostEqual(stats.mannwhitneyu_pvalue(a, b), 2 / 252.)
+        self.assertFalse(stats.mannwhitneyu(a, b, .05))
+        self.assertTrue(stats.mannwhitneyu(a, b, .005))
+
+    def test_identical(self):
+        self.assertEqual(stats.mannwhitneyu_pvalue([1.0] * 30, [1.0] * 40),
+                         1.0)
+        self.assertTrue(stats.mannwhitneyu([1.0] * 30, [1.0] * 40))
+
+    def test_normal_approximation(self):
+        # Large samples, and samples with ties, are approximated; the result
+        # must be close to the exact distribution.
+        random.seed(1)
+        a = [random.gauss(0, 1) for _ in range(60)]
+        b = [random.gauss(0.5, 1) for _ in range(60)]
+        approx = stats.mannwhitneyu_pvalue(a, b)
+        limit = stats.MANNWHITNEYU_EXACT_LIMIT
+        try:
+            stats.MANNWHITNEYU_EXACT_LIMIT = 60 * 60
+            exact = stats.mannwhitneyu_pvalue(a, b)
+        finally:
+            stats.MANNWHITNEYU_EXACT_LIMIT = limit
+        self.assertLess(abs(approx - exact), 1e-3)
+
+    def test_symmetric(self):
+        random.seed(2)
+        for size in (5, 50, 200):
+            a = [round(random.random(), 2) for _ in range(size)]
+            b = [round(random.random(), 2) for _ in range(size + 3)]
+            self.assertAlmostEqual(stats.mannwhitneyu_pvalue(a, b),
+                                   stats.mannwhitneyu_pvalue(b, a))
+
+    def test_batch(self):
+        random.seed(3)
+        pairs = [([random.random() for _ in range(n)],
+                  [random.random() for _ in range(n)])
+                 for n in (4, 20, 100, 20)]
+        self.assertEqual(stats.mannwhitneyu_pvalues(pairs),
+                         [stats.mannwhitneyu_pvalue(a, b) for a, b in pairs])
+
+    def test_empty(self):
+        self.assertRaises(ValueError, stats.mannwhitneyu_pvalue, [], [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# Check the summary report across the nts and compile test suites.
+#
+# RUN: rm -rf %t.instance
+# RUN: lnt create %t.instance
+# RUN: cp %S/../../../schemas/compile.yaml %t.instance/schemas/
+# RUN: lnt import %t.instance %S/Inputs/summary-nts1.json
+# RUN: lnt import %t.instance %S/Inputs/summary-nts2.json
+# RUN: lnt import -s compile %t.instance %S/Inputs/summary-compile1.json
+# RUN: lnt import -s compile %t.instance %S/Inputs/summary-compile2.json
+# RUN: python %s %t.instance %S/Inputs
+
+import json
+import os
+import sys
+
+import lnt.server.instance
+from lnt.server.db import deletion
+from lnt.server.reporting import summaryreport
+
+instance = lnt.server.instance.Instance.frompath(sys.argv[1])
+db = instance.get_database('default')
+session = db.make_session()
+
+config_data = json.dumps({
+    'orders': [['first', ['1']], ['second', ['2']]],
+    'machine_names': [],
+    'machine_patterns': ['summary-.*'],
+})
+report = summaryreport.get_report(session, db, config_data)
+
+assert report.data_table[
+    ('SingleSource/Benchmarks/foo', 'Compile Time', 'x86', 'Release',
+     'summary-machine')] == [[1.0], [1.5]]
+assert report.data_table[
+    ('MultiSource/Applications/SPASS/spass', 'Execution Time', 'x86',
+     'Release', 'summary-machine')] == [[4.0, 5.0], [6.0]]
+assert report.data_table[
+    ('compile/file.c/init/().wall_time', 'Compile Time', 'ARM', 'Release',
+     'summary-machine')] == [[1.0], [2.0]]
+# Only the tests used by the summary are loaded.
+assert not [key for key in report.data_table if key[0] == 'other/ignored']
+assert [w for w in report.warnings
+        if w.startswith('missing values') and 'Benchmarks/bar' in w]
+
+grouped = report.grouped_table
+assert grouped[('Compile Time', 'Release')] == \
+    [('Lmark', 'x86', [1.0, 1.5])]
+(name, arch, values), = grouped[('Execution Time', 'Release')]
+assert (name, arch) == ('Lmark', 'x86')
+assert abs(values[1] - 6.0 / 4.5) < 1e-9
+assert report.single_file_table[('Compile Time', 'Release')] == \
+    [2.0, None, None, None, None, None]
+
+# The report is reused until a run is submitted.
+assert summaryreport.get_report(session, db, config_data) is report
+ts = db.testsuite['nts']
+with open(os.path.join(sys.argv[2], 'summary-nts1.json')) as f:
+    data = json.load(f)
+data['run']['llvm_project_revision'] = '3'
+ts.importDataFromDict(session, data, config=None, select_machine='match',
+                      merge_run='reject')
+session.commit()
+new_report = summaryreport.get_report(session, db, config_data)
+assert new_report is not report
+report = new_report
+
+# Deleting a run also invalidates the report, even when it leaves the
+# latest run id as it is.
+first_run = session.query(ts.Run).order_by(ts.Run.id).first()
+for _ in deletion.delete_runs(session, ts, [first_run.id]):
+    pass
+session.commit()
+assert summaryreport.get_report(session, db, config_data) is not report
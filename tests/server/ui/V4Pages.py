@@ -311,6 +311,15 @@ def main():
 
     # Get the order summary page.
     check_html(client, '/v4/nts/all_orders')
+    # Page through it and filter it.
+    result = check_html(client, '/v4/nts/all_orders?limit=2&before=4')
+    assert "152290" in result.data and "152291" not in result.data
+    assert "after=3" in result.data
+    result = check_html(client, '/v4/nts/all_orders?limit=2&after=3')
+    assert "152292" in result.data and "152290" not in result.data
+    assert "before=4" in result.data and "after=5" in result.data
+    result = check_html(client, '/v4/nts/all_orders?prefix=15433')
+    assert "154331" in result.data and "152290" not in result.data
 
     # Get an order page.
     check_html(client, '/v4/nts/order/3')
@@ -627,6 +636,46 @@ def main():
     lines_in_function = len(code_for_fn)
     assert 2 == lines_in_function
 
+    profile = check_json(client, 'v4/nts/profile/ajax/getProfile?runids=10&testid=10')
+    assert profile['counters'] == top_level_counters
+    assert profile['functions'] == functions
+    assert profile['function'] == 'fn1'
+    assert profile['code'] == code_for_fn
+    check_code(client, 'v4/nts/profile/ajax/getProfile?runids=10&testid=10&f=fn2',
+               expected_code=HTTP_NOT_FOUND)
+    check_code(client, 'v4/nts/profile/ajax/getProfile?runids=1&testid=10',
+               expected_code=HTTP_NOT_FOUND)
+    check_code(client, 'v4/nts/profile/ajax/getProfile?runids=x&testid=10',
+               expected_code=HTTP_BAD_REQUEST)
+    # The functions of the second run's profile.
+    profile = check_json(client, 'v4/nts/profile/ajax/getProfile?runids=1,10&runid=10&testid=10')
+    assert profile['counters'] == {k: [None, v[0]]
+                                   for k, v in top_level_counters.items()}
+    assert profile['function'] == 'fn1'
+    check_code(client, 'v4/nts/profile/ajax/getProfile?runids=1,10&testid=10',
+               expected_code=HTTP_NOT_FOUND)
+    check_code(client, 'v4/nts/profile/ajax/getProfile?runids=10&runid=1&testid=10',
+               expected_code=HTTP_BAD_REQUEST)
+
+    check_html(client, '/profile/admin')
+    check_html(client, '/db_default/profile/admin')
+
+    profile_diff = check_json(client, 'v4/nts/profile/ajax/getDiff?runids=10,10&testid=10&f=fn1')
+    assert profile_diff['num_functions'] == 1
+    assert profile_diff['functions'][0]['name'] == 'fn1'
+    assert profile_diff['functions'][0]['deltas']['cycles'] == 0
+    assert [row[2] for row in profile_diff['code']] == \
+        [line[2] for line in code_for_fn]
+    # The request of the comparison view for the code of one function.
+    profile_diff = check_json(client, 'v4/nts/profile/ajax/getDiff?runids=10,10&testid=10&top=0&f=fn1')
+    assert profile_diff['functions'] == []
+    assert [row[3] for row in profile_diff['code']] == \
+        [line[2] for line in code_for_fn]
+    check_code(client, 'v4/nts/profile/ajax/getDiff?runids=10&testid=10',
+               expected_code=HTTP_BAD_REQUEST)
+    check_code(client, 'v4/nts/profile/ajax/getDiff?runids=10,1&testid=10',
+               expected_code=HTTP_NOT_FOUND)
+
     # Make sure the new option does not break anything
     check_html(client, '/db_default/v4/nts/graph?switch_min_mean=yes&plot.0=1.3.2&submit=Update')
     check_json(client, '/db_default/v4/nts/graph?switch_min_mean=yes&plot.0=1.3.2&json=true&submit=Update')
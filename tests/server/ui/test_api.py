@@ -124,7 +124,8 @@ class JSONAPITester(unittest.TestCase):
         self.assertEqual(type(response), dict)
 
         # There should be no unexpected top level keys.
-        all_top_level_keys = {'generated_by', 'machine', 'machines', 'runs', 'run', 'orders', 'tests', 'samples'}
+        all_top_level_keys = {'generated_by', 'machine', 'machines', 'runs', 'run', 'orders', 'tests', 'samples',
+                              'columns', 'next_before'}
         keys = set(response.keys())
         self.assertTrue(keys.issubset(all_top_level_keys),
                         "{} not subset of {}".format(keys, all_top_level_keys))
@@ -187,6 +188,29 @@ class JSONAPITester(unittest.TestCase):
         self._check_response_is_well_formed(j)
         check_json(client, 'api/db_default/v4/nts/orders/100', expected_code=404)
 
+    def test_orders_api(self):
+        """Check /orders lists the orders newest first, page by page."""
+        client = self.client
+        j = check_json(client, 'api/db_default/v4/nts/orders?limit=3')
+        self._check_response_is_well_formed(j)
+        self.assertEqual(j['columns'], ['id', 'previous_order_id',
+                                        'next_order_id',
+                                        'llvm_project_revision'])
+        self.assertEqual([o[3] for o in j['orders']],
+                         ['154331', '152296', '152295'])
+        self.assertEqual(j['next_before'], 8)
+
+        j = check_json(client, 'api/db_default/v4/nts/orders?limit=3'
+                       '&before=4')
+        self.assertEqual(j['orders'], [[3, 4, 2, '152290'],
+                                       [2, None, 3, '152289']])
+        self.assertEqual(j['next_before'], None)
+
+        j = check_json(client, 'api/db_default/v4/nts/orders?prefix=15229')
+        self.assertEqual([o[0] for o in j['orders']], [9, 8, 7, 6, 5, 4, 3])
+        j = check_json(client, 'api/db_default/v4/nts/orders?prefix=1_')
+        self.assertEqual(j['orders'], [])
+
     def test_single_sample_api(self):
         """ Check /samples/n returns the expected sample information."""
         client = self.client
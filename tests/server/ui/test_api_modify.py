@@ -145,6 +145,10 @@ class JSONAPIDeleteTester(unittest.TestCase):
                              headers={'AuthToken': 'wrong token'})
         self.assertEqual(resp.status_code, 401)
 
+        resp = client.delete('api/db_default/v4/nts/machines/2?batch_size=0',
+                             headers={'AuthToken': 'test_token'})
+        self.assertEqual(resp.status_code, 400)
+
         resp = client.delete('api/db_default/v4/nts/machines/2',
                              headers={'AuthToken': 'test_token'})
         self.assertEqual(resp.status_code, 200)
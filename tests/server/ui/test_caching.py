@@ -0,0 +1,105 @@
+# Check the ETags of the pages and API resources and the response cache.
+# create temporary instance
+# RUN: rm -rf %t.instance %t.cache
+# RUN: python %{shared_inputs}/create_temp_instance.py \
+# RUN:     %s %{shared_inputs}/SmallInstance \
+# RUN:     %t.instance %S/Inputs/V4Pages_extra_records.sql
+#
+# RUN: python %s %t.instance %t.cache
+
+import logging
+import os
+import sys
+import unittest
+
+import lnt.server.ui.app
+from lnt.server.db import generation
+from lnt.server.ui.caching import ResponseCache
+from V4Pages import HTTP_OK
+
+logging.basicConfig(level=logging.INFO)
+
+HTTP_NOT_MODIFIED = 304
+
+
+class CachingTester(unittest.TestCase):
+    """Test the HTTP caching of pages and resources."""
+
+    def setUp(self):
+        """Bind to the LNT test instance."""
+        _, instance_path, self.cache_path = sys.argv
+        self.app = lnt.server.ui.app.App.create_standalone(instance_path)
+        self.app.testing = True
+        self.client = self.app.test_client()
+
+    def _get(self, url, etag=None):
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        return self.client.get(url, headers=headers)
+
+    def test_etags(self):
+        for url in ['/v4/nts/machine/1', '/v4/nts/all_orders',
+                    '/api/db_default/v4/nts/machines/2']:
+            reply = self._get(url)
+            self.assertEqual(reply.status_code, HTTP_OK)
+            etag = reply.headers['ETag']
+            reply = self._get(url, etag)
+            self.assertEqual(reply.status_code, HTTP_NOT_MODIFIED)
+            self.assertEqual(reply.data, '')
+            self.assertEqual(reply.headers['ETag'], etag)
+            # Another page never matches.
+            reply = self._get(url + '?foo=bar', etag)
+            self.assertEqual(reply.status_code, HTTP_OK)
+
+        # Changing the test suite changes the ETags.
+        url = '/api/db_default/v4/nts/machines/2'
+        etag = self._get(url).headers['ETag']
+        reply = self.client.put(url, headers={'AuthToken': 'test_token'},
+                                data='{"machine": {"name": "machine2",'
+                                     ' "os": "other"}}')
+        self.assertEqual(reply.status_code, HTTP_OK)
+        reply = self._get(url, etag)
+        self.assertEqual(reply.status_code, HTTP_OK)
+        self.assertIn('other', reply.data)
+
+    def test_generation(self):
+        db = self.app.instance.get_database('default')
+        session = db.make_session()
+        ts = db.testsuite['nts']
+        before = generation.get_generation(session, 'nts')
+        session.query(ts.Baseline).delete()
+        session.commit()
+        self.assertEqual(generation.get_generation(session, 'nts'),
+                         before + 1)
+        machine = session.query(ts.Machine).get(3)
+        machine.name = 'machine3-renamed'
+        session.commit()
+        self.assertEqual(generation.get_generation(session, 'nts'),
+                         before + 2)
+        self.assertEqual(generation.get_generation(session, 'compile'), 0)
+        session.close()
+
+    def test_response_cache(self):
+        self.app.response_cache = ResponseCache(self.cache_path, 1024 * 1024)
+        url = '/api/db_default/v4/nts/machines'
+        reply = self._get(url)
+        self.assertEqual(reply.status_code, HTTP_OK)
+        files = os.listdir(self.cache_path)
+        self.assertEqual(len(files), 1)
+        # The second request is answered from the cache.
+        cached = self._get(url)
+        self.assertEqual(cached.data, reply.data)
+        self.assertEqual(cached.headers['Content-Type'], 'application/json')
+        with open(os.path.join(self.cache_path, files[0]), 'w') as f:
+            f.write('{"Content-Type": "text/plain"}\nfrom the cache')
+        self.assertEqual(self._get(url).data, 'from the cache')
+
+        # The least recently used responses are evicted.
+        self.app.response_cache.max_size = 1
+        self._get('/api/db_default/v4/nts/tests')
+        self.assertEqual(os.listdir(self.cache_path), [])
+
+
+if __name__ == '__main__':
+    unittest.main(argv=[sys.argv[0], ])
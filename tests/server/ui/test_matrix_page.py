@@ -7,9 +7,10 @@
 #
 # RUN: python %s %t.instance %{tidylib}
 
-import unittest
+import json
 import logging
 import sys
+import unittest
 
 import lnt.server.db.migrate
 import lnt.server.ui.app
@@ -78,6 +79,48 @@ class MatrixViewTester(unittest.TestCase):
 
         reply = check_html(client, '/v4/nts/matrix?plot.0=2.6.2&limit=1')
 
+    def test_matrix_paging(self):
+        """Are the orders paged, newest first."""
+        client = self.client
+        reply = check_html(client, '/v4/nts/matrix?plot.0=2.6.2&limit=2')
+        self.assertIn("152295", reply.data)
+        self.assertIn("152294", reply.data)
+        self.assertNotIn("152293", reply.data)
+        self.assertIn("before=152294", reply.data)
+
+        reply = check_html(client,
+                           '/v4/nts/matrix?plot.0=2.6.2&limit=2&before=152294')
+        self.assertIn("152293", reply.data)
+        self.assertNotIn("152294", reply.data)
+        # The newest order stays the baseline.
+        self.assertIn("Baseline: 152295", reply.data)
+        self.assertNotIn("before=", reply.data)
+
+    def test_matrix_download(self):
+        """Can the whole matrix be downloaded."""
+        client = self.client
+        reply = check_code(client,
+                           '/v4/nts/matrix?plot.0=2.6.2&limit=1&format=csv')
+        self.assertEqual(reply.data.splitlines(), [
+            "Order,Date,machine2/test6/execution_time,Geomean",
+            "152295,2012-05-12T16:28:23,1.2,1.2",
+            "152294,2012-05-11T16:28:23,1.0,1.0",
+            "152293,2012-05-10T16:28:23,1.0,1.0",
+        ])
+
+        reply = check_code(client, '/v4/nts/matrix?plot.0=2.6.2&plot.1=2.5.2'
+                           '&format=json')
+        data = json.loads(reply.data)
+        self.assertEqual(data['columns'][2:4],
+                         ["machine2/test2/execution_time",
+                          "machine2/test6/execution_time"])
+        self.assertEqual([row[0] for row in data['rows']],
+                         ["152295", "152294", "152293", "152292"])
+        self.assertEqual(data['rows'][-1][2:4], [1.0, None])
+
+        check_code(client, '/v4/nts/matrix?plot.0=2.6.2&format=xml',
+                   expected_code=HTTP_BAD_REQUEST)
+
 
 if __name__ == '__main__':
     unittest.main(argv=[sys.argv[0], ])
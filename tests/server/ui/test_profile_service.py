@@ -0,0 +1,112 @@
+# Check the cache of decoded profiles.
+# RUN: rm -rf %t.profiles
+# RUN: python %s %t.profiles
+
+import copy
+import os
+import sys
+import unittest
+
+from lnt.server.ui.profile_service import ProfileCache
+from lnt.testing.profile.profile import Profile
+from lnt.testing.profile.profilev1impl import ProfileV1
+from lnt.testing.profile.profilev2impl import ProfileV2
+
+PROFILE_DATA = {
+    'counters': {'cycles': 12345.0, 'branch-misses': 200.0},
+    'disassembly-format': 'raw',
+    'functions': {
+        'fn1': {
+            'counters': {'cycles': 45.0, 'branch-misses': 10.0},
+            'data': [
+                ({'branch-misses': 0.0, 'cycles': 0.0}, 0x100000,
+                 'add r0, r0, r0'),
+                ({'branch-misses': 0.0, 'cycles': 100.0}, 0x100004,
+                 'sub r1, r0, r0'),
+            ]
+        },
+        'fn2': {
+            'counters': {'cycles': 55.0, 'branch-misses': 5.0},
+            'data': [
+                ({'branch-misses': 5.0, 'cycles': 100.0}, 0x100008,
+                 'ret'),
+            ]
+        },
+    }
+}
+
+
+class ProfileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = sys.argv[1]
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.files = []
+        for i in range(3):
+            impl = ProfileV2.upgrade(ProfileV1(copy.deepcopy(PROFILE_DATA)))
+            filename = os.path.join(self.path, 'p%d.lntprof' % i)
+            Profile(impl).save(filename=filename)
+            self.files.append(filename)
+
+    def test_get(self):
+        cache = ProfileCache(1024 * 1024)
+        p = cache.get(self.files[0])
+        self.assertIs(cache.get(self.files[0]), p)
+        self.assertEqual(p.getTopLevelCounters(),
+                         {'cycles': 12345, 'branch-misses': 200})
+        self.assertEqual(sorted(p.getFunctions()), ['fn1', 'fn2'])
+        self.assertEqual([text for _, _, text in p.getCodeForFunction('fn1')],
+                         ['add r0, r0, r0', 'sub r1, r0, r0'])
+        self.assertEqual(p.getHottestFunction('cycles'), 'fn2')
+        self.assertEqual(p.getHottestFunction('branch-misses'), 'fn1')
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(cache.size > 0)
+
+        # A changed file is decoded again and replaces the old entry.
+        stat = os.stat(self.files[0])
+        os.utime(self.files[0], (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNot(cache.get(self.files[0]), p)
+        self.assertEqual(len(cache), 1)
+
+        self.assertRaises(OSError, cache.get,
+                          os.path.join(self.path, 'missing.lntprof'))
+
+    def test_eviction(self):
+        cache = ProfileCache(1024 * 1024)
+        size = cache.get(self.files[0]).size
+        cache.clear()
+
+        cache.max_size = 2 * size
+        first = cache.get(self.files[0])
+        cache.get(self.files[1])
+        # Using the first profile makes the second the least recently used.
+        self.assertIs(cache.get(self.files[0]), first)
+        cache.get(self.files[2])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 2 * size)
+        self.assertIs(cache.get(self.files[0]), first)
+
+        # The profile just decoded is kept even when it is too large.
+        cache.max_size = 1
+        cache.get(self.files[1])
+        self.assertEqual(len(cache), 1)
+
+    def test_diff(self):
+        cache = ProfileCache(1024 * 1024)
+        diff = cache.get_diff(self.files[0], self.files[1])
+        self.assertEqual(diff['num_functions'], 2)
+        self.assertIs(cache.get_diff(self.files[0], self.files[1]), diff)
+        self.assertIsNot(cache.get_diff(self.files[0], self.files[1], top=1),
+                         diff)
+        code = cache.get_function_diff(self.files[0], self.files[1], 'fn1')
+        self.assertEqual([row[2] for row in code],
+                         ['add r0, r0, r0', 'sub r1, r0, r0'])
+
+        # The differences are computed again once a profile changes.
+        stat = os.stat(self.files[1])
+        os.utime(self.files[1], (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNot(cache.get_diff(self.files[0], self.files[1]), diff)
+
+
+if __name__ == '__main__':
+    unittest.main(argv=[sys.argv[0], ])
@@ -0,0 +1,84 @@
+# Check the limits of the size of request bodies and of profile uploads.
+# RUN: rm -rf %t.instance
+# RUN: python %{shared_inputs}/create_temp_instance.py \
+# RUN:     %s %{shared_inputs}/SmallInstance %t.instance
+#
+# RUN: python %s %t.instance
+
+import logging
+import sys
+import unittest
+import zlib
+
+import lnt.server.ui.app
+from lnt.server.db import profilestore
+
+logging.basicConfig(level=logging.INFO)
+
+MAX_SIZE = 4096
+
+BLOB_URL = 'profile/blobs/' + profilestore.digest('')
+
+
+def gzip(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class RequestLimitsTester(unittest.TestCase):
+
+    def setUp(self):
+        _, instance_path = sys.argv
+        app = lnt.server.ui.app.App.create_standalone(instance_path)
+        app.testing = True
+        app.config['MAX_CONTENT_LENGTH'] = MAX_SIZE
+        self.client = app.test_client()
+
+    def submit(self, body, **headers):
+        headers['Accept'] = 'application/json'
+        return self.client.post('db_default/v4/nts/submitRun',
+                                data=body, headers=headers)
+
+    def test_default(self):
+        config = self.client.application.old_config
+        self.assertEqual(config.max_request_size_mb, 256)
+
+    def test_gzip_bomb(self):
+        # Compresses to about a kilobyte.
+        body = gzip('\0' * (1024 * 1024))
+        self.assertLess(len(body), MAX_SIZE)
+        response = self.submit(body, **{'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 413)
+
+    def test_gzip_within_limit(self):
+        body = gzip('{}' + ' ' * (MAX_SIZE - 2))
+        response = self.submit(body, **{'Content-Encoding': 'gzip',
+                                        'Content-Type': 'application/json'})
+        self.assertNotEqual(response.status_code, 413)
+
+    def test_invalid_gzip(self):
+        response = self.submit('not gzip', **{'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_too_large(self):
+        response = self.submit(' ' * (MAX_SIZE + 1))
+        self.assertEqual(response.status_code, 413)
+
+    def test_blob_too_large(self):
+        response = self.client.put(BLOB_URL, data=' ' * (MAX_SIZE + 1))
+        self.assertEqual(response.status_code, 413)
+
+    def test_blob_auth_token(self):
+        # Like submitRun, uploads do not need the API auth token.
+        config = self.client.application.old_config
+        config.api_auth_token = 'secret'
+        try:
+            response = self.client.put(BLOB_URL, data='')
+            # Past the checks, the data is not a profile.
+            self.assertEqual(response.status_code, 400)
+        finally:
+            config.api_auth_token = None
+
+
+if __name__ == '__main__':
+    unittest.main(argv=[sys.argv[0], ])
@@ -0,0 +1,83 @@
+# Check the on-disk cache of compiler fingerprints.
+#
+# RUN: rm -rf %t.cache %t.compilers
+# RUN: mkdir -p %t.compilers
+# RUN: cp %{shared_inputs}/FakeCompilers/clang-r154331 \
+# RUN:    %{shared_inputs}/FakeCompilers/fakecompiler.py %t.compilers
+# RUN: env LNT_CACHE_DIR=%t.cache python %s %t.compilers %t.cache
+
+import glob
+import os
+import sys
+
+import lnt.testing.util.compilers
+from lnt.testing.util import fingerprint, machineinfo
+
+compilers, cache_dir = sys.argv[1:]
+cc = os.path.join(compilers, 'clang-r154331')
+
+assert fingerprint.get_cache_dir() == cache_dir
+
+info = lnt.testing.util.compilers.get_cc_info(cc)
+assert info['inferred_run_order'] == '154331'
+assert len(glob.glob(os.path.join(cache_dir, 'cc_info-*.json'))) == 1
+
+# A cache hit gives the same information, without probing the compiler.
+probes = []
+real_capture_all = lnt.testing.util.compilers.capture_all
+
+
+def capture_all(commands):
+    probes.extend(commands)
+    return real_capture_all(commands)
+
+
+lnt.testing.util.compilers.capture_all = capture_all
+cached_info = lnt.testing.util.compilers.get_cc_info(cc)
+assert cached_info == info, (cached_info, info)
+assert all(type(v) is str for v in cached_info.values())
+assert probes == []
+
+# Different flags and a modified compiler are different fingerprints.
+lnt.testing.util.compilers.get_cc_info(cc, ['-O3'])
+assert len(probes) == 5
+os.utime(cc, (0, 0))
+lnt.testing.util.compilers.get_cc_info(cc)
+assert len(probes) == 10
+assert len(glob.glob(os.path.join(cache_dir, 'cc_info-*.json'))) == 3
+
+# The boot time information of the machine is cached per boot, and probed
+# again when the table of sysctls changes.
+sysctl_probes = []
+
+
+def probe_sysctls(names):
+    sysctl_probes.extend(names)
+    return dict((name, 'value of ' + name) for name in names)
+
+
+machineinfo.boot_id = lambda: 'boot-1'
+machineinfo._probe_sysctls = probe_sysctls
+machineinfo._get_mac_addresses = lambda: []
+machineinfo.sysctl_info_table = [('hw.ncpu', 'machine'),
+                                 ('kern.boottime', 'run')]
+machine_info, run_info = machineinfo.get_machine_information()
+assert machine_info == {'hw.ncpu': 'value of hw.ncpu'}, machine_info
+assert run_info == {'kern.boottime': 'value of kern.boottime'}, run_info
+assert sysctl_probes == ['hw.ncpu', 'kern.boottime'], sysctl_probes
+del sysctl_probes[:]
+machineinfo.get_machine_information()
+assert sysctl_probes == ['kern.boottime'], sysctl_probes
+
+del sysctl_probes[:]
+machineinfo.sysctl_info_table.append(('hw.memsize', 'machine'))
+machine_info, _ = machineinfo.get_machine_information()
+assert machine_info['hw.memsize'] == 'value of hw.memsize', machine_info
+assert sysctl_probes == ['hw.ncpu', 'hw.memsize', 'kern.boottime'], \
+    sysctl_probes
+
+# An empty cache directory disables the cache.
+os.environ['LNT_CACHE_DIR'] = ''
+assert fingerprint.get_cache_dir() is None
+lnt.testing.util.compilers.get_cc_info(cc)
+assert len(probes) == 15
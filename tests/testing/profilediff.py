@@ -0,0 +1,101 @@
+# RUN: python %s
+import copy
+import logging
+import unittest
+
+from lnt.testing.profile.diff import diff_function, diff_profiles
+from lnt.testing.profile.profile import Profile
+from lnt.testing.profile.profilev1impl import ProfileV1
+from lnt.testing.profile.profilev2impl import ProfileV2
+
+logging.basicConfig(level=logging.DEBUG)
+
+
+class ProfileDiffTest(unittest.TestCase):
+    def setUp(self):
+        self.data1 = {
+            'counters': {'cycles': 1000.0, 'branch-misses': 200.0},
+            'disassembly-format': 'raw',
+            'functions': {
+                'fn1': {
+                    'counters': {'cycles': 40.0, 'branch-misses': 10.0},
+                    'data': [
+                        ({'cycles': 20.0}, 0x100000, 'add r0, r0, r0'),
+                        ({'cycles': 80.0}, 0x100004, 'sub r1, r0, r0'),
+                    ]
+                },
+                'fn2': {
+                    'counters': {'cycles': 60.0, 'branch-misses': 90.0},
+                    'data': [
+                        ({'cycles': 50.0}, 0x200000, 'mov r0, r1'),
+                        ({'cycles': 50.0}, 0x200004, 'ret'),
+                    ]
+                },
+            }
+        }
+        self.data2 = copy.deepcopy(self.data1)
+        self.data2['counters']['cycles'] = 1500.0
+        del self.data2['counters']['branch-misses']
+        functions = self.data2['functions']
+        functions['fn1']['counters'] = {'cycles': 30.0, 'branch-misses': 5.0}
+        functions['fn2']['counters'] = {'cycles': 50.0, 'branch-misses': 95.0}
+        # fn2 moved and got a new instruction.
+        functions['fn2']['data'] = [
+            ({'cycles': 10.0}, 0x300000, 'nop'),
+            ({'cycles': 40.0}, 0x300004, 'mov r0, r1'),
+            ({'cycles': 50.0}, 0x300008, 'ret'),
+        ]
+        functions['fn3'] = {'counters': {'cycles': 20.0}, 'data': []}
+
+    def _profiles(self):
+        return [Profile.fromRendered(
+                    Profile(ProfileV2.upgrade(ProfileV1(data))).render())
+                for data in (self.data1, self.data2)]
+
+    def test_diff_profiles(self):
+        p1, p2 = self._profiles()
+        diff = diff_profiles(p1, p2)
+        self.assertEqual(diff['counters'], {'cycles': [1000, 1500, 500],
+                                            'branch-misses': [200, None,
+                                                              None]})
+        self.assertEqual(diff['num_functions'], 3)
+        self.assertEqual([f['name'] for f in diff['functions']],
+                         ['fn3', 'fn1', 'fn2'])
+        fn3 = diff['functions'][0]
+        self.assertEqual(fn3['counters'][0], None)
+        self.assertEqual(fn3['length'], [None, 0])
+        self.assertEqual(fn3['deltas'], {'cycles': 20.0})
+        fn1 = diff['functions'][1]
+        self.assertEqual(fn1['deltas'], {'cycles': -10.0,
+                                         'branch-misses': -5.0})
+        self.assertEqual(fn1['length'], [2, 2])
+
+        diff = diff_profiles(p1, p2, counter='branch-misses', top=2)
+        self.assertEqual([f['name'] for f in diff['functions']],
+                         ['fn1', 'fn2'])
+
+    def test_diff_function(self):
+        p1, p2 = self._profiles()
+        rows = diff_function(p1, p2, 'fn1')
+        self.assertEqual([r[:4] for r in rows],
+                         [[0x100000, 0x100000, 'add r0, r0, r0',
+                           'add r0, r0, r0'],
+                          [0x100004, 0x100004, 'sub r1, r0, r0',
+                           'sub r1, r0, r0']])
+        self.assertEqual(rows[0][6], {'cycles': 0.0, 'branch-misses': 0.0})
+
+        # Moved code is aligned by text.
+        rows = diff_function(p1, p2, 'fn2')
+        self.assertEqual([r[:4] for r in rows],
+                         [[None, 0x300000, None, 'nop'],
+                          [0x200000, 0x300004, 'mov r0, r1', 'mov r0, r1'],
+                          [0x200004, 0x300008, 'ret', 'ret']])
+        self.assertEqual(rows[0][4], None)
+        self.assertEqual(rows[1][6]['cycles'], -10.0)
+
+        rows = diff_function(p1, p2, 'fn3')
+        self.assertEqual(rows, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
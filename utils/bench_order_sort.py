@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+Benchmark sorting orders.
+
+Usage: utils/bench_order_sort.py [--orders N]
+
+Sorts N (default 100000) orders with random revisions and reports the time
+of sorting them by their sort keys, the first time (which computes the keys)
+and again (as for orders loaded from the database), and of sorting them like
+Order did before, by running convert_revision on both sides of every
+comparison.
+"""
+from __future__ import print_function
+import functools
+import random
+import sys
+import time
+
+from lnt.server.config import Config
+from lnt.server.db import v4db
+from lnt.server.ui.util import convert_revision
+
+
+def _time(fn, orders):
+    start = time.time()
+    fn(list(orders))
+    return time.time() - start
+
+
+def _legacy_cmp(a, b, cache={}):
+    for item in a.fields:
+        key_a = convert_revision(a.get_field(item), cache=cache)
+        key_b = convert_revision(b.get_field(item), cache=cache)
+        if key_a != key_b:
+            return -1 if key_a < key_b else 1
+    return 0
+
+
+def _legacy(orders):
+    sorted(orders, key=functools.cmp_to_key(_legacy_cmp))
+
+
+def main():
+    args = sys.argv[1:]
+    num_orders = 100000
+    if args[:1] == ['--orders']:
+        num_orders = int(args[1])
+
+    db = v4db.V4DB("sqlite:///:memory:", Config.dummy_instance())
+    ts = db.testsuite['nts']
+    random.seed(0)
+    orders = [ts.Order(llvm_project_revision='%d.%d' % (
+                  random.randint(0, 300000), random.randint(0, 10)))
+              for _ in range(num_orders)]
+
+    print("%-20s %8.3fs" % ("sort keys (first)", _time(sorted, orders)))
+    print("%-20s %8.3fs" % ("sort keys", _time(sorted, orders)))
+    print("%-20s %8.3fs" % ("convert_revision", _time(_legacy, orders)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""
+Benchmark reading and upgrading large LNT reports.
+
+The test list of each input report is repeated (with renamed tests) to build
+a large report, which is then read with lnt.formats.read_any() and upgraded
+with lnt.testing.upgrade_and_normalize_report() in a fresh process. The
+wall time and the peak memory use of that process are reported.
+
+Usage: utils/bench_report_upgrade.py [--scale N] [report]*
+
+Without reports, the samples in tests/server/db/Inputs and tests/Formats/Inputs
+are used.
+"""
+from __future__ import print_function
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _default_inputs():
+    base = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                        'tests')
+    return sorted(glob.glob(os.path.join(base, 'server', 'db', 'Inputs',
+                                         '*.json*')) +
+                  glob.glob(os.path.join(base, 'Formats', 'Inputs',
+                                         '*.json')))
+
+
+def _scale_report(data, scale):
+    """Repeat the test list of the report data scale times. Returns the test
+    suite name to upgrade to, or None if the report has no tests."""
+    if 'tests' in data:
+        tests = data['tests']
+        data['tests'] = [dict(t, name='%s_%d' % (t['name'], i))
+                         for i in range(scale) for t in tests]
+        return 'nts'
+    if 'Tests' in data:
+        tests = data['Tests']
+        if not tests:
+            return None
+        ts_name = tests[0]['Name'].split('.', 1)[0]
+        data['Tests'] = []
+        for i in range(scale):
+            for t in tests:
+                prefix, rest = t['Name'].split('.', 1)
+                data['Tests'].append(dict(t, Name='%s.%d_%s' %
+                                          (prefix, i, rest)))
+        return ts_name
+    return None
+
+
+def _measure(path, ts_name):
+    import lnt.formats
+    import lnt.testing
+
+    start = time.time()
+    data = lnt.formats.read_any(path, '<auto>')
+    data = lnt.testing.upgrade_and_normalize_report(data, ts_name)
+    count = sum(1 for _ in data['tests'])
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'tests': count, 'time': elapsed, 'peak_rss': peak}))
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--measure']:
+        _measure(*args[1:])
+        return
+
+    scale = 1000
+    if args[:1] == ['--scale']:
+        scale = int(args[1])
+        args = args[2:]
+    inputs = args or _default_inputs()
+
+    for path in inputs:
+        with open(path) as f:
+            try:
+                data = json.load(f)
+            except ValueError:
+                print("%s: skipped, not a json report" % path)
+                continue
+        ts_name = _scale_report(data, scale)
+        if ts_name is None:
+            print("%s: skipped, no tests" % path)
+            continue
+
+        fd, scaled_path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            del data
+            output = subprocess.check_output(
+                [sys.executable, __file__, '--measure', scaled_path, ts_name])
+            result = json.loads(output.splitlines()[-1])
+            print("%s: %d tests in %.2fs, peak RSS %d KiB" %
+                  (os.path.basename(path), result['tests'], result['time'],
+                   result['peak_rss']))
+        finally:
+            os.remove(scaled_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Benchmark opening the databases of an LNT instance.
+
+Usage: utils/bench_startup.py [--repeat N] [instance path]
+
+Without an instance path a fresh instance is created in a temporary
+directory. Reports the time of the first V4DB instantiation in the process
+and the average of the following ones, both with the shared test suite
+registry and with the registry cleared before every instantiation.
+"""
+from __future__ import print_function
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _time_open(config, repeat, clear):
+    import lnt.server.db.v4db
+
+    times = []
+    for _ in range(repeat):
+        if clear:
+            lnt.server.db.v4db.clear_testsuite_registry()
+        start = time.time()
+        db = config.get_database('default')
+        times.append(time.time() - start)
+        db.close()
+    return times
+
+
+def main():
+    args = sys.argv[1:]
+    repeat = 20
+    if args[:1] == ['--repeat']:
+        repeat = int(args[1])
+        args = args[2:]
+
+    tmpdir = None
+    if args:
+        instance_path = args[0]
+    else:
+        tmpdir = tempfile.mkdtemp()
+        instance_path = tmpdir + '/instance'
+        subprocess.check_call(['lnt', 'create', instance_path],
+                              stdout=subprocess.PIPE)
+
+    try:
+        import lnt.server.instance
+        import lnt.server.db.v4db
+
+        instance = lnt.server.instance.Instance.frompath(instance_path)
+        config = instance.config
+        for clear in (True, False):
+            lnt.server.db.v4db.clear_testsuite_registry()
+            times = _time_open(config, repeat, clear)
+            print("%-16s first %.3fs, following %.4fs on average" %
+                  ("uncached:" if clear else "shared registry:", times[0],
+                   sum(times[1:]) / max(1, len(times) - 1)))
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
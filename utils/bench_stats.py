@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Benchmark the Mann-Whitney U test used by the regression analysis.
+
+Usage: utils/bench_stats.py [--tests N]
+
+Runs the test on N (default 1000) pairs of random samples for a few sample
+sizes and reports the time per test of lnt.util.stats.mannwhitneyu_pvalues
+and of the pure Python port in lnt.external.stats, which the analysis used
+for more than 20 samples before.
+"""
+from __future__ import print_function
+import random
+import sys
+import time
+
+from lnt.external.stats import stats as ext_stats
+from lnt.util import stats
+
+
+def _time(fn, pairs):
+    start = time.time()
+    fn(pairs)
+    return (time.time() - start) / len(pairs)
+
+
+def _external(pairs):
+    for a, b in pairs:
+        try:
+            ext_stats.mannwhitneyu(a, b)
+        except ValueError:
+            pass
+
+
+def main():
+    args = sys.argv[1:]
+    num_tests = 1000
+    if args[:1] == ['--tests']:
+        num_tests = int(args[1])
+
+    random.seed(0)
+    print("%8s %14s %14s" % ("samples", "lnt.util", "lnt.external"))
+    for size in (5, 20, 50, 100, 200):
+        pairs = [([random.gauss(1.0, 0.01) for _ in range(size)],
+                  [random.gauss(1.01, 0.01) for _ in range(size)])
+                 for _ in range(num_tests)]
+        print("%8d %12.1fus %12.1fus" %
+              (size, _time(stats.mannwhitneyu_pvalues, pairs) * 1e6,
+               _time(_external, pairs) * 1e6))
+
+
+if __name__ == '__main__':
+    main()